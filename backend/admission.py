@@ -0,0 +1,82 @@
+import asyncio
+import os
+from typing import Dict
+
+from fastapi import HTTPException, Request
+
+# Классы маршрутов: сколько запросов выполняется одновременно, сколько ждут в очереди
+# и сколько секунд запрос может ждать места. Лимиты согласованы с пулом в database.py
+# (pool_size + max_overflow = 30), легкие маршруты получают свою долю пула.
+ROUTE_CLASSES = {
+    "light": {"limit": int(os.getenv("ADMISSION_LIGHT_LIMIT", "10")), "queue": 100, "deadline": 2.0},
+    "default": {"limit": int(os.getenv("ADMISSION_DEFAULT_LIMIT", "12")), "queue": 50, "deadline": 1.0},
+    "heavy": {"limit": int(os.getenv("ADMISSION_HEAVY_LIMIT", "6")), "queue": 20, "deadline": 0.5},
+}
+
+RETRY_AFTER_SECONDS = 1
+
+
+class AdmissionController:
+    """Ограничение одновременных запросов к БД по классу маршрута"""
+
+    def __init__(self, name: str, limit: int, queue: int, deadline: float):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.deadline = deadline
+        self._semaphore = asyncio.Semaphore(limit)
+        self._waiting = 0
+        self.stats = {"admitted": 0, "rejected": 0}
+
+    def _reject(self):
+        self.stats["rejected"] += 1
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy. Please try again.",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+        )
+
+    async def acquire(self):
+        if self._semaphore.locked():
+            # Очередь переполнена: сразу отказываем, не дожидаясь таймаута пула
+            if self._waiting >= self.queue:
+                self._reject()
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.deadline)
+            except asyncio.TimeoutError:
+                self._reject()
+            finally:
+                self._waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        self.stats["admitted"] += 1
+
+    def release(self):
+        self._semaphore.release()
+
+
+controllers: Dict[str, AdmissionController] = {
+    name: AdmissionController(name, **params) for name, params in ROUTE_CLASSES.items()
+}
+
+
+def admit(route_class: str):
+    """Dependency: запрос занимает место в своем классе на время обработки"""
+    controller = controllers[route_class]
+
+    async def dependency(request: Request):
+        await controller.acquire()
+        try:
+            yield
+        finally:
+            controller.release()
+
+    return dependency
+
+
+def admission_stats() -> dict:
+    return {
+        name: {**c.stats, "active": c.limit - c._semaphore._value, "waiting": c._waiting}
+        for name, c in controllers.items()
+    }
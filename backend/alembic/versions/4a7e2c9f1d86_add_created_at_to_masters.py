@@ -0,0 +1,29 @@
+"""add created_at to masters
+
+Revision ID: 4a7e2c9f1d86
+Revises: e8c2a5f7d391
+Create Date: 2026-10-24 09:12:37.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4a7e2c9f1d86'
+down_revision: Union[str, Sequence[str], None] = 'e8c2a5f7d391'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # У существующих мастеров остается NULL: время регистрации неизвестно
+    op.add_column('masters', sa.Column('created_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('masters', 'created_at')
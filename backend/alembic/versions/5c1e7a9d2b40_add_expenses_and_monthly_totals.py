@@ -0,0 +1,62 @@
+"""add expenses and monthly totals
+
+Revision ID: 5c1e7a9d2b40
+Revises: db874683e3dd
+Create Date: 2026-10-19 10:12:31.204118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1e7a9d2b40'
+down_revision: Union[str, Sequence[str], None] = 'db874683e3dd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('expenses',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.String(), nullable=False),
+    sa.Column('category', sa.String(), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.Column('comment', sa.Text(), nullable=True),
+    sa.Column('master_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['master_id'], ['masters.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_expenses_id'), 'expenses', ['id'], unique=False)
+    op.create_index(op.f('ix_expenses_date'), 'expenses', ['date'], unique=False)
+    op.create_table('monthly_totals',
+    sa.Column('month', sa.String(length=7), nullable=False),
+    sa.Column('master_id', sa.Integer(), nullable=False),
+    sa.Column('income_cash', sa.Float(), nullable=False),
+    sa.Column('income_card', sa.Float(), nullable=False),
+    sa.Column('completed_count', sa.Integer(), nullable=False),
+    sa.Column('expenses', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('month', 'master_id')
+    )
+    # Заполнение итогов по уже проведенным записям
+    op.execute("""
+        INSERT INTO monthly_totals (month, master_id, income_cash, income_card, completed_count, expenses)
+        SELECT substr(date, 1, 7), master_id,
+               COALESCE(SUM(cash_payment), 0), COALESCE(SUM(card_payment), 0), COUNT(*), 0
+        FROM appointments
+        WHERE status = 'completed' AND master_id IS NOT NULL
+        GROUP BY substr(date, 1, 7), master_id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('monthly_totals')
+    op.drop_index(op.f('ix_expenses_date'), table_name='expenses')
+    op.drop_index(op.f('ix_expenses_id'), table_name='expenses')
+    op.drop_table('expenses')
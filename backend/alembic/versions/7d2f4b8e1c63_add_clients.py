@@ -0,0 +1,103 @@
+"""add clients
+
+Revision ID: 7d2f4b8e1c63
+Revises: 5c1e7a9d2b40
+Create Date: 2026-10-19 14:05:12.873410
+
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2f4b8e1c63'
+down_revision: Union[str, Sequence[str], None] = '5c1e7a9d2b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def normalize_name(name: str) -> str:
+    # Копия clients.normalize_name: миграция не должна зависеть от кода приложения
+    return re.sub(r"\s+", " ", name.strip().lower().replace("ё", "е"))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('clients',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('normalized_name', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('normalized_name')
+    )
+    op.create_index(op.f('ix_clients_id'), 'clients', ['id'], unique=False)
+    with op.batch_alter_table('appointments') as batch_op:
+        batch_op.add_column(sa.Column('client_id', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_appointments_client_id'), ['client_id'], unique=False)
+        batch_op.create_foreign_key('fk_appointments_client_id', 'clients', ['client_id'], ['id'])
+
+    if op.get_bind().dialect.name == 'postgresql':
+        # Префиксный поиск по normalized_name через LIKE 'иван%'
+        op.execute(
+            "CREATE INDEX ix_clients_normalized_name_prefix "
+            "ON clients (normalized_name text_pattern_ops)"
+        )
+
+    # Перенос существующих имен: одна строка клиента на нормализованное имя
+    bind = op.get_bind()
+    clients = sa.table('clients',
+        sa.column('id', sa.Integer), sa.column('name', sa.String),
+        sa.column('normalized_name', sa.String), sa.column('created_at', sa.DateTime)
+    )
+    appointments = sa.table('appointments',
+        sa.column('client_name', sa.String), sa.column('client_id', sa.Integer),
+        sa.column('created_at', sa.DateTime)
+    )
+
+    first_seen = sa.func.min(appointments.c.created_at, type_=sa.DateTime)
+    names = bind.execute(
+        sa.select(appointments.c.client_name, first_seen)
+        .where(appointments.c.client_name.isnot(None))
+        .group_by(appointments.c.client_name)
+        .order_by(first_seen)
+    ).all()
+    groups = {}
+    for name, created_at in names:
+        normalized = normalize_name(name)
+        if normalized:
+            groups.setdefault(normalized, {"name": name.strip(), "created_at": created_at, "variants": []})
+            groups[normalized]["variants"].append(name)
+    if not groups:
+        return
+
+    bind.execute(clients.insert(), [
+        {"name": group["name"], "normalized_name": normalized, "created_at": group["created_at"]}
+        for normalized, group in groups.items()
+    ])
+    ids = dict(bind.execute(sa.select(clients.c.normalized_name, clients.c.id)).all())
+    bind.execute(
+        appointments.update()
+        .where(appointments.c.client_name == sa.bindparam('variant'))
+        .values(client_id=sa.bindparam('new_client_id')),
+        [
+            {"variant": variant, "new_client_id": ids[normalized]}
+            for normalized, group in groups.items()
+            for variant in group["variants"]
+        ]
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_clients_normalized_name_prefix")
+    with op.batch_alter_table('appointments') as batch_op:
+        batch_op.drop_constraint('fk_appointments_client_id', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_appointments_client_id'))
+        batch_op.drop_column('client_id')
+    op.drop_index(op.f('ix_clients_id'), table_name='clients')
+    op.drop_table('clients')
@@ -0,0 +1,55 @@
+"""add client totals
+
+Revision ID: 8e3a5c0f7b21
+Revises: 7d2f4b8e1c63
+Create Date: 2026-10-19 16:40:03.519274
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e3a5c0f7b21'
+down_revision: Union[str, Sequence[str], None] = '7d2f4b8e1c63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('client_totals',
+    sa.Column('client_id', sa.Integer(), nullable=False),
+    sa.Column('master_id', sa.Integer(), nullable=False),
+    sa.Column('appointments_count', sa.Integer(), nullable=False),
+    sa.Column('completed_count', sa.Integer(), nullable=False),
+    sa.Column('cancelled_count', sa.Integer(), nullable=False),
+    sa.Column('total_spent', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['client_id'], ['clients.id'], ),
+    sa.PrimaryKeyConstraint('client_id', 'master_id')
+    )
+    # Индекс по client_id заменяется составным: история клиента сортируется по дате
+    op.drop_index('ix_appointments_client_id', table_name='appointments')
+    op.create_index('ix_appointments_client_id_date', 'appointments', ['client_id', 'date'], unique=False)
+
+    # Заполнение итогов по уже привязанным записям
+    op.execute("""
+        INSERT INTO client_totals (client_id, master_id, appointments_count, completed_count, cancelled_count, total_spent)
+        SELECT client_id, master_id, COUNT(*),
+               SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END),
+               SUM(CASE WHEN status = 'cancelled' THEN 1 ELSE 0 END),
+               SUM(CASE WHEN status = 'completed'
+                        THEN COALESCE(cash_payment, 0) + COALESCE(card_payment, 0) ELSE 0 END)
+        FROM appointments
+        WHERE client_id IS NOT NULL AND master_id IS NOT NULL
+        GROUP BY client_id, master_id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_appointments_client_id_date', table_name='appointments')
+    op.create_index('ix_appointments_client_id', 'appointments', ['client_id'], unique=False)
+    op.drop_table('client_totals')
@@ -0,0 +1,36 @@
+"""add appointments fulltext index
+
+Revision ID: 9b4d6e2a8f15
+Revises: 8e3a5c0f7b21
+Create Date: 2026-10-19 18:21:47.306652
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b4d6e2a8f15'
+down_revision: Union[str, Sequence[str], None] = '8e3a5c0f7b21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Только PostgreSQL; на SQLite поиск идет по индексу в памяти (backend/search.py).
+    # Выражение должно совпадать с search._search_postgres
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute(
+        "CREATE INDEX ix_appointments_fulltext ON appointments USING GIN "
+        "(to_tsvector('russian'::regconfig, client_name || ' ' || coalesce(comment, '')))"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute("DROP INDEX IF EXISTS ix_appointments_fulltext")
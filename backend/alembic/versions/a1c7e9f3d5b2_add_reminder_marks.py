@@ -0,0 +1,34 @@
+"""add reminder marks
+
+Revision ID: a1c7e9f3d5b2
+Revises: 9b4d6e2a8f15
+Create Date: 2026-10-19 20:02:15.640981
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1c7e9f3d5b2'
+down_revision: Union[str, Sequence[str], None] = '9b4d6e2a8f15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('reminder_marks',
+    sa.Column('appointment_id', sa.Integer(), nullable=False),
+    sa.Column('offset_minutes', sa.Integer(), nullable=False),
+    sa.Column('scheduled_for', sa.String(length=16), nullable=False),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('appointment_id', 'offset_minutes', 'scheduled_for')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('reminder_marks')
@@ -0,0 +1,44 @@
+"""add commission rules
+
+Revision ID: b7e3a9d2c145
+Revises: f2b8d4a6c913
+Create Date: 2026-10-22 11:40:27.518307
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e3a9d2c145'
+down_revision: Union[str, Sequence[str], None] = 'f2b8d4a6c913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('commission_rules',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('salon_id', sa.Integer(), server_default='1', nullable=False),
+    sa.Column('master_id', sa.Integer(), nullable=False),
+    sa.Column('service', sa.String(), nullable=True),
+    sa.Column('percent', sa.Float(), nullable=False),
+    sa.Column('card_fee_percent', sa.Float(), server_default='0', nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['salon_id'], ['salons.id'], ),
+    sa.ForeignKeyConstraint(['master_id'], ['masters.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_commission_rules_id'), 'commission_rules', ['id'], unique=False)
+    op.create_index(op.f('ix_commission_rules_master_id'), 'commission_rules', ['master_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_commission_rules_master_id'), table_name='commission_rules')
+    op.drop_index(op.f('ix_commission_rules_id'), table_name='commission_rules')
+    op.drop_table('commission_rules')
@@ -0,0 +1,164 @@
+"""partition appointments by month
+
+Revision ID: c5f28d1e9a47
+Revises: a1c7e9f3d5b2
+Create Date: 2026-10-20 09:14:36.118204
+
+PK становится (id, date): ключ секционирования обязан входить в уникальные
+ограничения, поэтому уникальность id держится только на appointments_id_seq.
+Проверка: python partitions.py --check. Новые секции после миграции создает
+задание python partitions.py (cron), а не старт API.
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5f28d1e9a47'
+down_revision: Union[str, Sequence[str], None] = 'a1c7e9f3d5b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Секции создаются от первой записи до этого числа месяцев вперед
+MONTHS_AHEAD = 12
+
+
+def month_ranges(first: str, months_ahead: int):
+    today = date.today()
+    year, month = int(first[:4]), int(first[5:7])
+    last_year, last_month = divmod(today.year * 12 + today.month - 1 + months_ahead, 12)
+    while (year, month) <= (last_year, last_month + 1):
+        next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+        yield f"appointments_p{year}_{month:02d}", f"{year}-{month:02d}-01", f"{next_year}-{next_month:02d}-01"
+        year, month = next_year, next_month
+
+
+def create_archive_table() -> None:
+    op.create_table('appointments_archive',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('time', sa.String(), nullable=False),
+    sa.Column('duration', sa.Integer(), nullable=True),
+    sa.Column('client_name', sa.String(), nullable=False),
+    sa.Column('comment', sa.Text(), nullable=True),
+    sa.Column('date', sa.String(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('cash_payment', sa.Float(), nullable=True),
+    sa.Column('card_payment', sa.Float(), nullable=True),
+    sa.Column('master_id', sa.Integer(), nullable=True),
+    sa.Column('client_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('archived_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_appointments_archive_date'), 'appointments_archive', ['date'], unique=False)
+    op.create_index(op.f('ix_appointments_archive_client_id'), 'appointments_archive', ['client_id'], unique=False)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    create_archive_table()
+
+    if op.get_bind().dialect.name != 'postgresql':
+        op.create_index('ix_appointments_date', 'appointments', ['date'], unique=False)
+        return
+
+    # Перенос без остановки записи: новая секционированная таблица заполняется по месяцам
+    # отдельными транзакциями, а изменения старой в это время дублирует триггер.
+    # Под блокировкой остается только сверка и переименование.
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        op.execute("CREATE TABLE appointments_partitioned (LIKE appointments INCLUDING DEFAULTS) PARTITION BY RANGE (date)")
+        op.execute("ALTER TABLE appointments_partitioned ADD PRIMARY KEY (id, date)")
+        op.execute("ALTER TABLE appointments_partitioned ADD FOREIGN KEY (master_id) REFERENCES masters (id)")
+        op.execute("ALTER TABLE appointments_partitioned ADD FOREIGN KEY (client_id) REFERENCES clients (id)")
+
+        first = bind.execute(sa.text("SELECT MIN(date) FROM appointments")).scalar() or date.today().isoformat()
+        for name, start, end in month_ranges(first, MONTHS_AHEAD):
+            op.execute(f"CREATE TABLE {name} PARTITION OF appointments_partitioned FOR VALUES FROM ('{start}') TO ('{end}')")
+        op.execute("CREATE TABLE appointments_default PARTITION OF appointments_partitioned DEFAULT")
+
+        op.execute("""
+            CREATE FUNCTION appointments_mirror() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    DELETE FROM appointments_partitioned WHERE id = OLD.id;
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO appointments_partitioned SELECT NEW.*;
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+        op.execute("""
+            CREATE TRIGGER appointments_mirror AFTER INSERT OR UPDATE OR DELETE ON appointments
+            FOR EACH ROW EXECUTE FUNCTION appointments_mirror()
+        """)
+
+        for _, start, end in month_ranges(first, MONTHS_AHEAD):
+            bind.execute(sa.text("""
+                INSERT INTO appointments_partitioned
+                SELECT a.* FROM appointments a
+                WHERE a.date >= :start AND a.date < :end
+                  AND NOT EXISTS (SELECT 1 FROM appointments_partitioned p WHERE p.id = a.id)
+            """), {"start": start, "end": end})
+        bind.execute(sa.text("""
+            INSERT INTO appointments_partitioned
+            SELECT a.* FROM appointments a
+            WHERE NOT EXISTS (SELECT 1 FROM appointments_partitioned p WHERE p.id = a.id)
+        """))
+
+    # Сверка и подмена таблиц в одной транзакции, запись на время блокировки ждет
+    op.execute("LOCK TABLE appointments IN SHARE ROW EXCLUSIVE MODE")
+    op.execute("""
+        DELETE FROM appointments_partitioned p
+        WHERE NOT EXISTS (SELECT 1 FROM appointments a WHERE a.id = p.id AND ROW(a.*) IS NOT DISTINCT FROM ROW(p.*))
+    """)
+    op.execute("""
+        INSERT INTO appointments_partitioned
+        SELECT a.* FROM appointments a
+        WHERE NOT EXISTS (SELECT 1 FROM appointments_partitioned p WHERE p.id = a.id)
+    """)
+    op.execute("DROP TRIGGER appointments_mirror ON appointments")
+    op.execute("DROP FUNCTION appointments_mirror()")
+    op.execute("ALTER TABLE appointments RENAME TO appointments_unpartitioned")
+    op.execute("ALTER TABLE appointments_partitioned RENAME TO appointments")
+    op.execute("ALTER SEQUENCE appointments_id_seq OWNED BY appointments.id")
+    op.execute("DROP TABLE appointments_unpartitioned")
+
+    # Индексы создаются на родительской таблице и наследуются секциями
+    op.create_index('ix_appointments_id', 'appointments', ['id'], unique=False)
+    op.create_index('ix_appointments_date', 'appointments', ['date'], unique=False)
+    op.create_index('ix_appointments_client_id_date', 'appointments', ['client_id', 'date'], unique=False)
+    op.execute(
+        "CREATE INDEX ix_appointments_fulltext ON appointments USING GIN "
+        "(to_tsvector('russian'::regconfig, client_name || ' ' || coalesce(comment, '')))"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        op.drop_index('ix_appointments_date', table_name='appointments')
+    else:
+        op.execute("CREATE TABLE appointments_plain (LIKE appointments INCLUDING DEFAULTS)")
+        op.execute("INSERT INTO appointments_plain SELECT * FROM appointments")
+        op.execute("ALTER TABLE appointments_plain ADD PRIMARY KEY (id)")
+        op.execute("ALTER TABLE appointments_plain ADD FOREIGN KEY (master_id) REFERENCES masters (id)")
+        op.execute("ALTER TABLE appointments_plain ADD FOREIGN KEY (client_id) REFERENCES clients (id)")
+        op.execute("ALTER SEQUENCE appointments_id_seq OWNED BY appointments_plain.id")
+        op.execute("DROP TABLE appointments")
+        op.execute("ALTER TABLE appointments_plain RENAME TO appointments")
+        op.create_index('ix_appointments_id', 'appointments', ['id'], unique=False)
+        op.create_index('ix_appointments_client_id_date', 'appointments', ['client_id', 'date'], unique=False)
+        op.execute(
+            "CREATE INDEX ix_appointments_fulltext ON appointments USING GIN "
+            "(to_tsvector('russian'::regconfig, client_name || ' ' || coalesce(comment, '')))"
+        )
+    op.drop_index(op.f('ix_appointments_archive_client_id'), table_name='appointments_archive')
+    op.drop_index(op.f('ix_appointments_archive_date'), table_name='appointments_archive')
+    op.drop_table('appointments_archive')
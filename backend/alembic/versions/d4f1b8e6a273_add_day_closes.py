@@ -0,0 +1,46 @@
+"""add day closes
+
+Revision ID: d4f1b8e6a273
+Revises: b7e3a9d2c145
+Create Date: 2026-10-23 10:15:42.904116
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f1b8e6a273'
+down_revision: Union[str, Sequence[str], None] = 'b7e3a9d2c145'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('day_closes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('salon_id', sa.Integer(), server_default='1', nullable=False),
+    sa.Column('date', sa.String(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('action', sa.String(), nullable=False),
+    sa.Column('cash', sa.Float(), server_default='0', nullable=False),
+    sa.Column('card', sa.Float(), server_default='0', nullable=False),
+    sa.Column('appointments_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('masters', sa.Text(), nullable=True),
+    sa.Column('reason', sa.Text(), nullable=True),
+    sa.Column('created_by', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['salon_id'], ['salons.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('salon_id', 'date', 'version', name='uq_day_closes_salon_id_date_version')
+    )
+    op.create_index(op.f('ix_day_closes_id'), 'day_closes', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_day_closes_id'), table_name='day_closes')
+    op.drop_table('day_closes')
@@ -0,0 +1,69 @@
+"""add appointment series
+
+Revision ID: e6a9c3f1b7d4
+Revises: c5f28d1e9a47
+Create Date: 2026-10-20 14:37:52.904116
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6a9c3f1b7d4'
+down_revision: Union[str, Sequence[str], None] = 'c5f28d1e9a47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('appointment_series',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('master_id', sa.Integer(), nullable=False),
+    sa.Column('client_name', sa.String(), nullable=False),
+    sa.Column('client_id', sa.Integer(), nullable=True),
+    sa.Column('comment', sa.Text(), nullable=True),
+    sa.Column('time', sa.String(), nullable=False),
+    sa.Column('duration', sa.Integer(), nullable=True),
+    sa.Column('freq', sa.String(length=10), nullable=False),
+    sa.Column('interval', sa.Integer(), nullable=False),
+    sa.Column('start_date', sa.String(), nullable=False),
+    sa.Column('until', sa.String(), nullable=True),
+    sa.Column('excluded_dates', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['client_id'], ['clients.id'], ),
+    sa.ForeignKeyConstraint(['master_id'], ['masters.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_appointment_series_id'), 'appointment_series', ['id'], unique=False)
+    op.create_index(op.f('ix_appointment_series_master_id'), 'appointment_series', ['master_id'], unique=False)
+
+    # На секционированной таблице столбцы и индекс добавляются на родителе и наследуются секциями
+    with op.batch_alter_table('appointments') as batch_op:
+        batch_op.add_column(sa.Column('series_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('occurrence_date', sa.String(), nullable=True))
+        batch_op.create_foreign_key('fk_appointments_series_id', 'appointment_series', ['series_id'], ['id'])
+    op.create_index('ix_appointments_series_id_occurrence_date', 'appointments', ['series_id', 'occurrence_date'], unique=False)
+
+    op.add_column('appointments_archive', sa.Column('series_id', sa.Integer(), nullable=True))
+    op.add_column('appointments_archive', sa.Column('occurrence_date', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('appointments_archive', 'occurrence_date')
+    op.drop_column('appointments_archive', 'series_id')
+
+    op.drop_index('ix_appointments_series_id_occurrence_date', table_name='appointments')
+    with op.batch_alter_table('appointments') as batch_op:
+        batch_op.drop_constraint('fk_appointments_series_id', type_='foreignkey')
+        batch_op.drop_column('occurrence_date')
+        batch_op.drop_column('series_id')
+
+    op.drop_index(op.f('ix_appointment_series_master_id'), table_name='appointment_series')
+    op.drop_index(op.f('ix_appointment_series_id'), table_name='appointment_series')
+    op.drop_table('appointment_series')
@@ -0,0 +1,38 @@
+"""reminder marks keyed by appointment key
+
+Revision ID: e8c2a5f7d391
+Revises: d4f1b8e6a273
+Create Date: 2026-10-24 09:12:05.331870
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8c2a5f7d391'
+down_revision: Union[str, Sequence[str], None] = 'd4f1b8e6a273'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Напоминания вхождений серий отмечаются виртуальным id ("s{series_id}-{YYYYMMDD}")
+    with op.batch_alter_table('reminder_marks') as batch_op:
+        batch_op.alter_column('appointment_id', existing_nullable=False, type_=sa.String(length=32),
+                              postgresql_using='appointment_id::text')
+    with op.batch_alter_table('reminder_marks') as batch_op:
+        batch_op.alter_column('appointment_id', new_column_name='appointment_key', existing_nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DELETE FROM reminder_marks WHERE appointment_key LIKE 's%'")
+    with op.batch_alter_table('reminder_marks') as batch_op:
+        batch_op.alter_column('appointment_key', new_column_name='appointment_id', existing_nullable=False)
+    with op.batch_alter_table('reminder_marks') as batch_op:
+        batch_op.alter_column('appointment_id', existing_nullable=False, type_=sa.Integer(),
+                              postgresql_using='appointment_id::integer')
@@ -0,0 +1,164 @@
+"""add salons
+
+Revision ID: f2b8d4a6c913
+Revises: e6a9c3f1b7d4
+Create Date: 2026-10-21 10:05:13.271946
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b8d4a6c913'
+down_revision: Union[str, Sequence[str], None] = 'e6a9c3f1b7d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Существующие данные переходят в первый салон
+DEFAULT_SALON_ID = 1
+# Таблицы, в которых появляется salon_id (с внешним ключом на salons)
+TENANT_TABLES = ('masters', 'clients', 'appointments', 'appointment_series', 'expenses')
+
+MONTHLY_TOTALS_REFILL = """
+    INSERT INTO monthly_totals (salon_id, month, master_id, income_cash, income_card, completed_count, expenses)
+    SELECT salon_id, month, master_id, SUM(cash), SUM(card), SUM(completed), SUM(amount)
+    FROM (
+        SELECT salon_id, substr(date, 1, 7) AS month, master_id,
+               COALESCE(cash_payment, 0) AS cash, COALESCE(card_payment, 0) AS card, 1 AS completed, 0 AS amount
+        FROM appointments WHERE status = 'completed' AND master_id IS NOT NULL
+        UNION ALL
+        SELECT salon_id, substr(date, 1, 7), master_id,
+               COALESCE(cash_payment, 0), COALESCE(card_payment, 0), 1, 0
+        FROM appointments_archive WHERE status = 'completed' AND master_id IS NOT NULL
+        UNION ALL
+        SELECT salon_id, substr(date, 1, 7), COALESCE(master_id, 0), 0, 0, 0, amount
+        FROM expenses
+    ) AS rows
+    GROUP BY salon_id, month, master_id
+"""
+
+
+def create_monthly_totals(primary_key) -> None:
+    columns = [
+        sa.Column('month', sa.String(length=7), nullable=False),
+        sa.Column('master_id', sa.Integer(), nullable=False),
+        sa.Column('income_cash', sa.Float(), nullable=False),
+        sa.Column('income_card', sa.Float(), nullable=False),
+        sa.Column('completed_count', sa.Integer(), nullable=False),
+        sa.Column('expenses', sa.Float(), nullable=False),
+    ]
+    if 'salon_id' in primary_key:
+        columns.insert(0, sa.Column('salon_id', sa.Integer(), nullable=False))
+    op.create_table('monthly_totals', *columns, sa.PrimaryKeyConstraint(*primary_key))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('salons',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('admin_chat_ids', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_salons_id'), 'salons', ['id'], unique=False)
+    op.execute(f"INSERT INTO salons (id, name) VALUES ({DEFAULT_SALON_ID}, 'WANT')")
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("SELECT setval('salons_id_seq', (SELECT MAX(id) FROM salons))")
+
+    # На секционированной appointments столбец и индексы добавляются на родителе
+    for table in TENANT_TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column(
+                'salon_id', sa.Integer(), nullable=False, server_default=str(DEFAULT_SALON_ID)
+            ))
+            batch_op.create_foreign_key(f'fk_{table}_salon_id', 'salons', ['salon_id'], ['id'])
+    op.add_column('appointments_archive', sa.Column(
+        'salon_id', sa.Integer(), nullable=False, server_default=str(DEFAULT_SALON_ID)
+    ))
+
+    # Индексы по дате начинаются с salon_id
+    op.create_index(op.f('ix_masters_salon_id'), 'masters', ['salon_id'], unique=False)
+    op.create_index(op.f('ix_appointment_series_salon_id'), 'appointment_series', ['salon_id'], unique=False)
+    op.drop_index('ix_appointments_date', table_name='appointments')
+    op.create_index('ix_appointments_salon_id_date', 'appointments', ['salon_id', 'date'], unique=False)
+    op.drop_index(op.f('ix_appointments_archive_date'), table_name='appointments_archive')
+    op.create_index('ix_appointments_archive_salon_id_date', 'appointments_archive', ['salon_id', 'date'], unique=False)
+    op.drop_index(op.f('ix_expenses_date'), table_name='expenses')
+    op.create_index('ix_expenses_salon_id_date', 'expenses', ['salon_id', 'date'], unique=False)
+
+    # Имена клиентов уникальны в пределах салона
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_constraint('clients_normalized_name_key', 'clients', type_='unique')
+        op.execute("DROP INDEX IF EXISTS ix_clients_normalized_name_prefix")
+        op.execute(
+            "CREATE INDEX ix_clients_salon_id_normalized_name_prefix "
+            "ON clients (salon_id, normalized_name text_pattern_ops)"
+        )
+        op.create_unique_constraint('uq_clients_salon_id_normalized_name', 'clients', ['salon_id', 'normalized_name'])
+    else:
+        # Безымянное ограничение SQLite снимается пересозданием таблицы без него
+        clients = sa.Table('clients', sa.MetaData(),
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('name', sa.String(), nullable=False),
+            sa.Column('normalized_name', sa.String(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('salon_id', sa.Integer(), sa.ForeignKey('salons.id', name='fk_clients_salon_id'),
+                      nullable=False, server_default=str(DEFAULT_SALON_ID)),
+            sa.Index('ix_clients_id', 'id')
+        )
+        with op.batch_alter_table('clients', copy_from=clients, recreate='always') as batch_op:
+            batch_op.create_unique_constraint('uq_clients_salon_id_normalized_name', ['salon_id', 'normalized_name'])
+
+    # Итоги пересоздаются с ключом (salon_id, month, master_id)
+    op.drop_table('monthly_totals')
+    create_monthly_totals(('salon_id', 'month', 'master_id'))
+    op.execute(MONTHLY_TOTALS_REFILL)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('monthly_totals')
+    create_monthly_totals(('month', 'master_id'))
+    op.execute("""
+        INSERT INTO monthly_totals (month, master_id, income_cash, income_card, completed_count, expenses)
+        SELECT substr(date, 1, 7), master_id,
+               COALESCE(SUM(cash_payment), 0), COALESCE(SUM(card_payment), 0), COUNT(*), 0
+        FROM appointments
+        WHERE status = 'completed' AND master_id IS NOT NULL
+        GROUP BY substr(date, 1, 7), master_id
+    """)
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_constraint('uq_clients_salon_id_normalized_name', 'clients', type_='unique')
+        op.execute("DROP INDEX IF EXISTS ix_clients_salon_id_normalized_name_prefix")
+        op.execute(
+            "CREATE INDEX ix_clients_normalized_name_prefix "
+            "ON clients (normalized_name text_pattern_ops)"
+        )
+        op.create_unique_constraint('clients_normalized_name_key', 'clients', ['normalized_name'])
+    else:
+        with op.batch_alter_table('clients') as batch_op:
+            batch_op.drop_constraint('uq_clients_salon_id_normalized_name', type_='unique')
+            batch_op.create_unique_constraint('uq_clients_normalized_name', ['normalized_name'])
+
+    op.drop_index('ix_expenses_salon_id_date', table_name='expenses')
+    op.create_index(op.f('ix_expenses_date'), 'expenses', ['date'], unique=False)
+    op.drop_index('ix_appointments_archive_salon_id_date', table_name='appointments_archive')
+    op.create_index(op.f('ix_appointments_archive_date'), 'appointments_archive', ['date'], unique=False)
+    op.drop_index('ix_appointments_salon_id_date', table_name='appointments')
+    op.create_index('ix_appointments_date', 'appointments', ['date'], unique=False)
+    op.drop_index(op.f('ix_appointment_series_salon_id'), table_name='appointment_series')
+    op.drop_index(op.f('ix_masters_salon_id'), table_name='masters')
+
+    op.drop_column('appointments_archive', 'salon_id')
+    for table in reversed(TENANT_TABLES):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_constraint(f'fk_{table}_salon_id', type_='foreignkey')
+            batch_op.drop_column('salon_id')
+
+    op.drop_index(op.f('ix_salons_id'), table_name='salons')
+    op.drop_table('salons')
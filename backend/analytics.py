@@ -0,0 +1,160 @@
+import os
+from datetime import date as dt_date
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import select, union_all
+from sqlalchemy.orm import Session
+
+import recurrence
+from models import AppointmentArchiveDB, AppointmentDB
+
+# Рабочий день салона (часы), относительно него считается загрузка
+WORK_DAY_START = int(os.getenv("WORK_DAY_START", "9"))
+WORK_DAY_END = int(os.getenv("WORK_DAY_END", "21"))
+
+
+def load_columns(
+    db: Session,
+    salon_id: int,
+    start_date: str,
+    end_date: str,
+    master_id: Optional[int] = None
+) -> Dict[str, np.ndarray]:
+    """Загрузка записей салона за диапазон (с архивом) в виде столбцов (master_id, date, time, duration, status)"""
+    queries = []
+    for table in (AppointmentDB, AppointmentArchiveDB):
+        query = select(
+            table.master_id, table.date, table.time, table.duration, table.status
+        ).where(table.salon_id == salon_id, table.date >= start_date, table.date <= end_date)
+        if master_id is not None:
+            query = query.where(table.master_id == master_id)
+        queries.append(query)
+
+    rows = db.execute(union_all(*queries)).all()
+    # Вхождения повторяющихся записей, развернутые только для этого окна
+    rows += [
+        (int(o["masterId"]), o["date"], o["time"], o["duration"], o["status"])
+        for o in recurrence.expand(db, salon_id, start_date, end_date, master_id)
+    ]
+    master_ids, dates, times, durations, statuses = zip(*rows) if rows else ((), (), (), (), ())
+    return {
+        "master_id": np.array(master_ids, dtype=np.int64),
+        "date": np.array(dates, dtype="datetime64[D]"),
+        "time": np.array(times, dtype="U5"),
+        "duration": np.array([d or 0 for d in durations], dtype=np.int64),
+        "status": np.array(statuses, dtype="U16")
+    }
+
+
+def parse_minutes(times: np.ndarray) -> np.ndarray:
+    """"HH:MM" -> минуты от начала суток"""
+    if times.size == 0:
+        return np.zeros(0, dtype=np.int64)
+    parts = np.char.partition(times, ":")
+    return parts[:, 0].astype(np.int64) * 60 + parts[:, 2].astype(np.int64)
+
+
+def compute_utilization(
+    columns: Dict[str, np.ndarray],
+    master_ids: List[int],
+    start_date: str,
+    end_date: str,
+    today: Optional[str] = None
+) -> dict:
+    """Загрузка мастеров: занятые минуты против рабочих по дням и часам, доля отмен и неявок.
+
+    Все вычисления векторные (NumPy), без циклов по записям."""
+    start = np.datetime64(start_date, "D")
+    days_count = int((np.datetime64(end_date, "D") - start).astype(int)) + 1
+    hours = np.arange(WORK_DAY_START, WORK_DAY_END)
+    work_minutes_per_day = (WORK_DAY_END - WORK_DAY_START) * 60
+    masters_count = len(master_ids)
+
+    # Индекс мастера для каждой записи; записи неизвестных мастеров отбрасываются
+    master_ids_sorted = np.array(sorted(master_ids), dtype=np.int64)
+    if masters_count:
+        master_index = np.clip(np.searchsorted(master_ids_sorted, columns["master_id"]), 0, masters_count - 1)
+        known = master_ids_sorted[master_index] == columns["master_id"]
+    else:
+        master_index = np.zeros(len(columns["master_id"]), dtype=np.int64)
+        known = np.zeros(len(columns["master_id"]), dtype=bool)
+
+    day_index = (columns["date"] - start).astype(np.int64)
+    start_minutes = parse_minutes(columns["time"])
+    end_minutes = start_minutes + columns["duration"]
+
+    status = columns["status"]
+    completed = status == "completed"
+    cancelled = status == "cancelled"
+    today_value = np.datetime64(today or dt_date.today().isoformat(), "D")
+    no_show = (status == "scheduled") & (columns["date"] < today_value)
+    booked = known & ~cancelled
+
+    # Занятые минуты в пределах рабочего дня
+    work_start, work_end = WORK_DAY_START * 60, WORK_DAY_END * 60
+    booked_minutes = np.clip(np.minimum(end_minutes, work_end) - np.maximum(start_minutes, work_start), 0, None)
+    booked_minutes = np.where(booked, booked_minutes, 0)
+
+    # Мастер x день
+    flat_index = master_index * days_count + day_index
+    by_day = np.bincount(
+        flat_index[booked], weights=booked_minutes[booked], minlength=masters_count * days_count
+    ).reshape(masters_count, days_count)
+
+    # Мастер x час: пересечение каждой записи с часовыми интервалами
+    hour_starts = hours * 60
+    overlap = np.clip(
+        np.minimum(end_minutes[:, None], hour_starts[None, :] + 60) - np.maximum(start_minutes[:, None], hour_starts[None, :]),
+        0, None
+    )
+    booked_overlap = overlap[booked]
+    by_hour = np.stack([
+        np.bincount(master_index[booked], weights=booked_overlap[:, h], minlength=masters_count)
+        for h in range(len(hours))
+    ], axis=1) if len(hours) else np.zeros((masters_count, 0))
+
+    def count_by_master(mask: np.ndarray) -> np.ndarray:
+        return np.bincount(master_index[known & mask], minlength=masters_count)
+
+    total_counts = count_by_master(np.ones(len(status), dtype=bool))
+    completed_counts = count_by_master(completed)
+    cancelled_counts = count_by_master(cancelled)
+    no_show_counts = count_by_master(no_show)
+    booked_totals = by_day.sum(axis=1)
+    working_total = work_minutes_per_day * days_count
+    day_labels = np.datetime_as_string(start + np.arange(days_count), unit="D")
+
+    result = {}
+    for i, master_id in enumerate(master_ids_sorted.tolist()):
+        total = int(total_counts[i])
+        busy_days = np.nonzero(by_day[i])[0]
+        result[str(master_id)] = {
+            "bookedMinutes": int(booked_totals[i]),
+            "workingMinutes": working_total,
+            "utilization": round(float(booked_totals[i]) / working_total, 4) if working_total else 0.0,
+            "appointments": total,
+            "completed": int(completed_counts[i]),
+            "cancelled": int(cancelled_counts[i]),
+            "noShow": int(no_show_counts[i]),
+            "cancellationRate": round(cancelled_counts[i] / total, 4) if total else 0.0,
+            "noShowRate": round(no_show_counts[i] / total, 4) if total else 0.0,
+            "days": {
+                str(day_labels[d]): {
+                    "bookedMinutes": int(by_day[i, d]),
+                    "utilization": round(float(by_day[i, d]) / work_minutes_per_day, 4)
+                }
+                for d in busy_days
+            },
+            "hours": {
+                f"{hour:02d}": round(float(by_hour[i, h]) / (60 * days_count), 4)
+                for h, hour in enumerate(hours.tolist())
+            }
+        }
+
+    return {
+        "startDate": start_date,
+        "endDate": end_date,
+        "workDay": {"start": f"{WORK_DAY_START:02d}:00", "end": f"{WORK_DAY_END:02d}:00"},
+        "masters": result
+    }
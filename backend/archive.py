@@ -0,0 +1,106 @@
+"""Перенос старых проведенных и отмененных записей в холодный архив.
+
+Запуск: python archive.py --before YYYY-MM-DD [--parquet DIR]
+
+Строки переносятся помесячно отдельными транзакциями в appointments_archive,
+с --parquet дополнительно сохраняются в файлы appointments_YYYY-MM.parquet
+(нужен pyarrow). Итоги monthly_totals и client_totals не меняются: архивные
+записи в них учитываются, rebuild_* тоже читают архив. Отчеты по диапазону дат
+(stats, pnl по дням и неделям, загрузка, зарплата) читают записи вместе с архивом.
+"""
+import argparse
+import os
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from cache import bus
+from database import SessionLocal
+from models import AppointmentArchiveDB, AppointmentDB
+
+# Активные записи не архивируются
+ARCHIVE_STATUSES = ("completed", "cancelled")
+COLUMNS = [column.name for column in AppointmentDB.__table__.columns]
+
+
+def write_parquet(rows: list, path: str):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Для --parquet нужен pyarrow: pip install pyarrow")
+    table = pa.Table.from_pylist(rows)
+    pq.write_table(table, path, compression="zstd")
+
+
+def next_month(month: str) -> str:
+    year, number = int(month[:4]), int(month[5:7])
+    return f"{year + 1}-01" if number == 12 else f"{year}-{number + 1:02d}"
+
+
+def archive_month(db: Session, month: str, before: str, parquet_dir: Optional[str] = None) -> int:
+    """Архивирует записи одного месяца (YYYY-MM) с датой раньше before; возвращает число строк"""
+    # Границы по самой дате, чтобы на PostgreSQL читалась и чистилась одна секция
+    start, end = f"{month}-01", min(f"{next_month(month)}-01", before)
+    query = db.query(AppointmentDB).filter(
+        AppointmentDB.date >= start,
+        AppointmentDB.date < end,
+        AppointmentDB.status.in_(ARCHIVE_STATUSES)
+    )
+    rows = [{name: getattr(apt, name) for name in COLUMNS} for apt in query]
+    if not rows:
+        return 0
+
+    if parquet_dir:
+        write_parquet(rows, os.path.join(parquet_dir, f"appointments_{month}.parquet"))
+    archived_at = datetime.utcnow()
+    db.bulk_insert_mappings(AppointmentArchiveDB, [{**row, "archived_at": archived_at} for row in rows])
+    db.query(AppointmentDB).filter(
+        AppointmentDB.date >= start,
+        AppointmentDB.date < end,
+        AppointmentDB.id.in_([row["id"] for row in rows])
+    ).delete(synchronize_session=False)
+    db.commit()
+    return len(rows)
+
+
+def archive_before(db: Session, before: str, parquet_dir: Optional[str] = None) -> dict:
+    """Архивирует все подходящие записи до даты before, по месяцам"""
+    months = [
+        month for (month,) in db.query(func.substr(AppointmentDB.date, 1, 7)).filter(
+            AppointmentDB.date < before,
+            AppointmentDB.status.in_(ARCHIVE_STATUSES)
+        ).distinct().order_by(func.substr(AppointmentDB.date, 1, 7))
+    ]
+    result = {}
+    for month in months:
+        result[month] = archive_month(db, month, before, parquet_dir)
+    if result:
+        # Кэши дней и индексы поиска в работающих воркерах
+        bus.publish("*")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Архивирование старых записей")
+    parser.add_argument("--before", required=True, help="Архивировать записи с датой раньше (YYYY-MM-DD)")
+    parser.add_argument("--parquet", help="Каталог для файлов Parquet (необязательно)")
+    args = parser.parse_args()
+    datetime.strptime(args.before, "%Y-%m-%d")
+    if args.parquet and not os.path.isdir(args.parquet):
+        parser.error(f"Каталог {args.parquet} не существует")
+
+    db = SessionLocal()
+    try:
+        result = archive_before(db, args.before, args.parquet)
+    finally:
+        db.close()
+    for month, count in result.items():
+        print(f"{month}: {count}")
+    print(f"Перенесено в архив: {sum(result.values())} записей")
+
+
+if __name__ == "__main__":
+    main()
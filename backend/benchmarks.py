@@ -0,0 +1,314 @@
+"""Бенчмарки бэкенда на синтетических данных.
+
+Запуск: python benchmarks.py [имя ...] (без аргументов — все)
+"""
+import sys
+import time
+
+import numpy as np
+
+
+def timed(fn, repeat: int = 5) -> float:
+    """Лучшее время из нескольких запусков, в миллисекундах"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def bench_utilization():
+    """Загрузка мастеров за год (как /api/analytics/utilization): 20 мастеров, ~8 записей в день.
+
+    SQLite в памяти со схемой из models.py; время — весь путь запроса: load_columns
+    (выборка и перевод в столбцы NumPy) плюс compute_utilization, и отдельно каждая часть."""
+    from datetime import date, timedelta
+
+    from sqlalchemy import create_engine, insert
+    from sqlalchemy.orm import sessionmaker
+
+    from analytics import compute_utilization, load_columns
+    from models import AppointmentDB, Base, MasterDB, SalonDB
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    rng = np.random.default_rng(0)
+    masters, days, per_day = 20, 365, 8
+    n = masters * days * per_day
+    first = date(2025, 1, 1)
+    rows = [
+        {"time": f"{h:02d}:00", "duration": int(duration), "client_name": "Клиент",
+         "date": (first + timedelta(days=int(d))).isoformat(), "status": str(status), "master_id": int(m)}
+        for d, m, h, duration, status in zip(
+            rng.integers(0, days, n), rng.integers(1, masters + 1, n), rng.integers(9, 20, n),
+            rng.choice([30, 60, 90, 120], n), rng.choice(["scheduled", "completed", "cancelled"], n, p=[0.2, 0.7, 0.1])
+        )
+    ]
+    with engine.begin() as conn:
+        conn.execute(insert(SalonDB), [{"id": 1, "name": "WANT"}])
+        conn.execute(insert(MasterDB), [{"id": i, "name": f"M{i}", "color": "pink"} for i in range(1, masters + 1)])
+        conn.execute(insert(AppointmentDB), rows)
+
+    session = sessionmaker(bind=engine)()
+    master_ids = list(range(1, masters + 1))
+    try:
+        def load():
+            return load_columns(session, 1, "2025-01-01", "2025-12-31")
+
+        columns = load()
+        load_ms = timed(load)
+        compute_ms = timed(lambda: compute_utilization(columns, master_ids, "2025-01-01", "2025-12-31"))
+        total_ms = timed(lambda: compute_utilization(load(), master_ids, "2025-01-01", "2025-12-31"))
+    finally:
+        session.close()
+    print(f"utilization: {n} записей, {masters} мастеров, {days} дней — {total_ms:.1f} мс "
+          f"(load_columns {load_ms:.1f} мс, compute_utilization {compute_ms:.1f} мс)")
+
+
+def bench_week_range():
+    """Запрос текущей недели (как /api/appointments/range) по мере накопления истории до 5 лет.
+
+    SQLite в памяти со схемой из models.py: время держится за счет индекса по (salon_id, date).
+    Отсечение месячных секций здесь не измеряется — см. pruning (PostgreSQL)."""
+    from datetime import date, timedelta
+
+    from sqlalchemy import create_engine, insert, select
+
+    from models import AppointmentDB, Base, MasterDB, SalonDB
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    rng = np.random.default_rng(0)
+    masters, per_day = 20, 8
+    today = date.today()
+    week_start = today - timedelta(days=today.weekday())
+    week_end = week_start + timedelta(days=6)
+    query = select(AppointmentDB).where(
+        AppointmentDB.salon_id == 1,
+        AppointmentDB.date >= week_start.isoformat(), AppointmentDB.date <= week_end.isoformat()
+    )
+
+    with engine.begin() as conn:
+        conn.execute(insert(SalonDB), [{"id": 1, "name": "WANT"}])
+        conn.execute(insert(MasterDB), [{"id": i, "name": f"M{i}", "color": "pink"} for i in range(1, masters + 1)])
+    for year in range(5):
+        # Каждый проход добавляет еще один год истории перед уже загруженной
+        first = today - timedelta(days=365 * (year + 1))
+        days = [(first + timedelta(days=d)).isoformat() for d in range(365)]
+        n = len(days) * masters * per_day
+        rows = [
+            {"time": f"{h:02d}:00", "duration": 60, "client_name": "Клиент", "date": days[d],
+             "status": "completed", "master_id": int(m), "cash_payment": 1000.0, "card_payment": 0.0}
+            for d, m, h in zip(rng.integers(0, len(days), n), rng.integers(1, masters + 1, n), rng.integers(9, 20, n))
+        ]
+        if year == 0:
+            rows += [dict(row, date=(week_start + timedelta(days=i % 7)).isoformat(), status="scheduled")
+                     for i, row in enumerate(rows[:masters * per_day * 7])]
+        with engine.begin() as conn:
+            conn.execute(insert(AppointmentDB), rows)
+
+        def run():
+            with engine.connect() as conn:
+                conn.execute(query).all()
+        total = (year + 1) * len(days) * masters * per_day
+        print(f"week_range: история {year + 1} г. (~{total} записей) — {timed(run, repeat=20):.2f} мс")
+
+
+def bench_pruning():
+    """Отсечение секций на PostgreSQL: неделя из таблицы, секционированной по месяцам, как после
+    миграции c5f28d1e9a47, против такой же несекционированной; 5 лет истории.
+
+    Нужна пустая база для опытов: BENCH_POSTGRES_URL=postgresql://...; без нее бенчмарк пропускается.
+    Таблицы bench_* создаются и удаляются в этой базе."""
+    import json
+    import os
+    from datetime import date, timedelta
+
+    from sqlalchemy import create_engine, text
+
+    from partitions import month_ranges
+
+    url = os.getenv("BENCH_POSTGRES_URL")
+    if not url:
+        print("pruning: пропущен — нужна пустая база PostgreSQL в BENCH_POSTGRES_URL")
+        return
+    engine = create_engine(url)
+    today = date.today()
+    first = date(today.year - 5, today.month, 1)
+    days, masters, per_day = (today - first).days + 1, 20, 8
+    week_start = today - timedelta(days=today.weekday())
+    week = {"start": week_start.isoformat(), "end": (week_start + timedelta(days=6)).isoformat()}
+    columns = "id bigint, salon_id integer, master_id integer, date varchar NOT NULL, time varchar"
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS bench_partitioned, bench_plain"))
+            conn.execute(text(f"CREATE TABLE bench_partitioned ({columns}, PRIMARY KEY (id, date)) PARTITION BY RANGE (date)"))
+            for name, start, end in month_ranges(first, 5 * 12 + 2):
+                conn.execute(text(f"CREATE TABLE bench_{name} PARTITION OF bench_partitioned FOR VALUES FROM ('{start}') TO ('{end}')"))
+            conn.execute(text(f"CREATE TABLE bench_plain ({columns}, PRIMARY KEY (id))"))
+            for table in ("bench_partitioned", "bench_plain"):
+                conn.execute(text(f"CREATE INDEX ON {table} (salon_id, date)"))
+                conn.execute(text(
+                    f"INSERT INTO {table} SELECT g, 1, 1 + g % :masters, "
+                    "to_char(CAST(:first AS date) + (g * 7919) % :days, 'YYYY-MM-DD'), '10:00' "
+                    "FROM generate_series(1, :n) g"
+                ), {"masters": masters, "first": first.isoformat(), "days": days, "n": days * masters * per_day})
+                conn.execute(text(f"ANALYZE {table}"))
+
+        for table in ("bench_plain", "bench_partitioned"):
+            query = text(f"SELECT * FROM {table} WHERE salon_id = 1 AND date >= :start AND date <= :end")
+            with engine.connect() as conn:
+                plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {query.text}"), week).scalar()
+                plan = json.loads(plan) if isinstance(plan, str) else plan
+                relations = set()
+                stack = [plan[0]["Plan"]]
+                while stack:
+                    node = stack.pop()
+                    if "Relation Name" in node:
+                        relations.add(node["Relation Name"])
+                    stack.extend(node.get("Plans", []))
+
+                def run():
+                    conn.execute(query, week).all()
+                print(f"pruning: {table}, {days * masters * per_day} записей — таблиц в плане {len(relations)}, "
+                      f"{timed(run, repeat=20):.2f} мс")
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS bench_partitioned, bench_plain"))
+
+
+def bench_tenants():
+    """Неделя одного салона (как /api/appointments/range) по мере подключения других салонов.
+
+    У каждого салона 10 мастеров и год истории; время держится за счет индекса
+    по (salon_id, date) — чужие салоны не попадают в диапазон индекса."""
+    from datetime import date, timedelta
+
+    from sqlalchemy import create_engine, insert, select
+
+    from models import AppointmentDB, Base, MasterDB, SalonDB
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    rng = np.random.default_rng(0)
+    masters, per_day = 10, 8
+    today = date.today()
+    week_start = today - timedelta(days=today.weekday())
+    week_end = week_start + timedelta(days=6)
+    first = week_end - timedelta(days=364)
+    days = [(first + timedelta(days=d)).isoformat() for d in range(365)]
+    query = select(AppointmentDB).where(
+        AppointmentDB.salon_id == 1,
+        AppointmentDB.date >= week_start.isoformat(), AppointmentDB.date <= week_end.isoformat()
+    )
+
+    for salon in range(1, 33):
+        first_master = (salon - 1) * masters + 1
+        n = len(days) * masters * per_day
+        rows = [
+            {"salon_id": salon, "time": f"{h:02d}:00", "duration": 60, "client_name": "Клиент", "date": days[d],
+             "status": "completed", "master_id": int(m), "cash_payment": 1000.0, "card_payment": 0.0}
+            for d, m, h in zip(rng.integers(0, len(days), n),
+                               rng.integers(first_master, first_master + masters, n), rng.integers(9, 20, n))
+        ]
+        with engine.begin() as conn:
+            conn.execute(insert(SalonDB), [{"id": salon, "name": f"Салон {salon}"}])
+            conn.execute(insert(MasterDB), [
+                {"id": i, "name": f"M{i}", "color": "pink", "salon_id": salon}
+                for i in range(first_master, first_master + masters)
+            ])
+            conn.execute(insert(AppointmentDB), rows)
+
+        if salon & (salon - 1) == 0:
+            def run():
+                with engine.connect() as conn:
+                    conn.execute(query).all()
+            print(f"tenants: салонов {salon} (~{salon * n} записей) — {timed(run, repeat=20):.2f} мс")
+
+
+def bench_formats():
+    """Месячный ответ /api/appointments/range (20 мастеров, ~8 записей в день):
+    размер тела и время кодирования для каждого формата и сжатия"""
+    from formats import APPOINTMENT_FIELDS, COLUMNAR, JSON, MSGPACK, Representation, brotli, encode, msgpack
+
+    rng = np.random.default_rng(0)
+    masters, days, per_day = 20, 31, 8
+    statuses = rng.choice(["scheduled", "completed", "cancelled"], masters * days * per_day, p=[0.3, 0.6, 0.1])
+    comments = ["", "", "", "Окрашивание, длинные волосы", "Первый визит", "Перенос с прошлой недели"]
+    records, apt_id = {}, 100000
+    for day in range(days):
+        date = f"2025-03-{day + 1:02d}"
+        items = records.setdefault(date, [])
+        for master in range(1, masters + 1):
+            for slot in range(per_day):
+                status = str(statuses[apt_id - 100000])
+                items.append({
+                    "id": str(apt_id), "time": f"{9 + slot:02d}:00", "duration": int(rng.choice([30, 60, 90])),
+                    "clientName": f"Клиент {int(rng.integers(1, 3000))}", "comment": comments[int(rng.integers(0, len(comments)))],
+                    "status": status, "date": date, "masterId": str(master),
+                    "payment": {"cash": float(rng.integers(10, 50) * 100), "card": 0.0} if status == "completed" else None
+                })
+                apt_id += 1
+
+    media_types = [JSON, COLUMNAR] + ([MSGPACK] if msgpack is not None else [])
+    calendar_fields = tuple(field for field in APPOINTMENT_FIELDS if field != "comment")
+    total = days * masters * per_day
+    for fields, label in ((None, "все поля"), (calendar_fields, "без comment")):
+        print(f"formats: {total} записей за месяц, {label}")
+        for media_type in media_types:
+            for encoding in (None, "gzip") + (("br",) if brotli is not None else ()):
+                representation = Representation(media_type, fields, encoding)
+                body, applied = encode(records, representation)
+                ms = timed(lambda: encode(records, representation))
+                print(f"  {media_type:38} {applied or 'identity':8} {len(body):>9} байт  {ms:6.1f} мс")
+
+
+STARTUP_SCRIPT = """
+import asyncio, time
+started = time.perf_counter()
+import server
+imported = time.perf_counter()
+async def main():
+    async with server.lifespan(server.app):
+        ready = time.perf_counter()
+        print(f"{(imported - started) * 1000:.0f} {(ready - imported) * 1000:.0f}")
+asyncio.run(main())
+"""
+
+
+def bench_startup():
+    """Старт воркера в отдельном процессе: импорт приложения и lifespan до готовности.
+
+    SQLite во временном каталоге: первый запуск создает пустую базу, следующие сверяют ревизию"""
+    import os
+    import subprocess
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'startup.db')}", DATABASE_READ_URL="")
+        for run in range(4):
+            started = time.perf_counter()
+            output = subprocess.run(
+                [sys.executable, "-c", STARTUP_SCRIPT], env=env, capture_output=True, text=True,
+                cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+            ).stdout.split()
+            total = (time.perf_counter() - started) * 1000
+            label = "пустая база" if run == 0 else "схема на head"
+            print(f"startup: {label}: импорт {output[-2]} мс, lifespan {output[-1]} мс, процесс целиком {total:.0f} мс")
+
+
+BENCHMARKS = {
+    "utilization": bench_utilization,
+    "week_range": bench_week_range,
+    "pruning": bench_pruning,
+    "tenants": bench_tenants,
+    "formats": bench_formats,
+    "startup": bench_startup,
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
@@ -0,0 +1,175 @@
+import logging
+import os
+import select
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import text
+
+from database import engine
+
+logger = logging.getLogger(__name__)
+
+# Канал PostgreSQL, через который воркеры рассылают ключи для инвалидации
+CHANNEL = "cache_invalidation"
+
+
+class LocalCache:
+    """Кэш в памяти процесса. Записи помечаются тегами (master:{id}, day:{date}),
+    инвалидация по тегу удаляет все связанные записи.
+
+    Время последней инвалидации тега запоминается: значение, прочитанное с реплики
+    в пределах задержки репликации после инвалидации, может быть старым и не кэшируется"""
+
+    def __init__(self):
+        self._data: Dict[str, Any] = {}
+        self._tags: Dict[str, Set[str]] = {}
+        self._invalidated_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        return self._data.get(key)
+
+    def set(self, key: str, value: Any, tags: Iterable[str] = (), settle_seconds: float = 0.0) -> bool:
+        """settle_seconds — на сколько данные могут отставать (database.replica_lag); False — не сохранено"""
+        tags = (key, *tags)
+        with self._lock:
+            if settle_seconds > 0:
+                now = time.monotonic()
+                if any(now - self._invalidated_at.get(tag, float("-inf")) < settle_seconds for tag in (*tags, "*")):
+                    return False
+            self._data[key] = value
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+        return True
+
+    def invalidate(self, tag: str):
+        with self._lock:
+            self._invalidated_at[tag] = time.monotonic()
+            for key in self._tags.pop(tag, ()):
+                self._data.pop(key, None)
+            if len(self._invalidated_at) > 10000:
+                # Дольше минуты реплика не отстает (READ_AFTER_WRITE_SECONDS — секунды)
+                now = self._invalidated_at[tag]
+                self._invalidated_at = {t: at for t, at in self._invalidated_at.items() if now - at < 60 or t == "*"}
+
+    def clear(self):
+        with self._lock:
+            self._invalidated_at = {"*": time.monotonic()}
+            self._data.clear()
+            self._tags.clear()
+
+
+class InMemoryBus:
+    """Шина инвалидации в пределах одного процесса (для тестов и SQLite)"""
+
+    def __init__(self):
+        self._subscribers: List[Callable[[str], None]] = []
+
+    def subscribe(self, callback: Callable[[str], None]):
+        self._subscribers.append(callback)
+
+    def publish(self, *keys: str, local: bool = True):
+        """Рассылка ключей; local=False — только другим воркерам (свой процесс уже в курсе)"""
+        if local:
+            self._deliver(keys)
+
+    def _deliver(self, keys: Iterable[str]):
+        for key in keys:
+            for callback in self._subscribers:
+                try:
+                    callback(key)
+                except Exception as e:
+                    logger.error(f"Cache invalidation error for {key}: {e}")
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class PostgresBus(InMemoryBus):
+    """Шина инвалидации между воркерами и репликами через LISTEN/NOTIFY"""
+
+    def __init__(self, engine):
+        super().__init__()
+        self._engine = engine
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Метка процесса: свои уведомления слушатель пропускает
+        self._origin = uuid.uuid4().hex[:12]
+
+    def publish(self, *keys: str, local: bool = True):
+        # Свой процесс обрабатываем сразу, остальным рассылаем NOTIFY
+        super().publish(*keys, local=local)
+        try:
+            with self._engine.connect() as conn:
+                for key in keys:
+                    conn.execute(
+                        text("SELECT pg_notify(:channel, :payload)"),
+                        {"channel": CHANNEL, "payload": f"{self._origin}|{key}"}
+                    )
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error publishing cache invalidation: {e}")
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._listen, name="cache-invalidation", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+
+    def _listen(self):
+        while not self._stopped.is_set():
+            raw = None
+            try:
+                raw = self._engine.raw_connection()
+                conn = raw.driver_connection
+                conn.set_isolation_level(0)  # autocommit, иначе уведомления не приходят
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+                while not self._stopped.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    keys = []
+                    while conn.notifies:
+                        origin, _, key = conn.notifies.pop(0).payload.partition("|")
+                        if origin != self._origin:
+                            keys.append(key)
+                    self._deliver(keys)
+            except Exception as e:
+                logger.error(f"Cache invalidation listener error: {e}")
+                # После обрыва соединения локальные данные могли устареть
+                self._deliver(["*"])
+                self._stopped.wait(1.0)
+            finally:
+                if raw is not None:
+                    raw.invalidate()
+
+
+def create_bus():
+    if os.getenv("CACHE_BUS", "").lower() == "memory" or engine.dialect.name != "postgresql":
+        return InMemoryBus()
+    return PostgresBus(engine)
+
+
+cache = LocalCache()
+bus = create_bus()
+
+
+def _on_invalidate(key: str):
+    if key == "*":
+        cache.clear()
+    else:
+        cache.invalidate(key)
+
+
+bus.subscribe(_on_invalidate)
@@ -0,0 +1,349 @@
+import re
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, case, event, func, or_
+from sqlalchemy.orm import Session
+
+from cache import bus
+from database import dialect_insert
+from models import AppointmentArchiveDB, AppointmentDB, ClientDB, ClientTotalsDB, MasterDB
+
+
+# Ключ session.info: клиенты, созданные в текущей транзакции, — (салон, id, имя)
+PENDING_CLIENTS = "new_clients"
+
+
+def normalize_name(name: str) -> str:
+    """Нормализация имени клиента: регистр, ё/е, лишние пробелы"""
+    return re.sub(r"\s+", " ", name.strip().lower().replace("ё", "е"))
+
+
+def get_or_create_client(db: Session, salon_id: int, name: str) -> Optional[int]:
+    """ID клиента салона по имени; новый клиент создается одним INSERT ... ON CONFLICT"""
+    normalized = normalize_name(name)
+    if not normalized:
+        return None
+
+    stmt = dialect_insert(db, ClientDB).values(salon_id=salon_id, name=name.strip(), normalized_name=normalized)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ClientDB.salon_id, ClientDB.normalized_name],
+        set_={"normalized_name": stmt.excluded.normalized_name}
+    ).returning(ClientDB.id, ClientDB.name)
+    client_id, client_name = db.execute(stmt).one()
+    # В индекс и другим воркерам — только после коммита (_publish_new_clients)
+    db.info.setdefault(PENDING_CLIENTS, []).append((salon_id, client_id, client_name))
+    return client_id
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_new_clients(session: Session):
+    # Другие воркеры вставляют клиента в свой индекс (_on_invalidate), а не перестраивают его
+    keys = [
+        f"client:{salon_id}:{client_id}:{client_name}"
+        for salon_id, client_id, client_name in session.info.pop(PENDING_CLIENTS, ())
+        if client_index.add(salon_id, client_id, client_name)
+    ]
+    if keys:
+        bus.publish(*keys, local=False)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_new_clients(session: Session):
+    session.info.pop(PENDING_CLIENTS, None)
+
+
+class ClientIndex:
+    """Префиксный индекс клиентов одного салона в памяти: отсортированный список (слово, id).
+
+    Ищется начало любого слова имени (имя или фамилия), затем подстрока.
+    Индекс строится при первом запросе и дополняется при создании клиентов."""
+
+    def __init__(self, salon_id: int):
+        self.salon_id = salon_id
+        self._keys: List[Tuple[str, int]] = []
+        self._names: Dict[int, str] = {}
+        self._normalized: Dict[int, str] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _insert(self, client_id: int, name: str):
+        normalized = normalize_name(name)
+        self._names[client_id] = name
+        self._normalized[client_id] = normalized
+        for word in {normalized, *normalized.split(" ")}:
+            insort(self._keys, (word, client_id))
+
+    def load(self, db: Session):
+        with self._lock:
+            if self._loaded:
+                return
+            self._keys, self._names, self._normalized = [], {}, {}
+            rows = db.query(ClientDB.id, ClientDB.name).filter(ClientDB.salon_id == self.salon_id)
+            for client_id, name in rows:
+                self._insert(client_id, name)
+            self._loaded = True
+
+    def add(self, client_id: int, name: str) -> bool:
+        """Добавляет клиента; False, если он уже есть в индексе"""
+        with self._lock:
+            if not self._loaded or client_id in self._names:
+                return False
+            self._insert(client_id, name)
+            return True
+
+    def reset(self):
+        with self._lock:
+            self._loaded = False
+
+    def search(self, db: Session, query: str, limit: int = 10) -> List[dict]:
+        self.load(db)
+        normalized = normalize_name(query)
+        if not normalized:
+            return []
+
+        found: List[int] = []
+        with self._lock:
+            position = bisect_left(self._keys, (normalized, -1))
+            while position < len(self._keys) and len(found) < limit:
+                word, client_id = self._keys[position]
+                if not word.startswith(normalized):
+                    break
+                if client_id not in found:
+                    found.append(client_id)
+                position += 1
+
+            # Неточное совпадение: подстрока в любом месте имени
+            if len(found) < limit:
+                for client_id, name in self._normalized.items():
+                    if normalized in name and client_id not in found:
+                        found.append(client_id)
+                        if len(found) >= limit:
+                            break
+
+            return [{"id": str(client_id), "name": self._names[client_id]} for client_id in found]
+
+
+class SalonClientIndexes:
+    """Индексы клиентов по салонам: поиск салона не просматривает клиентов других салонов"""
+
+    def __init__(self):
+        self._indexes: Dict[int, ClientIndex] = {}
+        self._lock = threading.Lock()
+
+    def _index(self, salon_id: int) -> ClientIndex:
+        with self._lock:
+            if salon_id not in self._indexes:
+                self._indexes[salon_id] = ClientIndex(salon_id)
+            return self._indexes[salon_id]
+
+    def load(self, db: Session, salon_id: int):
+        self._index(salon_id).load(db)
+
+    def add(self, salon_id: int, client_id: int, name: str) -> bool:
+        return self._index(salon_id).add(client_id, name)
+
+    def search(self, db: Session, salon_id: int, query: str, limit: int = 10) -> List[dict]:
+        return self._index(salon_id).search(db, query, limit)
+
+    def reset(self, salon_id: Optional[int] = None):
+        with self._lock:
+            indexes = list(self._indexes.values()) if salon_id is None else [self._indexes.get(salon_id)]
+        for index in indexes:
+            if index is not None:
+                index.reset()
+
+
+client_index = SalonClientIndexes()
+
+
+def _on_invalidate(key: str):
+    if key in ("clients", "*"):
+        client_index.reset()
+    elif key.startswith("clients:"):
+        client_index.reset(int(key[8:]))
+    elif key.startswith("client:"):
+        # client:{салон}:{id}:{имя} — новый клиент из другого воркера; имя может содержать ":"
+        salon_id, client_id, name = key[7:].split(":", 2)
+        client_index.add(int(salon_id), int(client_id), name)
+
+
+bus.subscribe(_on_invalidate)
+
+
+def client_snapshot(apt: AppointmentDB) -> Optional[Tuple[int, int, int, int, int, float]]:
+    """Вклад записи в итоги клиента: (клиент, мастер, записей, проведено, отменено, оплачено)"""
+    if apt.client_id is None:
+        return None
+    completed = apt.status == "completed"
+    spent = (apt.cash_payment or 0.0) + (apt.card_payment or 0.0) if completed else 0.0
+    return (apt.client_id, apt.master_id, 1, int(completed), int(apt.status == "cancelled"), spent)
+
+
+def add_to_client(
+    db: Session,
+    client_id: int,
+    master_id: int,
+    count: int = 0,
+    completed: int = 0,
+    cancelled: int = 0,
+    spent: float = 0.0
+):
+    """Атомарно прибавляет дельту к итогам клиента у мастера"""
+    if not (count or completed or cancelled or spent):
+        return
+
+    stmt = dialect_insert(db, ClientTotalsDB).values(
+        client_id=client_id,
+        master_id=master_id,
+        appointments_count=count,
+        completed_count=completed,
+        cancelled_count=cancelled,
+        total_spent=spent
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ClientTotalsDB.client_id, ClientTotalsDB.master_id],
+        set_={
+            "appointments_count": ClientTotalsDB.appointments_count + stmt.excluded.appointments_count,
+            "completed_count": ClientTotalsDB.completed_count + stmt.excluded.completed_count,
+            "cancelled_count": ClientTotalsDB.cancelled_count + stmt.excluded.cancelled_count,
+            "total_spent": ClientTotalsDB.total_spent + stmt.excluded.total_spent
+        }
+    )
+    db.execute(stmt)
+
+
+def apply_client_change(db: Session, before: Optional[tuple], after: Optional[tuple]):
+    """Переносит изменение записи в итоги клиента. before/after — результаты client_snapshot"""
+    if before is not None and after is not None and before[:2] == after[:2]:
+        client_id, master_id = after[:2]
+        add_to_client(db, client_id, master_id, *(a - b for a, b in zip(after[2:], before[2:])))
+        return
+    if before is not None:
+        client_id, master_id, *values = before
+        add_to_client(db, client_id, master_id, *(-value for value in values))
+    if after is not None:
+        add_to_client(db, *after)
+
+
+def rebuild_client_totals(db: Session):
+    """Полный пересчет итогов клиентов из записей, включая архив"""
+    totals: Dict[tuple, dict] = {}
+    for table in (AppointmentDB, AppointmentArchiveDB):
+        completed = table.status == "completed"
+        paid = func.coalesce(table.cash_payment, 0) + func.coalesce(table.card_payment, 0)
+        rows = db.query(
+            table.client_id,
+            table.master_id,
+            func.count(table.id),
+            func.sum(case((completed, 1), else_=0)),
+            func.sum(case((table.status == "cancelled", 1), else_=0)),
+            func.sum(case((completed, paid), else_=0))
+        ).filter(table.client_id.isnot(None)).group_by(table.client_id, table.master_id)
+        for client_id, master_id, count, completed_count, cancelled_count, spent in rows:
+            row = totals.setdefault((client_id, master_id), {
+                "client_id": client_id, "master_id": master_id, "appointments_count": 0,
+                "completed_count": 0, "cancelled_count": 0, "total_spent": 0.0
+            })
+            row["appointments_count"] += count
+            row["completed_count"] += completed_count or 0
+            row["cancelled_count"] += cancelled_count or 0
+            row["total_spent"] += spent or 0.0
+
+    db.query(ClientTotalsDB).delete()
+    if totals:
+        db.bulk_insert_mappings(ClientTotalsDB, list(totals.values()))
+
+
+def client_history(
+    db: Session,
+    salon_id: int,
+    client_id: int,
+    limit: int = 50,
+    cursor: Optional[str] = None
+) -> Optional[dict]:
+    """История визитов и LTV клиента салона; None — клиента нет или он из другого салона.
+
+    Итоги берутся из client_totals, визиты — по индексу (client_id, date) от новых к старым.
+    cursor — значение nextCursor предыдущей страницы ("YYYY-MM-DD:id")."""
+    client = db.get(ClientDB, client_id)
+    if client is None or client.salon_id != salon_id:
+        return None
+
+    totals = db.query(ClientTotalsDB).filter(ClientTotalsDB.client_id == client_id).all()
+    master_names = dict(
+        db.query(MasterDB.id, MasterDB.name).filter(MasterDB.id.in_([t.master_id for t in totals])).all()
+    ) if totals else {}
+    # Первый и последний визит с учетом архива; в ленте визитов только оперативная таблица
+    visit_dates = [
+        date for table in (AppointmentDB, AppointmentArchiveDB)
+        for date in db.query(func.min(table.date), func.max(table.date)).filter(
+            table.client_id == client_id,
+            table.status == "completed"
+        ).one() if date
+    ]
+    first_visit = min(visit_dates, default=None)
+    last_visit = max(visit_dates, default=None)
+
+    appointments = sum(t.appointments_count for t in totals)
+    completed = sum(t.completed_count for t in totals)
+    cancelled = sum(t.cancelled_count for t in totals)
+    spent = sum(t.total_spent for t in totals)
+    favourite = max(
+        (t for t in totals if t.completed_count > 0),
+        key=lambda t: (t.completed_count, t.total_spent),
+        default=None
+    )
+
+    query = db.query(AppointmentDB).filter(AppointmentDB.client_id == client_id)
+    if cursor:
+        cursor_date, _, cursor_id = cursor.rpartition(":")
+        query = query.filter(or_(
+            AppointmentDB.date < cursor_date,
+            and_(AppointmentDB.date == cursor_date, AppointmentDB.id < int(cursor_id))
+        ))
+    visits = query.order_by(AppointmentDB.date.desc(), AppointmentDB.id.desc()).limit(limit + 1).all()
+    next_cursor = f"{visits[limit - 1].date}:{visits[limit - 1].id}" if len(visits) > limit else None
+
+    return {
+        "client": {"id": str(client.id), "name": client.name},
+        "totals": {
+            "appointments": appointments,
+            "completed": completed,
+            "cancelled": cancelled,
+            "totalSpent": spent,
+            "averageCheck": round(spent / completed, 2) if completed else 0.0,
+            "firstVisit": first_visit,
+            "lastVisit": last_visit
+        },
+        "favouriteMaster": {
+            "id": str(favourite.master_id),
+            "name": master_names.get(favourite.master_id),
+            "visits": favourite.completed_count
+        } if favourite else None,
+        "masters": {
+            str(t.master_id): {
+                "name": master_names.get(t.master_id),
+                "appointments": t.appointments_count,
+                "completed": t.completed_count,
+                "cancelled": t.cancelled_count,
+                "totalSpent": t.total_spent
+            }
+            for t in totals if t.appointments_count > 0
+        },
+        "visits": [
+            {
+                "id": str(apt.id),
+                "date": apt.date,
+                "time": apt.time,
+                "duration": apt.duration,
+                "status": apt.status,
+                "masterId": str(apt.master_id),
+                "comment": apt.comment or "",
+                "payment": {"cash": apt.cash_payment, "card": apt.card_payment} if apt.status == "completed" else None
+            }
+            for apt in visits[:limit]
+        ],
+        "nextCursor": next_cursor
+    }
@@ -1,18 +1,40 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session, sessionmaker
+from fastapi import Request
+from contextlib import contextmanager
+from typing import Iterator, List
+import ast
+import glob
+import hashlib
+import logging
 import os
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
 # Получение параметров подключения из переменных окружения
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Необязательная реплика только для чтения
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+# Сколько секунд после записи клиент читает с основной базы (задержка репликации)
+READ_AFTER_WRITE_SECONDS = float(os.getenv("READ_AFTER_WRITE_SECONDS", "5"))
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "default-secret-key")
+# Салон для запросов без токена и заголовка X-Salon-Id (и для мастеров, зарегистрированных без салона)
+DEFAULT_SALON_ID = int(os.getenv("DEFAULT_SALON_ID", "1"))
+# Проверка ревизии схемы при старте: strict — не запускаться при расхождении, warn — предупредить, off — не проверять
+SCHEMA_CHECK = os.getenv("SCHEMA_CHECK", "warn").lower()
+# Сколько соединений пула открыть при старте воркера
+POOL_WARM_CONNECTIONS = int(os.getenv("POOL_WARM_CONNECTIONS", "2"))
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+MIGRATIONS_DIR = os.path.join(os.path.dirname(ALEMBIC_INI), "alembic", "versions")
 
-# Создание движка SQLAlchemy с параметрами для более надежного подключения
-engine = create_engine(
-    DATABASE_URL,
+logger = logging.getLogger(__name__)
+
+# Параметры пула для более надежного подключения
+ENGINE_OPTIONS = dict(
     pool_size=10,          # Размер пула соединений
     max_overflow=20,       # Максимальное количество дополнительных соединений
     pool_recycle=3600,     # Пересоздание соединений каждые 60 минут
@@ -20,11 +42,17 @@ engine = create_engine(
     echo=False             # Отключение вывода SQL запросов в консоль
 )
 
+# Создание движка SQLAlchemy
+engine = create_engine(DATABASE_URL, **ENGINE_OPTIONS)
+# Движок для чтения: реплика, если задана, иначе основная база
+read_engine = create_engine(DATABASE_READ_URL, **ENGINE_OPTIONS) if DATABASE_READ_URL else engine
+
 # Создание сессии
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
-# Импорт базового класса для моделей
-Base = declarative_base()
+# Время последней записи по клиентам (хэш токена или IP); записи других воркеров приходят через шину (note_write)
+_recent_writes: dict = {}
 
 # Функция для получения сессии базы данных
 def get_db():
@@ -37,7 +65,147 @@ def get_db():
     finally:
         db.close()
 
-# Функция для инициализации базы данных
-def init_db():
-    from models import Base
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+def _client_key(request: Request) -> str:
+    # Хэш, а не сам токен: ключ рассылается другим воркерам
+    raw = request.headers.get("authorization") or (request.client.host if request.client else "")
+    return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+def has_replica() -> bool:
+    return read_engine is not engine
+
+def note_write(key: str):
+    now = time.monotonic()
+    if len(_recent_writes) > 10000:
+        for client, written_at in list(_recent_writes.items()):
+            if now - written_at >= READ_AFTER_WRITE_SECONDS:
+                del _recent_writes[client]
+    _recent_writes[key] = now
+
+# Отметка о записи: следующие чтения этого клиента идут с основной базы. Возвращает ключ клиента,
+# его нужно разослать другим воркерам (следующий запрос может прийти в другой процесс)
+def mark_write(request: Request) -> str:
+    key = _client_key(request)
+    note_write(key)
+    return key
+
+# Фабрика сессий чтения: основная база сразу после записи клиента, иначе реплика
+def read_session_factory(request: Request) -> sessionmaker:
+    written_at = _recent_writes.get(_client_key(request))
+    if written_at is not None and time.monotonic() - written_at < READ_AFTER_WRITE_SECONDS:
+        return SessionLocal
+    return ReadSessionLocal
+
+# Сколько секунд данные сессии могут отставать от основной базы: для реплики — окно задержки
+# репликации, кэш не заполняется из нее сразу после инвалидации (LocalCache.set, settle_seconds)
+def replica_lag(db: Session) -> float:
+    return READ_AFTER_WRITE_SECONDS if has_replica() and db.get_bind() is read_engine else 0.0
+
+# Функция для получения сессии чтения (реплика с учетом задержки репликации)
+def get_read_db(request: Request):
+    db = read_session_factory(request)()
+    try:
+        yield db
+    except Exception as e:
+        db.rollback()
+        raise e
+    finally:
+        db.close()
+
+# Несколько сессий чтения с общим снимком базы: запросы в них идут параллельно и видят одни данные.
+# PostgreSQL: первая сессия экспортирует снимок (pg_export_snapshot), остальные его импортируют.
+# На других базах или если экспорт недоступен — одна сессия, запросы в ней выполняются по очереди
+@contextmanager
+def snapshot_sessions(factory: sessionmaker, count: int) -> Iterator[List[Session]]:
+    sessions = [factory()]
+    try:
+        if count > 1 and sessions[0].get_bind().dialect.name == "postgresql":
+            try:
+                sessions[0].execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY"))
+                snapshot_id = sessions[0].execute(text("SELECT pg_export_snapshot()")).scalar()
+                for _ in range(count - 1):
+                    db = factory()
+                    sessions.append(db)
+                    db.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY"))
+                    db.execute(text("SET TRANSACTION SNAPSHOT :id"), {"id": snapshot_id})
+            except DBAPIError:
+                for db in sessions:
+                    db.rollback()
+                sessions[1:] = []
+        yield sessions
+    finally:
+        for db in sessions:
+            db.rollback()
+            db.close()
+
+# INSERT с поддержкой ON CONFLICT для текущего диалекта (PostgreSQL в проде, SQLite локально)
+def dialect_insert(db, table):
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite.insert(table)
+    return postgresql.insert(table)
+
+# Head-ревизии по файлам alembic/versions. Сам alembic не импортируется: это заметная
+# доля времени старта воркера, а для сверки достаточно revision/down_revision из файлов
+def migration_heads() -> set:
+    revisions, parents = set(), set()
+    for path in glob.glob(os.path.join(MIGRATIONS_DIR, "*.py")):
+        with open(path, encoding="utf-8") as f:
+            tree = ast.parse(f.read())
+        values = {}
+        for node in tree.body:
+            target = node.targets[0] if isinstance(node, ast.Assign) else getattr(node, "target", None)
+            if isinstance(target, ast.Name) and target.id in ("revision", "down_revision") and node.value is not None:
+                values[target.id] = ast.literal_eval(node.value)
+        if values.get("revision"):
+            revisions.add(values["revision"])
+            down = values.get("down_revision")
+            parents.update(down if isinstance(down, (list, tuple)) else [down] if down else [])
+    return revisions - parents
+
+# Проверка схемы при старте: ревизия базы сравнивается с head миграций (схемой владеет Alembic,
+# create_all не выполняется). Пустая SQLite (локальная разработка) создается по моделям
+# и помечается head. Возвращает "ok", "bootstrapped", "drift" или "skipped"
+def check_schema(mode: str = SCHEMA_CHECK) -> str:
+    if mode == "off":
+        return "skipped"
+
+    heads = migration_heads()
+    with engine.connect() as conn:
+        tables = inspect(conn).get_table_names()
+        current = set()
+        if "alembic_version" in tables:
+            current = {row[0] for row in conn.execute(text("SELECT version_num FROM alembic_version"))}
+        if current == heads:
+            return "ok"
+        if not tables and engine.dialect.name == "sqlite":
+            from alembic.config import Config
+            from alembic.runtime.migration import MigrationContext
+            from alembic.script import ScriptDirectory
+            from models import Base, SalonDB
+            Base.metadata.create_all(bind=conn)
+            # Салон по умолчанию создает миграция f2b8d4a6c913; без него мастер не зарегистрируется
+            conn.execute(SalonDB.__table__.insert().values(id=DEFAULT_SALON_ID, name="WANT"))
+            MigrationContext.configure(conn).stamp(ScriptDirectory.from_config(Config(ALEMBIC_INI)), "heads")
+            conn.commit()
+            logger.warning(f"Empty database: schema created from models and stamped {', '.join(sorted(heads))}")
+            return "bootstrapped"
+
+    message = (
+        f"Database revision {', '.join(sorted(current)) or 'none'} does not match migrations head "
+        f"{', '.join(sorted(heads))}: run 'alembic upgrade head'"
+    )
+    if mode == "strict":
+        raise RuntimeError(message)
+    logger.warning(message)
+    return "drift"
+
+# Открывает соединения пула заранее: первые запросы не ждут подключения к базе
+def warm_pool(target=engine, connections: int = POOL_WARM_CONNECTIONS):
+    opened = []
+    try:
+        for _ in range(min(connections, target.pool.size())):
+            conn = target.connect()
+            opened.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in opened:
+            conn.close()
\ No newline at end of file
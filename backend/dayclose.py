@@ -0,0 +1,320 @@
+"""Закрытие дня (Z-отчет).
+
+Итоги дня (наличные/безнал по мастерам) замораживаются в day_closes. Строки только
+добавляются: закрытие — версия с итогами, переоткрытие — версия с причиной; последняя
+версия определяет состояние дня. Пока день закрыт, проведение, отмена проведенной записи,
+изменение оплаты и удаление проведенной записи этого дня отклоняются (check_day_open) —
+сначала день переоткрывают, потом закрывают заново. Повторное закрытие получает новую
+версию, и отчет показывает разницу с прошлой.
+
+Поток в процессе API раз в сутки (DAY_CLOSE_TIME) закрывает прошедшие дни, которые
+еще ни разу не закрывались (за DAY_CLOSE_CATCHUP_DAYS дней — после простоя), и отправляет
+отчет админам салона. Переоткрытые дни сам не закрывает. Несколько воркеров не закроют
+день дважды: версия уникальна в пределах (salon_id, date), отчет отправляет тот, чья
+вставка прошла.
+"""
+import json
+import logging
+import os
+import threading
+from datetime import date as dt_date, datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import func, select, union_all
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import AppointmentArchiveDB, AppointmentDB, DayCloseDB, MasterDB, SalonDB
+from notifications import dispatcher, salon_chat_ids
+
+logger = logging.getLogger(__name__)
+
+DAY_CLOSE_ENABLED = os.getenv("DAY_CLOSE_ENABLED", "true").lower() == "true"
+# Время ежедневного закрытия (закрывается вчерашний день и пропущенные до него)
+DAY_CLOSE_TIME = os.getenv("DAY_CLOSE_TIME", "00:30")
+DAY_CLOSE_CATCHUP_DAYS = int(os.getenv("DAY_CLOSE_CATCHUP_DAYS", "7"))
+AUTO = "auto"
+
+
+class DayStateError(ValueError):
+    """День уже закрыт (или не закрыт) — действие не подходит к его состоянию"""
+
+
+def latest_version(db: Session, salon_id: int, date: str) -> Optional[DayCloseDB]:
+    return db.query(DayCloseDB).filter(
+        DayCloseDB.salon_id == salon_id, DayCloseDB.date == date
+    ).order_by(DayCloseDB.version.desc()).first()
+
+
+def is_closed(db: Session, salon_id: int, date: str) -> bool:
+    row = latest_version(db, salon_id, date)
+    return row is not None and row.action == "close"
+
+
+def check_day_open(db: Session, salon_id: int, date: str):
+    if is_closed(db, salon_id, date):
+        raise DayStateError(f"Day {date} is closed, reopen it first")
+
+
+def day_totals(db: Session, salon_id: int, date: str) -> dict:
+    """Итоги проведенных записей дня (с архивом) по мастерам — в формате кассы"""
+    queries = [
+        select(
+            table.master_id,
+            func.sum(table.cash_payment),
+            func.sum(table.card_payment),
+            func.count()
+        ).where(
+            table.salon_id == salon_id, table.date == date, table.status == "completed"
+        ).group_by(table.master_id)
+        for table in (AppointmentDB, AppointmentArchiveDB)
+    ]
+    rows = db.execute(union_all(*queries)).all()
+    names = dict(db.query(MasterDB.id, MasterDB.name).filter(
+        MasterDB.id.in_(list({row[0] for row in rows}))
+    ).all()) if rows else {}
+
+    masters: Dict[str, dict] = {}
+    for master_id, cash, card, count in rows:
+        stats = masters.setdefault(str(master_id), {
+            "name": names.get(master_id, ""), "cash": 0.0, "card": 0.0, "total": 0.0, "count": 0
+        })
+        stats["cash"] += cash or 0.0
+        stats["card"] += card or 0.0
+        stats["total"] += (cash or 0.0) + (card or 0.0)
+        stats["count"] += count
+
+    total_cash = sum(m["cash"] for m in masters.values())
+    total_card = sum(m["card"] for m in masters.values())
+    return {
+        "date": date,
+        "total": {"cash": total_cash, "card": total_card, "total": total_cash + total_card},
+        "masters": masters,
+        "appointments_count": sum(m["count"] for m in masters.values()),
+    }
+
+
+def snapshot_to_api(row: DayCloseDB) -> dict:
+    result = {
+        "date": row.date,
+        "version": row.version,
+        "action": row.action,
+        "by": row.created_by,
+        "at": row.created_at.isoformat() if row.created_at else None,
+    }
+    if row.action == "close":
+        result.update({
+            "total": {"cash": row.cash, "card": row.card, "total": row.cash + row.card},
+            "masters": json.loads(row.masters or "{}"),
+            "appointments_count": row.appointments_count,
+        })
+    else:
+        result["reason"] = row.reason
+    return result
+
+
+def closed_by(master: MasterDB) -> str:
+    """created_by для закрытия и переоткрытия вручную: администратор из токена, id — на случай тезок"""
+    return f"{master.name} (#{master.id})"
+
+
+def _insert(db: Session, row: DayCloseDB) -> DayCloseDB:
+    db.add(row)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Ту же версию только что записал другой воркер или запрос
+        db.rollback()
+        raise DayStateError(f"Day {row.date} was changed concurrently")
+    db.refresh(row)
+    return row
+
+
+def close_day(db: Session, salon_id: int, date: str, by: Optional[str] = None) -> DayCloseDB:
+    """Заморозить итоги дня новой версией; день не должен быть закрыт или быть в будущем"""
+    if date > dt_date.today().isoformat():
+        raise DayStateError(f"Day {date} has not come yet")
+    current = latest_version(db, salon_id, date)
+    if current is not None and current.action == "close":
+        raise DayStateError(f"Day {date} is already closed")
+
+    totals = day_totals(db, salon_id, date)
+    return _insert(db, DayCloseDB(
+        salon_id=salon_id,
+        date=date,
+        version=(current.version if current else 0) + 1,
+        action="close",
+        cash=totals["total"]["cash"],
+        card=totals["total"]["card"],
+        appointments_count=totals["appointments_count"],
+        masters=json.dumps(totals["masters"], ensure_ascii=False),
+        created_by=by,
+    ))
+
+
+def reopen_day(db: Session, salon_id: int, date: str, reason: str, by: Optional[str] = None) -> DayCloseDB:
+    """Переоткрыть закрытый день для исправлений; снимок закрытия остается в истории"""
+    current = latest_version(db, salon_id, date)
+    if current is None or current.action != "close":
+        raise DayStateError(f"Day {date} is not closed")
+    return _insert(db, DayCloseDB(
+        salon_id=salon_id, date=date, version=current.version + 1, action="reopen",
+        reason=reason, created_by=by,
+    ))
+
+
+def day_history(db: Session, salon_id: int, start_date: str, end_date: str) -> List[DayCloseDB]:
+    return db.query(DayCloseDB).filter(
+        DayCloseDB.salon_id == salon_id, DayCloseDB.date >= start_date, DayCloseDB.date <= end_date
+    ).order_by(DayCloseDB.date, DayCloseDB.version).all()
+
+
+def _money(value: float) -> str:
+    return f"{value:.2f}₽"
+
+
+def _diff(new: float, old: float) -> str:
+    delta = new - old
+    return f" ({'+' if delta > 0 else ''}{delta:.2f})" if abs(delta) >= 0.005 else ""
+
+
+def format_close_report(row: DayCloseDB, previous: Optional[DayCloseDB] = None, salon: Optional[SalonDB] = None) -> str:
+    """Z-отчет; при повторном закрытии — с разницей по сравнению с прошлым закрытием"""
+    title = "✏️ <b>Исправленное закрытие дня" if previous else "🧾 <b>Закрытие дня"
+    message = f"{title} {row.date}</b>"
+    if salon is not None:
+        message += f" — {salon.name}"
+    if previous:
+        message += f"\nВерсия {row.version}, было: {_money(previous.cash + previous.card)}"
+    old_masters = json.loads(previous.masters or "{}") if previous else {}
+    message += f"\n\n📊 Выручка: {_money(row.cash + row.card)}"
+    message += _diff(row.cash + row.card, previous.cash + previous.card) if previous else ""
+    message += f"\n💵 Наличные: {_money(row.cash)}" + (_diff(row.cash, previous.cash) if previous else "")
+    message += f"\n💳 Безнал: {_money(row.card)}" + (_diff(row.card, previous.card) if previous else "")
+    message += f"\n📋 Записей проведено: {row.appointments_count}"
+
+    masters = json.loads(row.masters or "{}")
+    if masters or old_masters:
+        message += "\n\n👥 По мастерам:"
+        for master_id in sorted(set(masters) | set(old_masters), key=lambda m: (masters.get(m) or old_masters[m])["name"]):
+            stats = masters.get(master_id) or {**old_masters[master_id], "cash": 0.0, "card": 0.0, "total": 0.0, "count": 0}
+            message += f"\n• {stats['name']}: {_money(stats['total'])} ({stats['count']} зап.)"
+            if previous:
+                message += _diff(stats["total"], old_masters.get(master_id, {}).get("total", 0.0))
+            message += f"\n  💵 {_money(stats['cash'])} | 💳 {_money(stats['card'])}"
+    return message
+
+
+def format_reopen_report(row: DayCloseDB, salon: Optional[SalonDB] = None) -> str:
+    message = f"🔓 <b>День {row.date} переоткрыт</b>"
+    if salon is not None:
+        message += f" — {salon.name}"
+    message += f"\nПричина: {row.reason}"
+    if row.created_by:
+        message += f"\nКто: {row.created_by}"
+    return message
+
+
+def notify_day_change(db: Session, row: DayCloseDB, sender: Callable[[str, str], None] = dispatcher.send):
+    """Отчет о закрытии или переоткрытии дня админам салона"""
+    salon = db.query(SalonDB).filter(SalonDB.id == row.salon_id).first()
+    if row.action == "close":
+        previous = db.query(DayCloseDB).filter(
+            DayCloseDB.salon_id == row.salon_id, DayCloseDB.date == row.date,
+            DayCloseDB.action == "close", DayCloseDB.version < row.version
+        ).order_by(DayCloseDB.version.desc()).first()
+        message = format_close_report(row, previous, salon)
+    else:
+        message = format_reopen_report(row, salon)
+    for chat_id in salon_chat_ids(salon):
+        sender(chat_id, message)
+
+
+def parse_close_time(value: str) -> tuple:
+    try:
+        parsed = datetime.strptime(value, "%H:%M")
+    except ValueError:
+        logger.error(f"Invalid DAY_CLOSE_TIME {value!r}, using 00:30")
+        parsed = datetime.strptime("00:30", "%H:%M")
+    return parsed.hour, parsed.minute
+
+
+class DayCloser:
+    """Ежедневное закрытие дней всех салонов"""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        clock: Callable[[], datetime] = datetime.now,
+        sender: Callable[[str, str], None] = dispatcher.send,
+        close_time: str = DAY_CLOSE_TIME,
+        catchup_days: int = DAY_CLOSE_CATCHUP_DAYS
+    ):
+        self._session_factory = session_factory
+        self._clock = clock
+        self._sender = sender
+        self._close_time = parse_close_time(close_time)
+        self._catchup_days = catchup_days
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"closed": 0, "failed": 0}
+
+    def next_run(self, now: datetime) -> datetime:
+        hour, minute = self._close_time
+        run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        return run if run > now else run + timedelta(days=1)
+
+    def run_once(self) -> int:
+        """Закрывает прошедшие дни без закрытий; возвращает число закрытых дней"""
+        closed = 0
+        today = self._clock().date()
+        days = [(today - timedelta(days=i)).isoformat() for i in range(self._catchup_days, 0, -1)]
+        db = self._session_factory()
+        try:
+            for (salon_id,) in db.query(SalonDB.id).order_by(SalonDB.id).all():
+                done = {date for (date,) in db.query(DayCloseDB.date).filter(
+                    DayCloseDB.salon_id == salon_id, DayCloseDB.date.in_(days)
+                ).distinct()}
+                for date in days:
+                    if date in done:
+                        continue
+                    try:
+                        row = close_day(db, salon_id, date, AUTO)
+                    except DayStateError:
+                        continue  # закрыл другой воркер, он и отправит отчет
+                    notify_day_change(db, row, self._sender)
+                    closed += 1
+        except Exception as e:
+            db.rollback()
+            self.stats["failed"] += 1
+            logger.error(f"Day close error: {e}")
+        finally:
+            db.close()
+        self.stats["closed"] += closed
+        return closed
+
+    def _run(self):
+        # Сразу после старта — пропущенные за время простоя дни
+        self.run_once()
+        while not self._stopped.is_set():
+            now = self._clock()
+            if self._stopped.wait(max((self.next_run(now) - now).total_seconds(), 1.0)):
+                break
+            self.run_once()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="day-close", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+
+day_closer = DayCloser()
@@ -0,0 +1,216 @@
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import func, select, union_all
+from sqlalchemy.orm import Session
+
+from database import dialect_insert
+from models import AppointmentArchiveDB, AppointmentDB, ExpenseDB, MonthlyTotalsDB
+
+# master_id в помесячных итогах для расходов салона без привязки к мастеру
+GENERAL_MASTER_ID = 0
+
+
+def income_snapshot(apt: AppointmentDB) -> Tuple[int, str, int, float, float, int]:
+    """Вклад записи в помесячные итоги: (салон, месяц, мастер, наличные, безнал, проведено)"""
+    if apt.status == "completed":
+        return (apt.salon_id, apt.date[:7], apt.master_id, apt.cash_payment or 0.0, apt.card_payment or 0.0, 1)
+    return (apt.salon_id, apt.date[:7], apt.master_id, 0.0, 0.0, 0)
+
+
+def expense_snapshot(expense: ExpenseDB) -> Tuple[int, str, int, float]:
+    """Вклад расхода в помесячные итоги: (салон, месяц, мастер, сумма)"""
+    return (expense.salon_id, expense.date[:7], expense.master_id or GENERAL_MASTER_ID, expense.amount or 0.0)
+
+
+def add_to_month(
+    db: Session,
+    salon_id: int,
+    month: str,
+    master_id: int,
+    cash: float = 0.0,
+    card: float = 0.0,
+    count: int = 0,
+    expenses: float = 0.0
+):
+    """Атомарно прибавляет дельту к итогам месяца (INSERT ... ON CONFLICT DO UPDATE)"""
+    if not (cash or card or count or expenses):
+        return
+
+    stmt = dialect_insert(db, MonthlyTotalsDB).values(
+        salon_id=salon_id,
+        month=month,
+        master_id=master_id,
+        income_cash=cash,
+        income_card=card,
+        completed_count=count,
+        expenses=expenses
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[MonthlyTotalsDB.salon_id, MonthlyTotalsDB.month, MonthlyTotalsDB.master_id],
+        set_={
+            "income_cash": MonthlyTotalsDB.income_cash + stmt.excluded.income_cash,
+            "income_card": MonthlyTotalsDB.income_card + stmt.excluded.income_card,
+            "completed_count": MonthlyTotalsDB.completed_count + stmt.excluded.completed_count,
+            "expenses": MonthlyTotalsDB.expenses + stmt.excluded.expenses
+        }
+    )
+    db.execute(stmt)
+
+
+def apply_income_change(db: Session, before: Optional[tuple], after: Optional[tuple]):
+    """Переносит изменение записи в итоги. before/after — результаты income_snapshot (None — записи нет)"""
+    if before is not None and after is not None and before[:3] == after[:3]:
+        salon_id, month, master_id = after[:3]
+        add_to_month(db, salon_id, month, master_id, after[3] - before[3], after[4] - before[4], after[5] - before[5])
+        return
+    if before is not None:
+        salon_id, month, master_id, cash, card, count = before
+        add_to_month(db, salon_id, month, master_id, -cash, -card, -count)
+    if after is not None:
+        add_to_month(db, *after)
+
+
+def apply_expense_change(db: Session, before: Optional[tuple], after: Optional[tuple]):
+    """То же для расходов. before/after — результаты expense_snapshot"""
+    if before is not None:
+        salon_id, month, master_id, amount = before
+        add_to_month(db, salon_id, month, master_id, expenses=-amount)
+    if after is not None:
+        salon_id, month, master_id, amount = after
+        add_to_month(db, salon_id, month, master_id, expenses=amount)
+
+
+def rebuild_monthly_totals(db: Session):
+    """Полный пересчет помесячных итогов из записей (включая архив) и расходов"""
+    totals: Dict[tuple, dict] = {}
+
+    for table in (AppointmentDB, AppointmentArchiveDB):
+        month = func.substr(table.date, 1, 7)
+        income = db.query(
+            table.salon_id,
+            month,
+            table.master_id,
+            func.sum(table.cash_payment),
+            func.sum(table.card_payment),
+            func.count(table.id)
+        ).filter(table.status == "completed").group_by(table.salon_id, month, table.master_id)
+        for salon_id, row_month, master_id, cash, card, count in income:
+            row = totals.setdefault((salon_id, row_month, master_id), {
+                "salon_id": salon_id, "month": row_month, "master_id": master_id,
+                "income_cash": 0.0, "income_card": 0.0,
+                "completed_count": 0, "expenses": 0.0
+            })
+            row["income_cash"] += cash or 0.0
+            row["income_card"] += card or 0.0
+            row["completed_count"] += count
+
+    expense_month = func.substr(ExpenseDB.date, 1, 7)
+    expense_master = func.coalesce(ExpenseDB.master_id, GENERAL_MASTER_ID)
+    expenses = db.query(
+        ExpenseDB.salon_id, expense_month, expense_master, func.sum(ExpenseDB.amount)
+    ).group_by(ExpenseDB.salon_id, expense_month, expense_master)
+    for salon_id, row_month, master_id, amount in expenses:
+        row = totals.setdefault((salon_id, row_month, master_id), {
+            "salon_id": salon_id, "month": row_month, "master_id": master_id,
+            "income_cash": 0.0, "income_card": 0.0,
+            "completed_count": 0, "expenses": 0.0
+        })
+        row["expenses"] = amount or 0.0
+
+    db.query(MonthlyTotalsDB).delete()
+    if totals:
+        db.bulk_insert_mappings(MonthlyTotalsDB, list(totals.values()))
+
+
+def _period_key(date: str, period: str) -> str:
+    if period == "month":
+        return date[:7]
+    if period == "week":
+        day = datetime.strptime(date, "%Y-%m-%d")
+        return (day - timedelta(days=day.weekday())).strftime("%Y-%m-%d")
+    return date
+
+
+def _empty_totals() -> dict:
+    return {"cash": 0.0, "card": 0.0, "income": 0.0, "expenses": 0.0, "profit": 0.0}
+
+
+def _add(totals: dict, cash: float, card: float, expenses: float):
+    totals["cash"] += cash
+    totals["card"] += card
+    totals["income"] += cash + card
+    totals["expenses"] += expenses
+    totals["profit"] = totals["income"] - totals["expenses"]
+
+
+def profit_and_loss(
+    db: Session,
+    salon_id: int,
+    start_date: str,
+    end_date: str,
+    period: str = "month",
+    master_id: Optional[int] = None
+) -> dict:
+    """Доходы и расходы салона по периодам (день, неделя с понедельника, месяц), по мастерам и в целом.
+
+    Помесячный отчет читается из monthly_totals и охватывает месяцы целиком;
+    по дням и неделям данные группируются запросом к записям (с архивом) и расходам за диапазон."""
+    rows = []  # (дата или месяц, мастер, наличные, безнал, расходы)
+
+    if period == "month":
+        query = db.query(MonthlyTotalsDB).filter(
+            MonthlyTotalsDB.salon_id == salon_id,
+            MonthlyTotalsDB.month >= start_date[:7],
+            MonthlyTotalsDB.month <= end_date[:7]
+        )
+        if master_id is not None:
+            query = query.filter(MonthlyTotalsDB.master_id == master_id)
+        rows = [(t.month, t.master_id, t.income_cash, t.income_card, t.expenses) for t in query]
+    else:
+        queries = []
+        for table in (AppointmentDB, AppointmentArchiveDB):
+            query = select(
+                table.date, table.master_id, func.sum(table.cash_payment), func.sum(table.card_payment)
+            ).where(
+                table.salon_id == salon_id,
+                table.status == "completed",
+                table.date >= start_date,
+                table.date <= end_date
+            )
+            if master_id is not None:
+                query = query.where(table.master_id == master_id)
+            queries.append(query.group_by(table.date, table.master_id))
+        # Строки одного дня из записей и архива складываются ниже, по ключу периода
+        income = db.execute(union_all(*queries)).all()
+        expense_master = func.coalesce(ExpenseDB.master_id, GENERAL_MASTER_ID)
+        expenses = db.query(
+            ExpenseDB.date, expense_master, func.sum(ExpenseDB.amount)
+        ).filter(ExpenseDB.salon_id == salon_id, ExpenseDB.date >= start_date, ExpenseDB.date <= end_date)
+        if master_id is not None:
+            expenses = expenses.filter(ExpenseDB.master_id == master_id)
+        expenses = expenses.group_by(ExpenseDB.date, expense_master)
+        rows = [(d, m, cash or 0.0, card or 0.0, 0.0) for d, m, cash, card in income]
+        rows += [(d, m, 0.0, 0.0, amount or 0.0) for d, m, amount in expenses]
+
+    items: Dict[str, dict] = {}
+    total = _empty_totals()
+    for date, row_master_id, cash, card, expenses_amount in rows:
+        # После отмен в итогах могут оставаться нулевые строки
+        if not (cash or card or expenses_amount):
+            continue
+        key = _period_key(date, period)
+        item = items.setdefault(key, {"period": key, **_empty_totals(), "masters": {}})
+        _add(item, cash, card, expenses_amount)
+        _add(total, cash, card, expenses_amount)
+        if row_master_id != GENERAL_MASTER_ID:
+            master_totals = item["masters"].setdefault(str(row_master_id), _empty_totals())
+            _add(master_totals, cash, card, expenses_amount)
+
+    return {
+        "period": period,
+        "startDate": start_date,
+        "endDate": end_date,
+        "items": [items[key] for key in sorted(items)],
+        "total": total
+    }
@@ -0,0 +1,173 @@
+"""Форматы ответов для списков записей.
+
+Формат выбирается по заголовку Accept:
+- application/json — как раньше, массив объектов (по умолчанию);
+- application/vnd.want.columnar+json — колоночный JSON: по массиву на поле,
+  id и masterId числами, payment — [наличные, безнал] или null;
+- application/msgpack — тот же колоночный вид в MessagePack.
+
+Колоночный вид: {"fields": [...], "columns": {поле: [...]}, "groups": {ключ: [начало, количество]}};
+groups есть, если ответ сгруппирован (по дате или мастеру).
+Параметр fields=id,time,... оставляет только нужные поля (id — всегда).
+Ответы больше COMPRESS_MIN_BYTES сжимаются brotli или gzip по Accept-Encoding.
+"""
+import gzip
+import json
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from fastapi import HTTPException, Request, Response
+
+from singleflight import singleflight
+from stale import mark_stale, stale_store
+
+try:
+    import msgpack
+except ImportError:  # без msgpack формат недоступен, отдается JSON
+    msgpack = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON = "application/json"
+COLUMNAR = "application/vnd.want.columnar+json"
+MSGPACK = "application/msgpack"
+MSGPACK_ALIASES = (MSGPACK, "application/x-msgpack")
+
+APPOINTMENT_FIELDS = ("id", "time", "duration", "clientName", "comment", "status", "date", "masterId", "payment")
+# Поля, которые в компактных форматах передаются числами
+INT_FIELDS = ("id", "masterId")
+# Меньшие ответы не сжимаются: выигрыш меньше заголовков и затрат CPU
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+Records = Union[List[dict], Dict[str, List[dict]]]
+
+
+class Representation(NamedTuple):
+    media_type: str
+    fields: Optional[Tuple[str, ...]]
+    encoding: Optional[str]  # "br", "gzip" или None
+
+    @property
+    def key(self) -> str:
+        return f"{self.media_type}|{self.encoding or 'identity'}"
+
+
+def _accepted(header: str) -> List[str]:
+    """Значения заголовка Accept/Accept-Encoding без параметров, кроме явно запрещенных (q=0)"""
+    values = []
+    for part in header.lower().split(","):
+        value, *params = [item.strip() for item in part.split(";")]
+        if any(param.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000") for param in params):
+            continue
+        if value:
+            values.append(value)
+    return values
+
+
+def negotiate(request: Request, allowed_fields: Tuple[str, ...] = APPOINTMENT_FIELDS) -> Representation:
+    accept = _accepted(request.headers.get("accept", ""))
+    if msgpack is not None and any(value in MSGPACK_ALIASES for value in accept):
+        media_type = MSGPACK
+    elif COLUMNAR in accept:
+        media_type = COLUMNAR
+    else:
+        media_type = JSON
+
+    fields = parse_fields(request.query_params.get("fields"), allowed_fields)
+    return Representation(media_type, fields, accepted_encoding(request))
+
+
+def parse_fields(raw: Optional[str], allowed_fields: Tuple[str, ...] = APPOINTMENT_FIELDS) -> Optional[Tuple[str, ...]]:
+    """Поля из параметра fields=a,b (id — всегда); None — все поля"""
+    if not raw:
+        return None
+    requested = [field.strip() for field in raw.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in allowed_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return tuple(field for field in allowed_fields if field == "id" or field in requested)
+
+
+def accepted_encoding(request: Request) -> Optional[str]:
+    encodings = _accepted(request.headers.get("accept-encoding", ""))
+    if brotli is not None and "br" in encodings:
+        return "br"
+    if "gzip" in encodings:
+        return "gzip"
+    return None
+
+
+def _compact(field: str, value: Any) -> Any:
+    if field in INT_FIELDS and value is not None:
+        return int(value)
+    if field == "payment":
+        return [value["cash"], value["card"]] if value else None
+    return value
+
+
+def to_columns(records: Records, fields: Tuple[str, ...]) -> dict:
+    """Колоночный вид списка записей или словаря групп"""
+    columns: Dict[str, list] = {field: [] for field in fields}
+    result = {"fields": list(fields), "columns": columns}
+    if isinstance(records, dict):
+        groups, offset = {}, 0
+        for group, items in records.items():
+            groups[group] = [offset, len(items)]
+            offset += len(items)
+        result["groups"] = groups
+        records = [record for items in records.values() for record in items]
+    for field, column in columns.items():
+        column.extend(_compact(field, record.get(field)) for record in records)
+    return result
+
+
+def select_fields(records: Records, fields: Tuple[str, ...]) -> Records:
+    if isinstance(records, dict):
+        return {group: select_fields(items, fields) for group, items in records.items()}
+    return [{field: record.get(field) for field in fields} for record in records]
+
+
+def compress(body: bytes, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    if encoding is None or len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+    return gzip.compress(body, compresslevel=GZIP_LEVEL), "gzip"
+
+
+def encode(records: Records, representation: Representation) -> Tuple[bytes, Optional[str]]:
+    """Тело ответа и примененное сжатие"""
+    if representation.media_type == JSON:
+        data = select_fields(records, representation.fields) if representation.fields else records
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    else:
+        table = to_columns(records, representation.fields or APPOINTMENT_FIELDS)
+        if representation.media_type == MSGPACK:
+            body = msgpack.packb(table, use_bin_type=True)
+        else:
+            body = json.dumps(table, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return compress(body, representation.encoding)
+
+
+async def respond(request: Request, key: str, factory: Callable[[], Any], load: Callable[[Any], Records]) -> Response:
+    """Ответ в согласованном формате.
+
+    Данные загружаются один раз на ключ (в сессии из factory), кодирование — один раз на ключ
+    и формат: одновременные одинаковые запросы получают одни и те же байты.
+    Если база недоступна, отдается последняя удачная копия с пометкой устаревшей (stale.py)."""
+    representation = negotiate(request)
+    records, age = await stale_store.serve(key, factory, load)
+    body, encoding = await singleflight.run(
+        f"{key}|{representation.key}|{age is not None}", lambda: encode(records, representation)
+    )
+    return mark_stale(encoded_response(body, representation.media_type, encoding), age)
+
+
+def encoded_response(body: bytes, media_type: str, encoding: Optional[str]) -> Response:
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=media_type, headers=headers)
@@ -0,0 +1,415 @@
+"""Массовый импорт исторических записей из CSV/XLSX.
+
+Запуск: python importer.py FILE [--salon ID] [--dry-run] [--alias "Имя в файле=Имя мастера" ...]
+
+Колонки (заголовок обязателен, регистр не важен): date, time, master, client,
+duration, status, cash, card, comment — или те же по-русски (дата, время,
+мастер, клиент, ...). Даты YYYY-MM-DD или DD.MM.YYYY, суммы с точкой или запятой.
+
+На PostgreSQL записи загружаются через COPY, на других базах — пачками
+executemany. Уведомления не отправляются; вклад загруженных строк в итоги
+monthly_totals и client_totals суммируется по месяцам и клиентам и добавляется
+дельтами один раз в конце, поэтому изменения, сделанные во время импорта через
+API, не теряются. Строки, уже существующие в базе (мастер,
+дата, время, клиент), пропускаются, поэтому повторный импорт файла безопасен.
+Проведенные строки в закрытые дни (backend/dayclose.py) попадают в ошибки отчета:
+такой день нужно сначала переоткрыть.
+"""
+import argparse
+import csv
+import io
+import os
+import time as timer
+import zipfile
+from datetime import date, datetime, time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+import dayclose
+from cache import bus
+from clients import add_to_client, normalize_name
+from database import DEFAULT_SALON_ID, SessionLocal, dialect_insert
+from finance import add_to_month
+from models import AppointmentDB, ClientDB, MasterDB
+
+# Колонка файла -> поле записи
+HEADER_ALIASES = {
+    "date": "date", "дата": "date",
+    "time": "time", "время": "time",
+    "master": "master", "мастер": "master",
+    "client": "client", "clientname": "client", "клиент": "client",
+    "duration": "duration", "длительность": "duration",
+    "status": "status", "статус": "status",
+    "cash": "cash", "наличные": "cash",
+    "card": "card", "безнал": "card",
+    "comment": "comment", "комментарий": "comment",
+}
+REQUIRED_FIELDS = ("date", "time", "master", "client")
+STATUSES = {
+    "scheduled": "scheduled", "запланирована": "scheduled",
+    "completed": "completed", "проведена": "completed",
+    "cancelled": "cancelled", "отменена": "cancelled",
+}
+COPY_COLUMNS = (
+    "salon_id", "time", "duration", "client_name", "comment", "date", "status",
+    "cash_payment", "card_payment", "master_id", "client_id", "created_at", "updated_at"
+)
+BATCH_SIZE = 5000
+# Сколько ошибок по строкам возвращать в отчете
+MAX_REPORTED_ERRORS = 100
+
+
+def read_csv(content: bytes) -> Iterator[list]:
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        text = content.decode("cp1251")  # выгрузки из Excel на Windows
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    yield from csv.reader(io.StringIO(text), dialect)
+
+
+def read_xlsx(content: bytes) -> Iterator[tuple]:
+    try:
+        from openpyxl import load_workbook
+        from openpyxl.utils.exceptions import InvalidFileException
+    except ImportError:
+        raise RuntimeError("Для XLSX нужен openpyxl: pip install openpyxl")
+    try:
+        workbook = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError):
+        raise ValueError("Файл XLSX поврежден или это не XLSX")
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def parse_date(value) -> str:
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%Y-%m-%d")
+    value = str(value).strip()
+    for fmt in ("%Y-%m-%d", "%d.%m.%Y", "%d.%m.%y"):
+        try:
+            return datetime.strptime(value, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+    raise ValueError(f"неверная дата '{value}'")
+
+
+def parse_time(value) -> str:
+    if isinstance(value, (datetime, time)):
+        return value.strftime("%H:%M")
+    value = str(value).strip()
+    for fmt in ("%H:%M", "%H:%M:%S", "%H.%M"):
+        try:
+            return datetime.strptime(value, fmt).strftime("%H:%M")
+        except ValueError:
+            pass
+    raise ValueError(f"неверное время '{value}'")
+
+
+def parse_amount(value) -> float:
+    if value is None or str(value).strip() == "":
+        return 0.0
+    if isinstance(value, (int, float)):
+        amount = float(value)
+    else:
+        try:
+            amount = float(str(value).replace("\xa0", "").replace(" ", "").replace(",", "."))
+        except ValueError:
+            raise ValueError(f"неверная сумма '{value}'")
+    if amount < 0:
+        raise ValueError(f"отрицательная сумма '{value}'")
+    return amount
+
+
+class Importer:
+    """Разбор, проверка и загрузка строк одного файла в один салон.
+
+    Мастера салона сопоставляются по нормализованному имени (как клиенты), aliases
+    задают соответствие для имен, которые в файле записаны иначе."""
+
+    def __init__(self, db: Session, salon_id: int, aliases: Optional[Dict[str, str]] = None):
+        self.db = db
+        self.salon_id = salon_id
+        self.masters = {
+            normalize_name(name): master_id
+            for master_id, name in db.query(MasterDB.id, MasterDB.name).filter(MasterDB.salon_id == salon_id)
+        }
+        self.aliases = {normalize_name(k): normalize_name(v) for k, v in (aliases or {}).items()}
+        self.errors: List[dict] = []
+        self.error_count = 0
+        self.skipped = 0
+        self.today = date.today().isoformat()
+        self.closed_days: Dict[str, Optional[str]] = {}  # дата -> ошибка закрытого дня или None
+
+    def _error(self, line: int, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": line, "error": message})
+
+    def _check_day_open(self, apt_date: str):
+        """Проведенные строки в закрытый день не загружаются: его выручку меняют только после /reopen"""
+        if apt_date not in self.closed_days:
+            try:
+                dayclose.check_day_open(self.db, self.salon_id, apt_date)
+                self.closed_days[apt_date] = None
+            except dayclose.DayStateError:
+                self.closed_days[apt_date] = f"день {apt_date} закрыт, сначала переоткройте его (/reopen)"
+        if self.closed_days[apt_date]:
+            raise ValueError(self.closed_days[apt_date])
+
+    def _master_id(self, name) -> int:
+        normalized = normalize_name(str(name or ""))
+        master_id = self.masters.get(self.aliases.get(normalized, normalized))
+        if master_id is None:
+            raise ValueError(f"неизвестный мастер '{name}'")
+        return master_id
+
+    def _parse_row(self, values: Dict[str, object]) -> dict:
+        for field in REQUIRED_FIELDS:
+            if values.get(field) is None or str(values[field]).strip() == "":
+                raise ValueError(f"не заполнено поле {field}")
+        apt_date = parse_date(values["date"])
+        status_value = values.get("status")
+        if status_value is None or str(status_value).strip() == "":
+            # Прошедшие записи из журналов считаются проведенными
+            status = "completed" if apt_date < self.today else "scheduled"
+        else:
+            status = STATUSES.get(str(status_value).strip().lower())
+            if status is None:
+                raise ValueError(f"неизвестный статус '{status_value}'")
+        duration = values.get("duration")
+        duration = int(float(str(duration).replace(",", "."))) if duration not in (None, "") else 60
+        if duration <= 0:
+            raise ValueError(f"неверная длительность '{values['duration']}'")
+        cash, card = parse_amount(values.get("cash")), parse_amount(values.get("card"))
+        if status != "completed" and (cash or card):
+            raise ValueError("оплата указана у непроведенной записи")
+        if status == "completed":
+            self._check_day_open(apt_date)
+        return {
+            "time": parse_time(values["time"]),
+            "duration": duration,
+            "client_name": str(values["client"]).strip(),
+            "comment": str(values.get("comment") or "").strip() or None,
+            "date": apt_date,
+            "status": status,
+            "cash_payment": cash,
+            "card_payment": card,
+            "master_id": self._master_id(values["master"]),
+            "salon_id": self.salon_id,
+        }
+
+    def parse(self, rows: Iterable[Iterable]) -> List[dict]:
+        """Проверенные строки файла; ошибки и дубликаты копятся в отчете"""
+        rows = iter(rows)
+        header = next(rows, None)
+        if header is None:
+            raise ValueError("Файл пуст")
+        fields = [HEADER_ALIASES.get(str(name or "").strip().lower().replace(" ", "")) for name in header]
+        missing = [field for field in REQUIRED_FIELDS if field not in fields]
+        if missing:
+            raise ValueError(f"Нет обязательных колонок: {', '.join(missing)}")
+
+        parsed, seen = [], set()
+        for line, row in enumerate(rows, start=2):
+            values = {field: value for field, value in zip(fields, row) if field}
+            if not any(value not in (None, "") for value in values.values()):
+                continue
+            try:
+                apt = self._parse_row(values)
+            except ValueError as e:
+                self._error(line, str(e))
+                continue
+            key = (apt["master_id"], apt["date"], apt["time"], normalize_name(apt["client_name"]))
+            if key in seen:
+                self.skipped += 1
+                continue
+            seen.add(key)
+            parsed.append(apt)
+        return self._without_existing(parsed)
+
+    def _without_existing(self, parsed: List[dict]) -> List[dict]:
+        if not parsed:
+            return parsed
+        first, last = min(apt["date"] for apt in parsed), max(apt["date"] for apt in parsed)
+        existing = {
+            (master_id, apt_date, apt_time, normalize_name(client_name))
+            for master_id, apt_date, apt_time, client_name in self.db.query(
+                AppointmentDB.master_id, AppointmentDB.date, AppointmentDB.time, AppointmentDB.client_name
+            ).filter(AppointmentDB.salon_id == self.salon_id, AppointmentDB.date >= first, AppointmentDB.date <= last)
+        }
+        result = [
+            apt for apt in parsed
+            if (apt["master_id"], apt["date"], apt["time"], normalize_name(apt["client_name"])) not in existing
+        ]
+        self.skipped += len(parsed) - len(result)
+        return result
+
+    def _client_ids(self, parsed: List[dict]) -> Dict[str, int]:
+        """Создает недостающих клиентов пачками и возвращает id по нормализованному имени"""
+        names: Dict[str, str] = {}
+        for apt in parsed:
+            names.setdefault(normalize_name(apt["client_name"]), apt["client_name"])
+        names.pop("", None)
+        ids: Dict[str, int] = {}
+        items = list(names.items())
+        for i in range(0, len(items), BATCH_SIZE):
+            batch = items[i:i + BATCH_SIZE]
+            stmt = dialect_insert(self.db, ClientDB).on_conflict_do_nothing(
+                index_elements=[ClientDB.salon_id, ClientDB.normalized_name]
+            )
+            self.db.execute(stmt, [
+                {"salon_id": self.salon_id, "name": name, "normalized_name": normalized, "created_at": datetime.utcnow()}
+                for normalized, name in batch
+            ])
+            ids.update(self.db.execute(
+                select(ClientDB.normalized_name, ClientDB.id).where(
+                    ClientDB.salon_id == self.salon_id,
+                    ClientDB.normalized_name.in_([normalized for normalized, _ in batch])
+                )
+            ).all())
+        return ids
+
+    def _copy(self, rows: List[dict]):
+        """COPY в appointments через соединение текущей транзакции (psycopg2)"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(["" if row[column] is None else row[column] for column in COPY_COLUMNS])
+        buffer.seek(0)
+        raw = self.db.connection().connection
+        with raw.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY appointments ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer
+            )
+
+    def load(self, parsed: List[dict]):
+        client_ids = self._client_ids(parsed)
+        now = datetime.utcnow()
+        rows = [
+            dict(apt, client_id=client_ids.get(normalize_name(apt["client_name"])), created_at=now, updated_at=now)
+            for apt in parsed
+        ]
+        if self.db.get_bind().dialect.name == "postgresql":
+            self._copy(rows)
+        else:
+            for i in range(0, len(rows), BATCH_SIZE):
+                self.db.execute(insert(AppointmentDB), rows[i:i + BATCH_SIZE])
+
+        self._add_totals(rows)
+
+    def _add_totals(self, rows: List[dict]):
+        """Вклад загруженных строк в итоги: одна дельта на месяц мастера и на клиента у мастера.
+
+        Полный пересчет стер бы дельты, которые запросы API зафиксировали во время импорта"""
+        months: Dict[tuple, list] = {}
+        clients: Dict[tuple, list] = {}
+        for row in rows:
+            completed = row["status"] == "completed"
+            cash, card = (row["cash_payment"], row["card_payment"]) if completed else (0.0, 0.0)
+            month = months.setdefault((row["salon_id"], row["date"][:7], row["master_id"]), [0.0, 0.0, 0])
+            month[0] += cash
+            month[1] += card
+            month[2] += int(completed)
+            if row["client_id"] is not None:
+                client = clients.setdefault((row["client_id"], row["master_id"]), [0, 0, 0, 0.0])
+                client[0] += 1
+                client[1] += int(completed)
+                client[2] += int(row["status"] == "cancelled")
+                client[3] += cash + card
+        for (salon_id, month, master_id), (cash, card, count) in sorted(months.items()):
+            add_to_month(self.db, salon_id, month, master_id, cash, card, count)
+        for (client_id, master_id), values in sorted(clients.items()):
+            add_to_client(self.db, client_id, master_id, *values)
+
+
+def import_file(
+    db: Session,
+    salon_id: int,
+    content: bytes,
+    file_format: str = "csv",
+    aliases: Optional[Dict[str, str]] = None,
+    dry_run: bool = False
+) -> dict:
+    """Импортирует файл одной транзакцией и возвращает отчет.
+
+    ValueError — файл нельзя разобрать целиком (нет заголовка, колонок);
+    ошибки отдельных строк попадают в отчет, такие строки пропускаются."""
+    started = timer.perf_counter()
+    rows = read_xlsx(content) if file_format == "xlsx" else read_csv(content)
+    importer = Importer(db, salon_id, aliases)
+    parsed = importer.parse(rows)
+    if parsed and not dry_run:
+        try:
+            importer.load(parsed)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        # Кэши, индексы поиска и клиентов, напоминания в работающих воркерах
+        bus.publish("*")
+    seconds = timer.perf_counter() - started
+    return {
+        "imported": 0 if dry_run else len(parsed),
+        "valid": len(parsed),
+        "skipped": importer.skipped,
+        "errorCount": importer.error_count,
+        "errors": importer.errors,
+        "seconds": round(seconds, 3),
+        "rowsPerSecond": round(len(parsed) / seconds) if seconds > 0 else 0,
+        "dryRun": dry_run,
+    }
+
+
+def parse_aliases(values: Iterable[str]) -> Dict[str, str]:
+    aliases = {}
+    for value in values:
+        source, sep, target = value.partition("=")
+        if not sep or not source.strip() or not target.strip():
+            raise ValueError(f"Неверный alias '{value}', нужно 'Имя в файле=Имя мастера'")
+        aliases[source.strip()] = target.strip()
+    return aliases
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Импорт исторических записей из CSV/XLSX")
+    parser.add_argument("file", help="Файл .csv или .xlsx")
+    parser.add_argument("--salon", type=int, default=DEFAULT_SALON_ID, help="ID салона (по умолчанию DEFAULT_SALON_ID)")
+    parser.add_argument("--dry-run", action="store_true", help="Только проверить файл")
+    parser.add_argument("--alias", action="append", default=[], help="Соответствие имени мастера: 'Имя в файле=Имя мастера'")
+    args = parser.parse_args()
+    try:
+        aliases = parse_aliases(args.alias)
+    except ValueError as e:
+        parser.error(str(e))
+    if not os.path.isfile(args.file):
+        parser.error(f"Файл {args.file} не найден")
+    file_format = "xlsx" if args.file.lower().endswith(".xlsx") else "csv"
+    with open(args.file, "rb") as f:
+        content = f.read()
+
+    db = SessionLocal()
+    try:
+        report = import_file(db, args.salon, content, file_format, aliases, args.dry_run)
+    except (ValueError, RuntimeError) as e:
+        parser.exit(1, f"Ошибка: {e}\n")
+    finally:
+        db.close()
+    for error in report["errors"]:
+        print(f"строка {error['row']}: {error['error']}")
+    if report["errorCount"] > len(report["errors"]):
+        print(f"... и еще {report['errorCount'] - len(report['errors'])} ошибок")
+    action = "Проверено" if args.dry_run else "Импортировано"
+    print(f"{action}: {report['valid']} записей, пропущено дубликатов: {report['skipped']}, "
+          f"ошибок: {report['errorCount']}, {report['seconds']} с ({report['rowsPerSecond']} строк/с)")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,18 @@ from typing import Optional
 from fastapi import Depends, Header, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import OperationalError
+import hashlib
+import hmac
 import jwt
+import os
 
-from database import JWT_SECRET_KEY, get_db
+from database import DEFAULT_SALON_ID, JWT_SECRET_KEY, get_db
 from models import MasterDB
 
+# Общий секрет бота и API: заголовок X-Salon-Id принимается только вместе с X-Bot-Secret.
+# Не задан — заголовок салона игнорируется
+BOT_API_SECRET = os.getenv("BOT_API_SECRET")
+
 
 async def verify_token(
     authorization: Optional[str] = Header(None),
@@ -32,9 +39,71 @@ async def verify_token(
             
         if not master:
             raise HTTPException(status_code=401, detail="Master not found")
+        # Токены, выданные до появления салонов, без salon_id; другой салон в токене — мастера перевели
+        if payload.get("salon_id", master.salon_id) != master.salon_id:
+            raise HTTPException(status_code=401, detail="Invalid token")
             
-        return {"master_id": master_id, "master": master}
+        return {"master_id": master_id, "salon_id": master.salon_id, "master": master}
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
     except OperationalError as e:
-        raise HTTPException(status_code=503, detail="Database connection error. Please try again.")
\ No newline at end of file
+        raise HTTPException(status_code=503, detail="Database connection error. Please try again.")
+
+def token_claims(authorization: Optional[str]) -> dict:
+    """Данные из заголовка Authorization без обращения к базе; {} — токена нет или он недействителен"""
+    if not authorization:
+        return {}
+    try:
+        return jwt.decode(authorization.replace("Bearer ", ""), JWT_SECRET_KEY, algorithms=["HS256"])
+    except jwt.PyJWTError:
+        return {}
+
+def token_master_id(authorization: Optional[str]) -> Optional[int]:
+    """ID мастера из заголовка Authorization без обращения к базе; None — токена нет или он недействителен"""
+    return token_claims(authorization).get("master_id")
+
+def is_bot_request(x_bot_secret: Optional[str]) -> bool:
+    return bool(BOT_API_SECRET) and x_bot_secret is not None and hmac.compare_digest(x_bot_secret, BOT_API_SECRET)
+
+
+async def current_salon(
+    authorization: Optional[str] = Header(None),
+    x_salon_id: Optional[int] = Header(None),
+    x_bot_secret: Optional[str] = Header(None)
+) -> int:
+    """Салон запроса: salon_id из токена, иначе X-Salon-Id от бота (с X-Bot-Secret), иначе DEFAULT_SALON_ID.
+
+    Без токена и секрета бота заголовок X-Salon-Id не действует: чужой салон им не выбрать"""
+    salon_id = token_claims(authorization).get("salon_id")
+    if salon_id is not None:
+        return int(salon_id)
+    if x_salon_id is not None and is_bot_request(x_bot_secret):
+        return x_salon_id
+    return DEFAULT_SALON_ID
+
+
+async def require_bot(x_bot_secret: Optional[str] = Header(None)):
+    """Endpoint только для бота"""
+    if not is_bot_request(x_bot_secret):
+        raise HTTPException(status_code=403, detail="Bot secret required")
+
+
+async def require_admin(auth_data: dict = Depends(verify_token)) -> dict:
+    """Endpoint только для администратора; салон — из токена (auth_data["salon_id"])"""
+    if auth_data["master"].role != "admin":
+        raise HTTPException(status_code=403, detail="Только для администратора")
+    return auth_data
+
+
+def salon_invite_code(salon_id: int) -> str:
+    """Код приглашения в салон: "{salon_id}-{подпись}", помещается в параметр /start бота"""
+    signature = hmac.new(JWT_SECRET_KEY.encode(), f"invite:{salon_id}".encode(), hashlib.sha256).hexdigest()[:24]
+    return f"{salon_id}-{signature}"
+
+
+def parse_invite_code(code: str) -> Optional[int]:
+    """Салон из кода приглашения; None — код поддельный или испорчен"""
+    salon_id, _, _ = code.partition("-")
+    if not salon_id.isdigit():
+        return None
+    return int(salon_id) if hmac.compare_digest(code, salon_invite_code(int(salon_id))) else None
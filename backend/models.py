@@ -1,28 +1,56 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
-from pydantic import BaseModel, Field
-from typing import Literal, Optional, List
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from typing import Dict, Literal, Optional, List
 from datetime import datetime
 
 Base = declarative_base()
 
 # SQLAlchemy модели для базы данных
+
+# Салон (студия). Все данные разделены по salon_id, индексы и итоги начинаются с него
+class SalonDB(Base):
+    __tablename__ = "salons"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    admin_chat_ids = Column(Text, nullable=True)  # чаты админов салона через запятую; пусто — ADMIN_CHAT_IDS
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class MasterDB(Base):
     __tablename__ = "masters"
     
     id = Column(Integer, primary_key=True, index=True)
+    salon_id = Column(Integer, ForeignKey("salons.id"), nullable=False, default=1, index=True)
     name = Column(String, nullable=False)
     color = Column(String, nullable=False)
     telegram_id = Column(Integer, unique=True, nullable=True) 
     role = Column(String, default="master")
     appointments = relationship("AppointmentDB", back_populates="master")
+    salon = relationship("SalonDB")
     avatar = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ClientDB(Base):
+    __tablename__ = "clients"
+
+    id = Column(Integer, primary_key=True, index=True)
+    salon_id = Column(Integer, ForeignKey("salons.id"), nullable=False, default=1)
+    name = Column(String, nullable=False)
+    normalized_name = Column(String, nullable=False)  # для поиска и дедупликации в пределах салона
+    created_at = Column(DateTime, default=datetime.utcnow)
+    appointments = relationship("AppointmentDB", back_populates="client")
+
+    __table_args__ = (
+        UniqueConstraint("salon_id", "normalized_name", name="uq_clients_salon_id_normalized_name"),
+    )
 
 class AppointmentDB(Base):
     __tablename__ = "appointments"
     
     id = Column(Integer, primary_key=True, index=True)
+    salon_id = Column(Integer, ForeignKey("salons.id"), nullable=False, default=1)
     time = Column(String, nullable=False)
     duration = Column(Integer, default=60)
     client_name = Column(String, nullable=False)
@@ -33,12 +61,163 @@ class AppointmentDB(Base):
     card_payment = Column(Float, default=0)
     master_id = Column(Integer, ForeignKey("masters.id"))
     master = relationship("MasterDB", back_populates="appointments")
+    client_id = Column(Integer, ForeignKey("clients.id"), nullable=True)
+    client = relationship("ClientDB", back_populates="appointments")
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Вхождение повторяющейся записи, созданное при изменении (backend/recurrence.py)
+    series_id = Column(Integer, ForeignKey("appointment_series.id"), nullable=True)
+    occurrence_date = Column(String, nullable=True)  # исходная дата вхождения в серии
+
+    # История клиента читается по индексу (client_id, date), без просмотра всей таблицы.
+    # Диапазоны дат — по (salon_id, date): запросы салона не касаются строк других салонов.
+    # На PostgreSQL таблица секционирована по месяцам (date), см. backend/partitions.py
+    __table_args__ = (
+        Index("ix_appointments_client_id_date", "client_id", "date"),
+        Index("ix_appointments_salon_id_date", "salon_id", "date"),
+        Index("ix_appointments_series_id_occurrence_date", "series_id", "occurrence_date"),
+    )
+
+# Повторяющаяся запись: одно правило вместо строки на каждое вхождение.
+# Вхождения разворачиваются только для запрошенного окна дат (backend/recurrence.py)
+class AppointmentSeriesDB(Base):
+    __tablename__ = "appointment_series"
+
+    id = Column(Integer, primary_key=True, index=True)
+    salon_id = Column(Integer, ForeignKey("salons.id"), nullable=False, default=1, index=True)
+    master_id = Column(Integer, ForeignKey("masters.id"), nullable=False, index=True)
+    client_name = Column(String, nullable=False)
+    client_id = Column(Integer, ForeignKey("clients.id"), nullable=True)
+    comment = Column(Text, nullable=True)
+    time = Column(String, nullable=False)
+    duration = Column(Integer, default=60)
+    freq = Column(String(10), nullable=False)  # daily, weekly, monthly
+    interval = Column(Integer, nullable=False, default=1)
+    start_date = Column(String, nullable=False)
+    until = Column(String, nullable=True)  # включительно; None — без окончания
+    excluded_dates = Column(Text, nullable=True)  # удаленные вхождения, через запятую
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Холодный архив старых проведенных и отмененных записей (backend/archive.py).
+# Без внешних ключей и лишних индексов; в итогах (monthly_totals, client_totals) архив учитывается
+class AppointmentArchiveDB(Base):
+    __tablename__ = "appointments_archive"
+
+    id = Column(Integer, primary_key=True)
+    salon_id = Column(Integer, nullable=False, default=1)
+    time = Column(String, nullable=False)
+    duration = Column(Integer)
+    client_name = Column(String, nullable=False)
+    comment = Column(Text, nullable=True)
+    date = Column(String, nullable=False)
+    status = Column(String(20))
+    cash_payment = Column(Float)
+    card_payment = Column(Float)
+    master_id = Column(Integer)
+    client_id = Column(Integer, index=True)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    series_id = Column(Integer)
+    occurrence_date = Column(String)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_appointments_archive_salon_id_date", "salon_id", "date"),
+    )
+
+class ExpenseDB(Base):
+    __tablename__ = "expenses"
+
+    id = Column(Integer, primary_key=True, index=True)
+    salon_id = Column(Integer, ForeignKey("salons.id"), nullable=False, default=1)
+    date = Column(String, nullable=False)
+    category = Column(String, nullable=False)
+    amount = Column(Float, nullable=False)
+    comment = Column(Text, nullable=True)
+    master_id = Column(Integer, ForeignKey("masters.id"), nullable=True)
+    master = relationship("MasterDB")
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_expenses_salon_id_date", "salon_id", "date"),
+    )
+
+# Помесячные итоги по салонам и мастерам, обновляются при каждом изменении записей и расходов.
+# master_id = 0 — расходы салона без привязки к мастеру
+class MonthlyTotalsDB(Base):
+    __tablename__ = "monthly_totals"
+
+    salon_id = Column(Integer, primary_key=True)
+    month = Column(String(7), primary_key=True)  # YYYY-MM
+    master_id = Column(Integer, primary_key=True)
+    income_cash = Column(Float, nullable=False, default=0)
+    income_card = Column(Float, nullable=False, default=0)
+    completed_count = Column(Integer, nullable=False, default=0)
+    expenses = Column(Float, nullable=False, default=0)
+
+# Итоги по клиенту и мастеру, обновляются вместе с записями (backend/clients.py)
+class ClientTotalsDB(Base):
+    __tablename__ = "client_totals"
+
+    client_id = Column(Integer, ForeignKey("clients.id"), primary_key=True)
+    master_id = Column(Integer, primary_key=True)
+    appointments_count = Column(Integer, nullable=False, default=0)
+    completed_count = Column(Integer, nullable=False, default=0)
+    cancelled_count = Column(Integer, nullable=False, default=0)
+    total_spent = Column(Float, nullable=False, default=0)
+
+# Отправленные напоминания: по одной строке на запись, отступ и время визита.
+# Строка вставляется до отправки, поэтому после перезапуска напоминание не дублируется
+class ReminderMarkDB(Base):
+    __tablename__ = "reminder_marks"
+
+    appointment_key = Column(String(32), primary_key=True)  # id записи или виртуальный id вхождения серии
+    offset_minutes = Column(Integer, primary_key=True)
+    scheduled_for = Column(String(16), primary_key=True)  # "YYYY-MM-DD HH:MM" на момент отправки
+    sent_at = Column(DateTime, default=datetime.utcnow)
+
+# Правила комиссии мастера для расчета зарплаты (backend/payroll.py).
+# service — ключевое слово в комментарии записи (например, "окрашивание"); NULL — правило по умолчанию
+class CommissionRuleDB(Base):
+    __tablename__ = "commission_rules"
+
+    id = Column(Integer, primary_key=True, index=True)
+    salon_id = Column(Integer, ForeignKey("salons.id"), nullable=False, default=1)
+    master_id = Column(Integer, ForeignKey("masters.id"), nullable=False, index=True)
+    service = Column(String, nullable=True)
+    percent = Column(Float, nullable=False)  # доля выручки мастеру, %
+    card_fee_percent = Column(Float, nullable=False, default=0)  # эквайринг, вычитается из безнала до процента
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+# Закрытие дня (Z-отчет, backend/dayclose.py). Строки только добавляются: каждое закрытие
+# и переоткрытие — новая версия дня, прежние снимки не меняются. Последняя версия — состояние дня
+class DayCloseDB(Base):
+    __tablename__ = "day_closes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    salon_id = Column(Integer, ForeignKey("salons.id"), nullable=False, default=1)
+    date = Column(String, nullable=False)  # YYYY-MM-DD
+    version = Column(Integer, nullable=False)
+    action = Column(String, nullable=False)  # close | reopen
+    cash = Column(Float, nullable=False, default=0)
+    card = Column(Float, nullable=False, default=0)
+    appointments_count = Column(Integer, nullable=False, default=0)
+    masters = Column(Text, nullable=True)  # JSON: {master_id: {name, cash, card, total, count}}
+    reason = Column(Text, nullable=True)  # причина переоткрытия
+    created_by = Column(String, nullable=True)  # "auto" — ежедневное закрытие, иначе администратор "Имя (#id)"
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("salon_id", "date", "version", name="uq_day_closes_salon_id_date_version"),
+    )
+
 class MasterRegisterRequest(BaseModel):
     telegram_id: int
     name: str
+    invite: Optional[str] = None  # код приглашения в салон (middleware.salon_invite_code); None — DEFAULT_SALON_ID
 # Pydantic модели для API
 class Payment(BaseModel):
     cash: float = 0
@@ -93,4 +272,86 @@ class CompleteAppointmentRequest(BaseModel):
 class Stats(BaseModel):
     totalAppointments: int
     completedAppointments: int
-    totalRevenue: float
\ No newline at end of file
+    totalRevenue: float
+
+class ExpenseBase(BaseModel):
+    date: str
+    category: str
+    amount: float
+    comment: Optional[str] = ""
+    masterId: Optional[str] = None
+
+class ExpenseCreate(ExpenseBase):
+    pass
+
+class ExpenseUpdate(BaseModel):
+    date: Optional[str] = None
+    category: Optional[str] = None
+    amount: Optional[float] = None
+    comment: Optional[str] = None
+    masterId: Optional[str] = None
+
+    @field_validator("date", "category", "amount")
+    @classmethod
+    def not_null(cls, value):
+        # Поле можно не передавать, но нельзя обнулить: в expenses эти колонки NOT NULL
+        if value is None:
+            raise ValueError("Field cannot be null")
+        return value
+
+class Expense(ExpenseBase):
+    id: str
+
+class SeriesCreate(BaseModel):
+    time: str
+    duration: int = 60
+    clientName: str
+    comment: Optional[str] = ""
+    freq: Literal["daily", "weekly", "monthly"] = "weekly"
+    interval: int = Field(1, ge=1, le=52)
+    startDate: str
+    until: Optional[str] = None
+
+class Series(SeriesCreate):
+    id: str
+    masterId: str
+
+class Client(BaseModel):
+    id: str
+    name: str
+
+class CommissionRuleCreate(BaseModel):
+    masterId: str
+    service: Optional[str] = None
+    percent: float = Field(..., ge=0, le=100)
+    cardFeePercent: float = Field(0, ge=0, le=100)
+
+class CommissionRuleUpdate(BaseModel):
+    service: Optional[str] = None
+    percent: Optional[float] = Field(None, ge=0, le=100)
+    cardFeePercent: Optional[float] = Field(None, ge=0, le=100)
+
+class CommissionRule(CommissionRuleCreate):
+    id: str
+
+class DayReopen(BaseModel):
+    # Причина из одних пробелов после обрезки пустая и не проходит min_length
+    model_config = ConfigDict(str_strip_whitespace=True)
+
+    reason: str = Field(..., min_length=1)
+
+class SalonCreate(BaseModel):
+    name: str
+    adminChatIds: Optional[str] = None
+
+class Salon(SalonCreate):
+    id: str
+
+# Пакетное чтение при открытии приложения (POST /api/batch-read)
+class BatchReadItem(BaseModel):
+    id: str  # ключ результата в ответе
+    type: Literal["masters", "profile", "appointments", "range", "stats"]
+    params: Dict[str, str] = Field(default_factory=dict)
+
+class BatchReadRequest(BaseModel):
+    requests: List[BatchReadItem] = Field(..., min_length=1, max_length=10)
@@ -1,23 +1,266 @@
+import asyncio
+import logging
 import os
-import requests
-from typing import Optional, Dict, Any
-from models import AppointmentDB, MasterDB
+import threading
+import time
+import httpx
+from typing import Callable, Optional, Dict, Any, Iterator, List, Tuple
+from models import AppointmentDB, MasterDB, SalonDB
+
+logger = logging.getLogger(__name__)
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 ADMIN_CHAT_IDS = os.getenv("ADMIN_CHAT_IDS", "").split(",")  # Список ID админов через запятую
 
-def send_telegram_notification(chat_id: str, message: str):
-    """Отправка уведомления в Telegram"""
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-    data = {
-        "chat_id": chat_id,
-        "text": message,
-        "parse_mode": "HTML"
-    }
-    try:
-        requests.post(url, json=data)
-    except Exception as e:
-        print(f"Error sending notification: {e}")
+# Изменения по одному мастеру за это окно (секунды) объединяются в одно сообщение
+COALESCE_WINDOW_SECONDS = float(os.getenv("NOTIFY_COALESCE_SECONDS", "5"))
+# Дольше этого сообщение не задерживается, даже если изменения продолжаются
+COALESCE_MAX_DELAY_SECONDS = float(os.getenv("NOTIFY_COALESCE_MAX_SECONDS", "30"))
+# Лимиты Telegram: около 30 сообщений в секунду всего и 1 в секунду в один чат
+GLOBAL_RATE_PER_SECOND = 30
+PER_CHAT_INTERVAL_SECONDS = 1.0
+# Максимальная длина сообщения в Telegram
+MESSAGE_LIMIT = 4096
+
+
+class RateLimiter:
+    """Ограничение частоты отправки: общий токен-бакет и интервал для каждого чата.
+
+    Бакет емкостью в одно сообщение: без всплесков, в любом окне в секунду не больше rate."""
+
+    def __init__(self, rate: float = GLOBAL_RATE_PER_SECOND, per_chat_interval: float = PER_CHAT_INTERVAL_SECONDS):
+        self._rate = rate
+        self._per_chat_interval = per_chat_interval
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._chat_next: Dict[str, float] = {}
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, chat_id: str):
+        while True:
+            async with self._lock:
+                now = time.monotonic()
+                self._tokens = min(1.0, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                wait = max(self._chat_next.get(chat_id, 0.0) - now, 0.0)
+                if wait == 0.0 and self._tokens >= 1:
+                    self._tokens -= 1
+                    self._chat_next[chat_id] = now + self._per_chat_interval
+                    return
+                if wait == 0.0:
+                    wait = (1 - self._tokens) / self._rate
+            await asyncio.sleep(wait)
+
+    def pause_chat(self, chat_id: str, seconds: float):
+        """Telegram ответил 429: чат недоступен указанное время"""
+        self._chat_next[chat_id] = time.monotonic() + seconds
+
+
+def _line_chunks(line: str, limit: int) -> Iterator[str]:
+    """Строка длиннее лимита режется на куски, по последнему пробелу в пределах лимита, если он есть"""
+    while len(line) > limit:
+        cut = line.rfind(" ", 0, limit + 1)
+        if cut <= 0:
+            cut = limit
+        yield line[:cut]
+        line = line[cut:].lstrip(" ")
+    yield line
+
+
+def split_message(message: str, limit: int = MESSAGE_LIMIT) -> List[str]:
+    """Разбивает длинный дайджест по строкам на части не длиннее лимита; длинная строка
+    продолжается в следующей части, а не обрезается"""
+    parts, current = [], None
+    for line in (chunk for line in message.split("\n") for chunk in _line_chunks(line, limit)):
+        if current is not None and len(current) + len(line) + 1 > limit:
+            if current.strip():
+                parts.append(current)
+            current = None
+        current = line if current is None else f"{current}\n{line}"
+    if current and current.strip():
+        parts.append(current)
+    return parts
+
+
+def build_digest(messages: List[str]) -> str:
+    if len(messages) == 1:
+        return messages[0]
+    return f"🗂 <b>Изменений: {len(messages)}</b>\n\n" + "\n➖➖➖\n\n".join(messages)
+
+
+class NotificationDispatcher:
+    """Отправка уведомлений в фоне.
+
+    Сообщения с одним ключом (мастер) копятся COALESCE_WINDOW_SECONDS с последнего
+    изменения (но не дольше COALESCE_MAX_DELAY_SECONDS) и уходят одним дайджестом.
+    Рассылка по чатам идет параллельно через общий httpx.AsyncClient с учетом лимитов
+    Telegram. Собственный event loop живет в отдельном потоке, поэтому вызовы
+    из обработчиков запросов не блокируются."""
+
+    def __init__(
+        self,
+        window: float = COALESCE_WINDOW_SECONDS,
+        max_delay: float = COALESCE_MAX_DELAY_SECONDS,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self._window = window
+        self._max_delay = max_delay
+        self._transport = transport
+        self._pending: Dict[str, Tuple[List[str], List[str], float, Any]] = {}  # ключ -> (сообщения, чаты, начало, таймер)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._limiter: Optional[RateLimiter] = None
+        self._tasks: set = set()
+        self._lock = threading.Lock()
+        self.stats = {"queued": 0, "coalesced": 0, "sent": 0, "failed": 0}
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(ready,), name="notifications", daemon=True)
+            self._thread.start()
+            ready.wait()
+
+    def _run(self, ready: threading.Event):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._client = httpx.AsyncClient(
+            timeout=10.0,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            transport=self._transport
+        )
+        self._limiter = RateLimiter()
+        ready.set()
+        self._loop.run_forever()
+
+    def stop(self, timeout: float = 5.0):
+        """Отправляет накопленное и останавливает поток"""
+        with self._lock:
+            if self._thread is None:
+                return
+            future = asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop)
+            try:
+                future.result(timeout)
+            except Exception as e:
+                logger.error(f"Notification shutdown error: {e}")
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    async def _shutdown(self):
+        for key in list(self._pending):
+            self._flush(key)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self._client.aclose()
+
+    def enqueue(
+        self,
+        key: Optional[str],
+        message: str,
+        chat_ids: List[str],
+        on_done: Optional[Callable[[bool], None]] = None
+    ):
+        """Поставить сообщение в очередь. key=None — без объединения, сразу.
+
+        on_done(доставлено во все чаты) вызывается в потоке рассылки; только для key=None"""
+        chat_ids = [chat_id for chat_id in chat_ids if chat_id]
+        if not chat_ids:
+            return
+        self.start()
+        self.stats["queued"] += 1
+        self._loop.call_soon_threadsafe(self._add, key, message, chat_ids, on_done)
+
+    def send(self, chat_id: str, message: str, on_done: Optional[Callable[[bool], None]] = None):
+        """Отправка одного сообщения без объединения (например, напоминания)"""
+        self.enqueue(None, message, [chat_id], on_done)
+
+    def _add(self, key: Optional[str], message: str, chat_ids: List[str], on_done: Optional[Callable[[bool], None]] = None):
+        if key is None or self._window <= 0:
+            self._spawn(message, chat_ids, on_done)
+            return
+
+        now = self._loop.time()
+        pending = self._pending.get(key)
+        if pending is None:
+            messages, chats, started = [message], list(chat_ids), now
+        else:
+            messages, chats, started, timer = pending
+            timer.cancel()
+            messages.append(message)
+            chats.extend(chat_id for chat_id in chat_ids if chat_id not in chats)
+            self.stats["coalesced"] += 1
+        flush_at = min(now + self._window, started + self._max_delay)
+        timer = self._loop.call_at(flush_at, self._flush, key)
+        self._pending[key] = (messages, chats, started, timer)
+
+    def _flush(self, key: str):
+        messages, chats, _, timer = self._pending.pop(key)
+        timer.cancel()
+        self._spawn(build_digest(messages), chats)
+
+    def _spawn(self, message: str, chat_ids: List[str], on_done: Optional[Callable[[bool], None]] = None):
+        task = self._loop.create_task(self._deliver(message, chat_ids))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        if on_done is not None:
+            task.add_done_callback(lambda t: on_done(not t.cancelled() and t.exception() is None and t.result()))
+
+    async def _deliver(self, message: str, chat_ids: List[str]) -> bool:
+        """True — сообщение целиком доставлено во все чаты"""
+        # Чаты параллельно, части одного сообщения в чат — по порядку
+        async def to_chat(chat_id: str) -> bool:
+            for part in split_message(message):
+                if not await self._send(chat_id, part):
+                    return False
+            return True
+
+        return all(await asyncio.gather(*(to_chat(chat_id) for chat_id in chat_ids)))
+
+    async def _send(self, chat_id: str, text: str, attempts: int = 3) -> bool:
+        url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
+        for _ in range(attempts):
+            await self._limiter.acquire(chat_id)
+            try:
+                response = await self._client.post(url, json={"chat_id": chat_id, "text": text, "parse_mode": "HTML"})
+            except httpx.HTTPError as e:
+                logger.error(f"Error sending notification to {chat_id}: {e}")
+                await asyncio.sleep(1.0)
+                continue
+            if response.status_code == 429:
+                retry_after = response.json().get("parameters", {}).get("retry_after", 1)
+                self._limiter.pause_chat(chat_id, float(retry_after))
+                continue
+            if response.is_success:
+                self.stats["sent"] += 1
+                return True
+            self.stats["failed"] += 1
+            logger.error(f"Telegram error for {chat_id}: {response.status_code} {response.text}")
+            return False
+        self.stats["failed"] += 1
+        return False
+
+
+dispatcher = NotificationDispatcher()
+
+
+def salon_chat_ids(salon: Optional[SalonDB]) -> List[str]:
+    """Чаты админов салона (salons.admin_chat_ids), если не заданы — ADMIN_CHAT_IDS"""
+    chat_ids = salon.admin_chat_ids.split(",") if salon is not None and salon.admin_chat_ids else ADMIN_CHAT_IDS
+    return [chat_id.strip() for chat_id in chat_ids if chat_id.strip()]
+
+
+def admin_chat_ids(master: Optional[MasterDB]) -> List[str]:
+    """Чаты админов салона мастера"""
+    return salon_chat_ids(master.salon if master is not None else None)
+
+
+def notify_admins(key: Optional[str], message: str, master: Optional[MasterDB] = None):
+    dispatcher.enqueue(key, message, admin_chat_ids(master))
+
 
 def format_appointment_info(appointment: AppointmentDB, master: MasterDB) -> str:
     """Форматирование информации о записи"""
@@ -34,30 +277,26 @@ def notify_appointment_created(appointment: AppointmentDB, master: MasterDB):
     """Уведомление о создании записи"""
     message = "✨ <b>Новая запись</b>\n\n"
     message += format_appointment_info(appointment, master)
-    
-    for chat_id in ADMIN_CHAT_IDS:
-        if chat_id:
-            send_telegram_notification(chat_id, message)
+
+    notify_admins(f"master:{master.id}", message, master)
 
 def notify_appointment_cancelled(appointment: AppointmentDB, master: MasterDB):
     """Уведомление об отмене записи"""
     message = "❌ <b>Запись отменена</b>\n\n"
     message += format_appointment_info(appointment, master)
-    
-    for chat_id in ADMIN_CHAT_IDS:
-        if chat_id:
-            send_telegram_notification(chat_id, message)
+
+    notify_admins(f"master:{master.id}", message, master)
 
 def notify_appointment_edited(
-    appointment: AppointmentDB, 
-    master: MasterDB, 
+    appointment: AppointmentDB,
+    master: MasterDB,
     changes: Dict[str, Any]
 ):
     """Уведомление о редактировании записи"""
     message = "✏️ <b>Запись отредактирована</b>\n\n"
     message += format_appointment_info(appointment, master)
     message += "\n<b>Изменения:</b>\n"
-    
+
     field_names = {
         "time": "Время",
         "date": "Дата",
@@ -65,17 +304,15 @@ def notify_appointment_edited(
         "comment": "Комментарий",
         "duration": "Длительность"
     }
-    
+
     for field, value in changes.items():
         if field in field_names:
             message += f"• {field_names[field]}: {value}\n"
-    
-    for chat_id in ADMIN_CHAT_IDS:
-        if chat_id:
-            send_telegram_notification(chat_id, message)
+
+    notify_admins(f"master:{master.id}", message, master)
 
 def notify_appointment_moved(
-    appointment: AppointmentDB, 
+    appointment: AppointmentDB,
     master: MasterDB,
     old_date: str,
     old_time: str
@@ -85,10 +322,8 @@ def notify_appointment_moved(
     message += f"<b>Было:</b> {old_date} в {old_time}\n"
     message += f"<b>Стало:</b> {appointment.date} в {appointment.time}\n\n"
     message += format_appointment_info(appointment, master)
-    
-    for chat_id in ADMIN_CHAT_IDS:
-        if chat_id:
-            send_telegram_notification(chat_id, message)
+
+    notify_admins(f"master:{master.id}", message, master)
 
 def notify_appointment_completed(appointment: AppointmentDB, master: MasterDB):
     """Уведомление о проведении записи"""
@@ -98,7 +333,5 @@ def notify_appointment_completed(appointment: AppointmentDB, master: MasterDB):
     message += f"\n💰 <b>Оплата:</b> {total}₽\n"
     message += f"💵 Наличные: {appointment.cash_payment}₽\n"
     message += f"💳 Безнал: {appointment.card_payment}₽\n"
-    
-    for chat_id in ADMIN_CHAT_IDS:
-        if chat_id:
-            send_telegram_notification(chat_id, message)
+
+    notify_admins(f"master:{master.id}", message, master)
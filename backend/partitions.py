@@ -0,0 +1,112 @@
+"""Месячные секции appointments на PostgreSQL (миграция c5f28d1e9a47).
+
+Запуск: python partitions.py [--months N] [--check]
+
+Секции создает отдельное задание (cron раз в месяц или шаг деплоя), а не каждый
+воркер при старте: DDL берет блокировку на appointments. Опоздание задания не
+ломает запись — строки без своей секции попадают в appointments_default и
+переносятся, когда секция появится.
+
+PK секционированной таблицы — (id, date): PostgreSQL требует ключ секционирования
+в уникальных ограничениях, поэтому уникальность одного id база не проверяет.
+id выдает только последовательность appointments_id_seq (вставки с явным id
+бывают только при восстановлении снимка, со значениями из той же таблицы);
+--check находит дубликаты, если они все же появились.
+"""
+import argparse
+import logging
+from datetime import date
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# На сколько месяцев вперед держать готовые секции appointments
+MONTHS_AHEAD = 12
+# Ключ advisory-блокировки: одновременные запуски задания не создают одну секцию дважды
+PARTITIONS_LOCK_KEY = 0x5EC7
+
+
+def month_ranges(start: date, count: int) -> List[Tuple[str, str, str]]:
+    """(имя секции, начало, конец) для count месяцев начиная с месяца start"""
+    year, month = start.year, start.month
+    ranges = []
+    for _ in range(count):
+        next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+        ranges.append((
+            f"appointments_p{year}_{month:02d}",
+            f"{year}-{month:02d}-01",
+            f"{next_year}-{next_month:02d}-01"
+        ))
+        year, month = next_year, next_month
+    return ranges
+
+
+def is_partitioned(engine: Engine) -> bool:
+    if engine.dialect.name != "postgresql":
+        return False
+    with engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('appointments')"
+        )).first() is not None
+
+
+def ensure_partitions(engine: Engine, months_ahead: int = MONTHS_AHEAD, today: Optional[date] = None) -> int:
+    """Создает недостающие месячные секции от текущего месяца на months_ahead вперед.
+
+    Записи на даты без секции попадают в appointments_default; если там уже есть строки
+    за создаваемый месяц, они переносятся в новую секцию в той же транзакции."""
+    if not is_partitioned(engine):
+        return 0
+
+    created = 0
+    for name, start, end in month_ranges(today or date.today(), months_ahead + 1):
+        with engine.begin() as conn:
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITIONS_LOCK_KEY})
+            if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None:
+                continue
+            # Секцию нельзя подключить, пока в default есть строки ее диапазона
+            bounds = {"start": start, "end": end}
+            conn.execute(text(
+                "CREATE TEMP TABLE moved ON COMMIT DROP AS "
+                "SELECT * FROM appointments_default WHERE date >= :start AND date < :end"
+            ), bounds)
+            conn.execute(text("DELETE FROM appointments_default WHERE date >= :start AND date < :end"), bounds)
+            conn.execute(text(f"CREATE TABLE {name} PARTITION OF appointments FOR VALUES FROM ('{start}') TO ('{end}')"))
+            conn.execute(text("INSERT INTO appointments SELECT * FROM moved"))
+            created += 1
+    if created:
+        logger.info(f"Created {created} appointment partitions")
+    return created
+
+
+def duplicate_ids(engine: Engine, limit: int = 10) -> List[int]:
+    """id, встречающиеся в appointments больше одного раза (PK (id, date) этого не запрещает)"""
+    with engine.connect() as conn:
+        return [row[0] for row in conn.execute(text(
+            "SELECT id FROM appointments GROUP BY id HAVING count(*) > 1 ORDER BY id LIMIT :limit"
+        ), {"limit": limit})]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Месячные секции appointments (PostgreSQL)")
+    parser.add_argument("--months", type=int, default=MONTHS_AHEAD, help="На сколько месяцев вперед (по умолчанию 12)")
+    parser.add_argument("--check", action="store_true", help="Проверить уникальность id записей")
+    args = parser.parse_args()
+
+    from database import engine
+    if not is_partitioned(engine):
+        parser.exit(0, "appointments не секционирована (не PostgreSQL или миграция c5f28d1e9a47 не применена)\n")
+    print(f"Создано секций: {ensure_partitions(engine, args.months)}")
+    if args.check:
+        duplicates = duplicate_ids(engine)
+        if duplicates:
+            parser.exit(1, f"Повторяющиеся id записей: {', '.join(map(str, duplicates))}\n")
+        print("Повторяющихся id нет")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,185 @@
+"""Расчет зарплаты мастеров по правилам комиссии.
+
+Правило (commission_rules) — процент от выручки мастера, отдельный для услуги:
+service — ключевое слово в комментарии записи (без учета регистра), правило без service
+действует для остальных записей мастера. Из безнала сначала вычитается эквайринг
+(card_fee_percent), затем берется процент; наличные и безнал в ведомости раздельно.
+
+Ведомость считается одним векторным проходом (NumPy) по проведенным записям периода,
+включая архив. Ведомости закрытых периодов (конец раньше сегодняшнего дня) кэшируются
+с тегами day:{date} каждого дня периода: изменение записи пересчитывает только
+ведомости, в период которых она попадает. Ведомость, посчитанная по реплике сразу
+после изменения периода, в кэш не попадает (settle_seconds): реплика могла еще не
+получить изменение.
+"""
+from datetime import date as dt_date, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import select, union_all
+from sqlalchemy.orm import Session
+
+from cache import cache
+from database import replica_lag
+from models import AppointmentArchiveDB, AppointmentDB, CommissionRuleDB, MasterDB
+
+# Тег кэша ведомостей: изменение правил пересчитывает все
+RULES_TAG = "commission_rules"
+
+
+def rule_to_api(rule: CommissionRuleDB) -> dict:
+    return {
+        "id": str(rule.id),
+        "masterId": str(rule.master_id),
+        "service": rule.service,
+        "percent": rule.percent,
+        "cardFeePercent": rule.card_fee_percent,
+    }
+
+
+def load_completed(db: Session, salon_id: int, start_date: str, end_date: str, master_id: Optional[int] = None) -> dict:
+    """Проведенные записи салона за период (с архивом) в виде столбцов"""
+    queries = []
+    for table in (AppointmentDB, AppointmentArchiveDB):
+        query = select(
+            table.master_id, table.comment, table.cash_payment, table.card_payment
+        ).where(
+            table.salon_id == salon_id,
+            table.date >= start_date,
+            table.date <= end_date,
+            table.status == "completed"
+        )
+        if master_id is not None:
+            query = query.where(table.master_id == master_id)
+        queries.append(query)
+
+    rows = db.execute(union_all(*queries)).all()
+    master_ids, comments, cash, card = zip(*rows) if rows else ((), (), (), ())
+    return {
+        "master_id": np.array(master_ids, dtype=np.int64),
+        "comment": np.char.lower(np.array([c or "" for c in comments], dtype=str)),
+        "cash": np.array([v or 0.0 for v in cash], dtype=np.float64),
+        "card": np.array([v or 0.0 for v in card], dtype=np.float64),
+    }
+
+
+def match_rules(columns: dict, rules: List[CommissionRuleDB]) -> np.ndarray:
+    """Индекс правила для каждой записи, -1 — правила нет.
+
+    Правила услуг проверяются раньше правила по умолчанию, более длинные ключевые слова — раньше коротких"""
+    ordered = sorted(range(len(rules)), key=lambda i: (rules[i].service is None, -len(rules[i].service or "")))
+    matched = np.full(len(columns["master_id"]), -1, dtype=np.int64)
+    for i in ordered:
+        rule = rules[i]
+        mask = (matched == -1) & (columns["master_id"] == rule.master_id)
+        if rule.service:
+            mask &= np.char.find(columns["comment"], rule.service.lower()) >= 0
+        matched[mask] = i
+    return matched
+
+
+def compute_statement(columns: dict, rules: List[CommissionRuleDB], masters: Dict[int, str]) -> dict:
+    """Ведомость по мастерам: выручка и начисления (наличные/безнал), разбивка по правилам"""
+    matched = match_rules(columns, rules)
+    has_rule = matched >= 0
+    percent = np.array([r.percent for r in rules] + [0.0])[matched] / 100
+    card_fee = np.array([r.card_fee_percent for r in rules] + [0.0])[matched] / 100
+    pay_cash = columns["cash"] * percent
+    pay_card = columns["card"] * (1 - card_fee) * percent
+
+    master_ids = np.array(sorted(masters), dtype=np.int64)
+    count = len(master_ids)
+    index = np.clip(np.searchsorted(master_ids, columns["master_id"]), 0, max(count - 1, 0))
+    known = master_ids[index] == columns["master_id"] if count else np.zeros(len(index), dtype=bool)
+
+    def by_master(values: np.ndarray, mask: np.ndarray = known) -> np.ndarray:
+        return np.bincount(index[mask], weights=values[mask], minlength=count)
+
+    ones = np.ones(len(index))
+    totals = {
+        "appointments": by_master(ones), "unmatched": by_master(ones, known & ~has_rule),
+        "cash": by_master(columns["cash"]), "card": by_master(columns["card"]),
+        "payCash": by_master(pay_cash), "payCard": by_master(pay_card),
+    }
+    # Правило x показатель: записи, выручка, начисления
+    rule_index = np.where(has_rule, matched, len(rules))
+    by_rule = {
+        name: np.bincount(rule_index[known], weights=values[known], minlength=len(rules) + 1)
+        for name, values in (("appointments", ones), ("cash", columns["cash"]), ("card", columns["card"]),
+                             ("pay", pay_cash + pay_card))
+    }
+
+    result = {}
+    for i, master_id in enumerate(master_ids.tolist()):
+        result[str(master_id)] = {
+            "name": masters[master_id],
+            "appointments": int(totals["appointments"][i]),
+            "unmatched": int(totals["unmatched"][i]),
+            "revenue": {
+                "cash": round(float(totals["cash"][i]), 2),
+                "card": round(float(totals["card"][i]), 2),
+                "total": round(float(totals["cash"][i] + totals["card"][i]), 2),
+            },
+            "pay": {
+                "cash": round(float(totals["payCash"][i]), 2),
+                "card": round(float(totals["payCard"][i]), 2),
+                "total": round(float(totals["payCash"][i] + totals["payCard"][i]), 2),
+            },
+            "rules": [
+                {
+                    **rule_to_api(rule),
+                    "appointments": int(by_rule["appointments"][r]),
+                    "revenue": round(float(by_rule["cash"][r] + by_rule["card"][r]), 2),
+                    "pay": round(float(by_rule["pay"][r]), 2),
+                }
+                for r, rule in enumerate(rules) if rule.master_id == master_id
+            ],
+        }
+
+    return {
+        "masters": result,
+        "total": {
+            "revenue": round(float(totals["cash"].sum() + totals["card"].sum()), 2),
+            "pay": round(float(totals["payCash"].sum() + totals["payCard"].sum()), 2),
+        },
+    }
+
+
+def period_days(start_date: str, end_date: str) -> List[str]:
+    start, end = dt_date.fromisoformat(start_date), dt_date.fromisoformat(end_date)
+    return [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+
+
+def payroll_statement(
+    db: Session,
+    salon_id: int,
+    start_date: str,
+    end_date: str,
+    master_id: Optional[int] = None,
+    today: Optional[str] = None
+) -> dict:
+    """Ведомость салона за период; закрытые периоды берутся из кэша, пока в них ничего не менялось"""
+    closed = end_date < (today or dt_date.today().isoformat())
+    key = f"payroll:{salon_id}:{start_date}:{end_date}:{master_id or ''}"
+    if closed:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    masters_query = db.query(MasterDB.id, MasterDB.name).filter(MasterDB.salon_id == salon_id)
+    rules_query = db.query(CommissionRuleDB).filter(CommissionRuleDB.salon_id == salon_id)
+    if master_id is not None:
+        masters_query = masters_query.filter(MasterDB.id == master_id)
+        rules_query = rules_query.filter(CommissionRuleDB.master_id == master_id)
+    masters = dict(masters_query.all())
+    rules = rules_query.order_by(CommissionRuleDB.id).all()
+
+    statement = compute_statement(load_completed(db, salon_id, start_date, end_date, master_id), rules, masters)
+    result = {"startDate": start_date, "endDate": end_date, "closed": closed, **statement}
+    if closed:
+        cache.set(
+            key, result,
+            tags=[RULES_TAG, "masters", *(f"day:{day}" for day in period_days(start_date, end_date))],
+            settle_seconds=replica_lag(db)
+        )
+    return result
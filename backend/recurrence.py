@@ -0,0 +1,267 @@
+"""Повторяющиеся записи: правило хранится одной строкой appointment_series.
+
+Вхождения не хранятся, а разворачиваются только для запрошенного окна дат
+(range, день, сводка, статистика, загрузка). У такого вхождения виртуальный id
+"s{series_id}-{YYYYMMDD}". Строка в appointments создается (материализуется),
+только когда вхождение редактируют, проводят или отменяют; у нее series_id и
+occurrence_date — исходная дата вхождения, по которой оно больше не разворачивается.
+Удаленные вхождения перечисляются в excluded_dates серии.
+"""
+import re
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from clients import apply_client_change, client_snapshot
+from models import AppointmentArchiveDB, AppointmentDB, AppointmentSeriesDB
+
+FREQUENCIES = ("daily", "weekly", "monthly")
+VIRTUAL_ID = re.compile(r"^s(\d+)-(\d{4})(\d{2})(\d{2})$")
+# Окно по умолчанию, если запрос без конечной даты (например, «сегодня и дальше» в боте)
+DEFAULT_HORIZON_DAYS = 30
+
+
+def virtual_id(series_id: int, occurrence: str) -> str:
+    return f"s{series_id}-{occurrence.replace('-', '')}"
+
+
+def parse_virtual_id(value: str) -> Optional[Tuple[int, str]]:
+    """(series_id, дата вхождения) для виртуального id, иначе None"""
+    match = VIRTUAL_ID.match(value)
+    if not match:
+        return None
+    series_id, year, month, day = match.groups()
+    return int(series_id), f"{year}-{month}-{day}"
+
+
+def _add_months(start: date, months: int) -> Optional[date]:
+    year, month = divmod(start.month - 1 + months, 12)
+    try:
+        return start.replace(year=start.year + year, month=month + 1)
+    except ValueError:
+        return None  # в месяце нет такого числа (31-е, 29 февраля) — вхождение пропускается
+
+
+def occurrence_dates(series: AppointmentSeriesDB, start_date: str, end_date: str) -> Iterator[str]:
+    """Даты вхождений серии в окне [start_date, end_date], без исключенных.
+
+    Перебираются только вхождения внутри окна: первое находится арифметикой, а не с начала серии"""
+    first = datetime.strptime(series.start_date, "%Y-%m-%d").date()
+    window_start = max(datetime.strptime(start_date, "%Y-%m-%d").date(), first)
+    window_end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    if series.until:
+        window_end = min(window_end, datetime.strptime(series.until, "%Y-%m-%d").date())
+    if window_start > window_end:
+        return
+    excluded = set(filter(None, (series.excluded_dates or "").split(",")))
+    interval = max(series.interval or 1, 1)
+
+    if series.freq == "monthly":
+        months_before = (window_start.year - first.year) * 12 + window_start.month - first.month
+        step = max(months_before // interval - 1, 0)
+        while True:
+            current = _add_months(first, step * interval)
+            step += 1
+            if current is None:
+                continue
+            if current > window_end:
+                return
+            if current >= window_start and current.isoformat() not in excluded:
+                yield current.isoformat()
+        return
+
+    days = interval * (7 if series.freq == "weekly" else 1)
+    step = -(-(window_start - first).days // days)  # округление вверх
+    current = first + timedelta(days=step * days)
+    while current <= window_end:
+        if current.isoformat() not in excluded:
+            yield current.isoformat()
+        current += timedelta(days=days)
+
+
+def active_series(
+    db: Session,
+    salon_id: Optional[int],
+    start_date: str,
+    end_date: str,
+    master_id: Optional[int] = None
+) -> List[AppointmentSeriesDB]:
+    """Серии салона (None — всех салонов) с вхождениями в окне"""
+    query = db.query(AppointmentSeriesDB).filter(
+        AppointmentSeriesDB.start_date <= end_date,
+        or_(AppointmentSeriesDB.until.is_(None), AppointmentSeriesDB.until >= start_date)
+    )
+    if salon_id is not None:
+        query = query.filter(AppointmentSeriesDB.salon_id == salon_id)
+    if master_id is not None:
+        query = query.filter(AppointmentSeriesDB.master_id == master_id)
+    return query.all()
+
+
+def materialized(db: Session, series_ids: List[int], start_date: str, end_date: str) -> Set[Tuple[int, str]]:
+    """Уже созданные строки вхождений (включая архив): (series_id, дата вхождения)"""
+    result = set()
+    for table in (AppointmentDB, AppointmentArchiveDB):
+        rows = db.query(table.series_id, table.occurrence_date).filter(
+            table.series_id.in_(series_ids),
+            table.occurrence_date >= start_date,
+            table.occurrence_date <= end_date
+        )
+        result.update(rows)
+    return result
+
+
+def expand(db: Session, salon_id: Optional[int], start_date: str, end_date: str, master_id: Optional[int] = None) -> List[dict]:
+    """Виртуальные вхождения всех серий салона (None — всех салонов) в окне, в формате записей API (статус scheduled)"""
+    series_list = active_series(db, salon_id, start_date, end_date, master_id)
+    if not series_list:
+        return []
+    done = materialized(db, [series.id for series in series_list], start_date, end_date)
+    result = []
+    for series in series_list:
+        for occurrence in occurrence_dates(series, start_date, end_date):
+            if (series.id, occurrence) in done:
+                continue
+            result.append({
+                "id": virtual_id(series.id, occurrence),
+                "time": series.time,
+                "duration": series.duration,
+                "clientName": series.client_name,
+                "comment": series.comment or "",
+                "status": "scheduled",
+                "date": occurrence,
+                "masterId": str(series.master_id),
+                "payment": None
+            })
+    return result
+
+
+def count_by_day(
+    db: Session,
+    salon_id: int,
+    start_date: str,
+    end_date: str,
+    master_id: Optional[int] = None
+) -> Dict[Tuple[str, int], int]:
+    """Количество виртуальных вхождений по (дата, мастер) — для сводок и статистики"""
+    counts: Dict[Tuple[str, int], int] = {}
+    for occurrence in expand(db, salon_id, start_date, end_date, master_id):
+        key = (occurrence["date"], int(occurrence["masterId"]))
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def occurrence_row(series: AppointmentSeriesDB, occurrence: str) -> AppointmentDB:
+    """Строка записи вхождения (не добавленная в сессию)"""
+    return AppointmentDB(
+        salon_id=series.salon_id,
+        time=series.time,
+        duration=series.duration,
+        client_name=series.client_name,
+        client_id=series.client_id,
+        comment=series.comment,
+        date=occurrence,
+        status="scheduled",
+        master_id=series.master_id,
+        series_id=series.id,
+        occurrence_date=occurrence
+    )
+
+
+def occurrence_key(apt: AppointmentDB) -> str:
+    """Постоянный ключ записи: у вхождения серии — виртуальный id и после материализации"""
+    if apt.series_id is not None and apt.occurrence_date:
+        return virtual_id(apt.series_id, apt.occurrence_date)
+    return str(apt.id)
+
+
+def resolve(db: Session, value: str) -> Optional[AppointmentDB]:
+    """Запись по id или виртуальному id без материализации: созданная строка вхождения
+    или несохраненная строка из серии; None — записи (вхождения) нет"""
+    parsed = parse_virtual_id(value)
+    if parsed is None:
+        return db.query(AppointmentDB).filter(AppointmentDB.id == int(value)).first()
+    series_id, occurrence = parsed
+    existing = db.query(AppointmentDB).filter(
+        AppointmentDB.series_id == series_id,
+        AppointmentDB.occurrence_date == occurrence
+    ).first()
+    if existing is not None:
+        return existing
+    series = db.query(AppointmentSeriesDB).filter(AppointmentSeriesDB.id == series_id).first()
+    if series is None or occurrence not in occurrence_dates(series, occurrence, occurrence):
+        return None
+    return occurrence_row(series, occurrence)
+
+
+def materialize(db: Session, value: str, master_id: int) -> Optional[AppointmentDB]:
+    """Строка записи для виртуального id: существующая или новая из серии.
+
+    None — серии нет, она другого мастера или вхождения с такой датой нет.
+    Новая строка сразу учитывается в итогах клиента. Строка серии блокируется (FOR UPDATE на PostgreSQL), чтобы одновременные запросы
+    не создали вхождение дважды; существующая строка вхождения тоже блокируется — по ней снимается снимок
+    для итогов. Коммит — за вызывающим"""
+    parsed = parse_virtual_id(value)
+    if parsed is None:
+        return None
+    series_id, occurrence = parsed
+    series = db.query(AppointmentSeriesDB).filter(
+        AppointmentSeriesDB.id == series_id
+    ).with_for_update().first()
+    if series is None or series.master_id != master_id:
+        return None
+
+    existing = db.query(AppointmentDB).filter(
+        AppointmentDB.series_id == series_id,
+        AppointmentDB.occurrence_date == occurrence
+    ).with_for_update().populate_existing().first()
+    if existing is not None:
+        return existing
+    if occurrence not in occurrence_dates(series, occurrence, occurrence):
+        return None
+
+    apt = occurrence_row(series, occurrence)
+    db.add(apt)
+    db.flush()
+    apply_client_change(db, None, client_snapshot(apt))
+    return apt
+
+
+def exclude(db: Session, value: str, master_id: int) -> bool:
+    """Удаление виртуального вхождения: дата добавляется в исключения серии"""
+    parsed = parse_virtual_id(value)
+    if parsed is None:
+        return False
+    series_id, occurrence = parsed
+    series = db.query(AppointmentSeriesDB).filter(
+        AppointmentSeriesDB.id == series_id
+    ).with_for_update().first()
+    if series is None or series.master_id != master_id:
+        return False
+    if occurrence not in occurrence_dates(series, occurrence, occurrence):
+        return False
+    exclude_occurrence(series, occurrence)
+    return True
+
+
+def exclude_occurrence(series: AppointmentSeriesDB, occurrence: str):
+    """Дата больше не разворачивается: вхождение удалено (виртуальное или уже созданная строка)"""
+    if occurrence not in (series.excluded_dates or "").split(","):
+        series.excluded_dates = ",".join(filter(None, [series.excluded_dates, occurrence]))
+
+
+def series_to_api(series: AppointmentSeriesDB) -> dict:
+    return {
+        "id": str(series.id),
+        "masterId": str(series.master_id),
+        "clientName": series.client_name,
+        "time": series.time,
+        "duration": series.duration,
+        "comment": series.comment or "",
+        "freq": series.freq,
+        "interval": series.interval,
+        "startDate": series.start_date,
+        "until": series.until
+    }
@@ -0,0 +1,353 @@
+import heapq
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from cache import bus
+from database import SessionLocal, dialect_insert
+from models import AppointmentDB, MasterDB, ReminderMarkDB
+from notifications import admin_chat_ids, dispatcher, format_appointment_info
+import recurrence
+
+logger = logging.getLogger(__name__)
+
+# За сколько минут до записи напоминать (по умолчанию за сутки и за час)
+REMINDER_OFFSETS = sorted(
+    (int(m) for m in os.getenv("REMINDER_OFFSETS_MINUTES", "1440,60").split(",") if m.strip()),
+    reverse=True
+)
+REMINDERS_ENABLED = os.getenv("REMINDERS_ENABLED", "true").lower() == "true"
+# Проверка очереди не реже, чем раз в столько секунд (на случай сдвига системных часов)
+MAX_SLEEP_SECONDS = 60.0
+# На сколько дней вперед разворачиваются серии (плюс самое раннее напоминание); окно сдвигается каждый день
+SERIES_HORIZON_DAYS = 2
+# Через сколько секунд повторить напоминание, которое не удалось доставить
+REMINDER_RETRY_SECONDS = float(os.getenv("REMINDER_RETRY_SECONDS", "60"))
+
+
+def appointment_start(date: str, time: str) -> datetime:
+    return datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M")
+
+
+def format_remaining(minutes: int) -> str:
+    if minutes >= 1440:
+        return f"{round(minutes / 1440)} дн."
+    if minutes >= 60:
+        return f"{round(minutes / 60)} ч"
+    return f"{minutes} мин"
+
+
+class ReminderScheduler:
+    """Напоминания о записях на куче таймеров.
+
+    Все будущие записи загружаются один раз; изменения приходят через шину инвалидации
+    (мутации публикуют day:{date}), и перечитываются только затронутые дни. Вхождения
+    серий разворачиваются на окно вперед (самое раннее напоминание + SERIES_HORIZON_DAYS),
+    окно сдвигается вместе с часами; ключ вхождения — виртуальный id, и после материализации
+    тот же, поэтому напоминание не уходит дважды. Поток спит
+    до ближайшего напоминания. Устаревшие элементы кучи пропускаются при извлечении,
+    а когда их становится больше актуальных, куча пересобирается; перечитанный день
+    не добавляет в кучу записи, время которых не изменилось. Перед отправкой в
+    reminder_marks вставляется отметка, поэтому напоминание не уходит дважды ни после
+    перезапуска, ни из нескольких воркеров. Если доставка не удалась ни в один чат,
+    отметка снимается и напоминание повторяется через REMINDER_RETRY_SECONDS; если
+    только в часть чатов — повторяется только для них.
+    Пропущенные за время простоя напоминания отправляются при запуске, если запись еще не началась."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        clock: Callable[[], datetime] = datetime.now,
+        sender: Callable[[str, str, Callable[[bool], None]], None] = dispatcher.send,
+        offsets: List[int] = REMINDER_OFFSETS
+    ):
+        self._session_factory = session_factory
+        self._clock = clock
+        self._sender = sender
+        self._offsets = sorted(offsets, reverse=True)
+        self._heap: List[Tuple[datetime, str, int, str]] = []  # (когда, ключ записи, отступ, "дата время")
+        self._queued: Set[Tuple[str, int, str]] = set()  # (ключ, отступ, "дата время") элементов кучи
+        self._current: Dict[str, str] = {}  # ключ записи (id или виртуальный id) -> актуальное "дата время"
+        self._by_date: Dict[str, Set[str]] = {}
+        self._series_until: Optional[str] = None  # последний день развернутых серий
+        self._dirty_dates: Set[str] = set()
+        self._failed: List[Tuple[Tuple[str, int, str], List[str], bool]] = []  # (напоминание, чаты, не доставлено никуда)
+        self._retry_chats: Dict[Tuple[str, int, str], List[str]] = {}  # повтор только для части чатов
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"sent": 0, "skipped": 0, "failed": 0}
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def _push(self, when: datetime, key: str, offset: int, start_key: str):
+        if (key, offset, start_key) in self._queued:
+            return
+        self._queued.add((key, offset, start_key))
+        heapq.heappush(self._heap, (when, key, offset, start_key))
+
+    def _schedule(self, key: str, date: str, time: str, previous: Optional[str] = None):
+        start_key = f"{date} {time}"
+        start = appointment_start(date, time)
+        self._current[key] = start_key
+        self._by_date.setdefault(date, set()).add(key)
+        # Время не изменилось — напоминания уже в куче или уже извлечены
+        if previous == start_key:
+            return
+        for offset in self._offsets:
+            self._push(start - timedelta(minutes=offset), key, offset, start_key)
+
+    def _compact(self):
+        """Пересборка кучи без устаревших элементов"""
+        if len(self._heap) <= 2 * len(self._current) * len(self._offsets) + 64:
+            return
+        self._heap = [entry for entry in self._heap if self._current.get(entry[1]) == entry[3]]
+        heapq.heapify(self._heap)
+        self._queued = {(key, offset, start_key) for _, key, offset, start_key in self._heap}
+
+    def _horizon(self) -> str:
+        days = -(-max(self._offsets, default=0) // 1440) + SERIES_HORIZON_DAYS
+        return (self._clock().date() + timedelta(days=days)).isoformat()
+
+    def _load(self, db: Session, dates: Optional[List[str]] = None):
+        query = db.query(
+            AppointmentDB.id, AppointmentDB.series_id, AppointmentDB.occurrence_date, AppointmentDB.date, AppointmentDB.time
+        ).filter(AppointmentDB.status == "scheduled")
+        previous: Dict[str, str] = {}
+        if dates is None:
+            self._heap, self._queued, self._current, self._by_date = [], set(), {}, {}
+            today = self._clock().strftime("%Y-%m-%d")
+            query = query.filter(AppointmentDB.date >= today)
+            self._series_until = self._horizon()
+            occurrences = recurrence.expand(db, None, today, self._series_until)
+        else:
+            for date in dates:
+                for key in self._by_date.pop(date, ()):
+                    # Запись могла переехать на другой день, который уже перечитан
+                    if self._current.get(key, "").startswith(date):
+                        previous[key] = self._current.pop(key)
+            query = query.filter(AppointmentDB.date.in_(dates))
+            # Дни дальше окна серий развернутся, когда до них дойдет окно
+            window = sorted(date for date in dates if self._series_until and date <= self._series_until)
+            occurrences = [
+                occurrence for occurrence in recurrence.expand(db, None, window[0], window[-1])
+                if occurrence["date"] in window
+            ] if window else []
+
+        entries = [
+            (recurrence.virtual_id(series_id, occurrence_date) if series_id is not None and occurrence_date else str(appointment_id), date, time)
+            for appointment_id, series_id, occurrence_date, date, time in query
+        ]
+        entries += [(occurrence["id"], occurrence["date"], occurrence["time"]) for occurrence in occurrences]
+        for key, date, time in entries:
+            try:
+                self._schedule(key, date, time, previous.get(key))
+            except ValueError:
+                logger.warning(f"Reminder skipped: bad date/time for appointment {key}")
+
+    def _extend(self, db: Session):
+        """Сдвиг окна серий: вхождения новых дней добавляются в кучу"""
+        horizon = self._horizon()
+        if self._series_until is None or horizon <= self._series_until:
+            return
+        start = datetime.strptime(self._series_until, "%Y-%m-%d").date() + timedelta(days=1)
+        self._series_until = horizon
+        for occurrence in recurrence.expand(db, None, start.isoformat(), horizon):
+            try:
+                self._schedule(occurrence["id"], occurrence["date"], occurrence["time"])
+            except ValueError:
+                logger.warning(f"Reminder skipped: bad date/time for appointment {occurrence['id']}")
+
+    def _refresh(self, db: Session):
+        with self._lock:
+            if not self._loaded:
+                self._dirty_dates.clear()
+                self._load(db)
+                self._loaded = True
+            elif self._dirty_dates:
+                dates = list(self._dirty_dates)
+                self._dirty_dates.clear()
+                self._load(db, dates)
+            self._extend(db)
+            self._compact()
+
+    def mark_dirty(self, date: str):
+        with self._wakeup:
+            self._dirty_dates.add(date)
+            self._wakeup.notify()
+
+    def mark_series_dirty(self):
+        """Серию создали или завершили: перечитываются все дни окна серий"""
+        with self._wakeup:
+            if self._series_until is not None:
+                day = self._clock().date()
+                while day.isoformat() <= self._series_until:
+                    self._dirty_dates.add(day.isoformat())
+                    day += timedelta(days=1)
+            self._wakeup.notify()
+
+    def reset(self):
+        with self._wakeup:
+            self._loaded = False
+            self._wakeup.notify()
+
+    def next_due(self) -> Optional[datetime]:
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def _pop_due(self, now: datetime) -> List[Tuple[datetime, str, int, str]]:
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                entry = heapq.heappop(self._heap)
+                self._queued.discard(entry[1:])
+                if self._current.get(entry[1]) == entry[3]:
+                    due.append(entry)
+        return due
+
+    def _claim(self, db: Session, key: str, offset: int, start_key: str) -> bool:
+        stmt = dialect_insert(db, ReminderMarkDB).values(
+            appointment_key=key, offset_minutes=offset, scheduled_for=start_key
+        ).on_conflict_do_nothing().returning(ReminderMarkDB.appointment_key)
+        claimed = db.execute(stmt).first() is not None
+        db.commit()
+        return claimed
+
+    def _delivered(self, reminder: Tuple[str, int, str], chat_ids: List[str]) -> Callable[[str, bool], None]:
+        """Сборщик результатов доставки по чатам; вызывается из потока рассылки"""
+        pending = set(chat_ids)
+        failed: List[str] = []
+
+        def done(chat_id: str, ok: bool):
+            with self._wakeup:
+                pending.discard(chat_id)
+                if not ok:
+                    failed.append(chat_id)
+                if not pending and failed:
+                    self._failed.append((reminder, list(failed), len(failed) == len(chat_ids)))
+                    self._wakeup.notify()
+
+        return done
+
+    def _retry_failed(self, db: Session, now: datetime):
+        """Недоставленные напоминания возвращаются в кучу; если не дошло никуда — снимается отметка"""
+        while True:
+            with self._lock:
+                if not self._failed:
+                    return
+                reminder, chat_ids, nowhere = self._failed[0]
+            key, offset, start_key = reminder
+            if nowhere:
+                db.query(ReminderMarkDB).filter(
+                    ReminderMarkDB.appointment_key == key,
+                    ReminderMarkDB.offset_minutes == offset,
+                    ReminderMarkDB.scheduled_for == start_key
+                ).delete(synchronize_session=False)
+                db.commit()
+            with self._lock:
+                self._failed.pop(0)
+                self.stats["failed"] += 1
+                if not nowhere:
+                    self._retry_chats[reminder] = chat_ids
+                self._push(now + timedelta(seconds=REMINDER_RETRY_SECONDS), key, offset, start_key)
+
+    def _recipients(self, master: Optional[MasterDB]) -> List[str]:
+        if master is not None and master.telegram_id:
+            return [str(master.telegram_id)]
+        return admin_chat_ids(master)
+
+    def run_due(self) -> int:
+        """Отправляет наступившие напоминания; возвращает число отправленных"""
+        sent = 0
+        db = self._session_factory()
+        try:
+            self._refresh(db)
+            now = self._clock()
+            self._retry_failed(db, now)
+            for _, key, offset, start_key in self._pop_due(now):
+                retry_chats = self._retry_chats.pop((key, offset, start_key), None)
+                start = datetime.strptime(start_key, "%Y-%m-%d %H:%M")
+                # Запись уже началась или подошло более позднее напоминание — это не нужно
+                if start <= now or any(o < offset and start - timedelta(minutes=o) <= now for o in self._offsets):
+                    self.stats["skipped"] += 1
+                    continue
+
+                # Другой воркер мог изменить запись, а событие шины еще не дошло
+                apt = recurrence.resolve(db, key)
+                if apt is None or apt.status != "scheduled" or f"{apt.date} {apt.time}" != start_key:
+                    self.stats["skipped"] += 1
+                    continue
+                # Повтор для части чатов: отметка уже стоит
+                if retry_chats is None and not self._claim(db, key, offset, start_key):
+                    continue
+
+                master = db.query(MasterDB).filter(MasterDB.id == apt.master_id).first()
+                # После простоя напоминание может уйти позже срока, поэтому время считается от текущего
+                remaining = int((start - now).total_seconds() // 60)
+                message = f"⏰ <b>Напоминание: запись через {format_remaining(remaining)}</b>\n\n"
+                message += format_appointment_info(apt, master) if master else f"📅 {start_key}\n"
+                chat_ids = retry_chats or self._recipients(master)
+                done = self._delivered((key, offset, start_key), chat_ids)
+                for chat_id in chat_ids:
+                    self._sender(chat_id, message, lambda ok, chat_id=chat_id: done(chat_id, ok))
+                sent += 1
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Reminder scheduler error: {e}")
+            # Извлеченные из кучи напоминания не должны потеряться: полная перезагрузка,
+            # уже отправленные отсекутся отметками
+            self.reset()
+        finally:
+            db.close()
+        self.stats["sent"] += sent
+        return sent
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self.run_due()
+            with self._wakeup:
+                if self._stopped.is_set() or self._dirty_dates or self._failed:
+                    continue
+                timeout = MAX_SLEEP_SECONDS
+                if not self._loaded:
+                    timeout = 5.0  # загрузка не удалась (база недоступна), повтор позже
+                elif self._heap:
+                    timeout = min(timeout, max((self._heap[0][0] - self._clock()).total_seconds(), 0.0))
+                self._wakeup.wait(timeout)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="reminders", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        with self._wakeup:
+            self._wakeup.notify()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+
+reminders = ReminderScheduler()
+
+
+def _on_invalidate(key: str):
+    if key == "*":
+        reminders.reset()
+    elif key == "series":
+        reminders.mark_series_dirty()
+    elif key.startswith("day:"):
+        reminders.mark_dirty(key[4:])
+
+
+bus.subscribe(_on_invalidate)
@@ -0,0 +1,252 @@
+import math
+import re
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import Numeric, and_, cast, func, literal_column, or_
+from sqlalchemy.orm import Session
+
+from cache import bus
+from models import AppointmentDB
+
+# Конфигурация полнотекстового поиска PostgreSQL (стемминг для русского)
+TS_CONFIG = "russian"
+
+# Окончания для упрощенного стемминга в индексе в памяти, от длинных к коротким
+_ENDINGS = sorted({
+    "иями", "ями", "ами", "ией", "иях", "иям", "ием", "ия", "ию", "ии", "ях", "ах", "ов", "ев", "ей", "ий", "ый", "ой", "ая", "яя",
+    "ое", "ее", "ые", "ие", "ого", "его", "ому", "ему", "ым", "им", "ом", "ем", "ую", "юю", "ых", "их",
+    "ешь", "ете", "ишь", "ите", "ать", "ять", "ить", "еть", "ала", "ила", "ыла", "ало", "или", "али",
+    "ал", "ил", "ла", "ли", "ть", "ет", "ит", "ут", "ют", "ат", "ят",
+    "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й"
+}, key=len, reverse=True)
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def stem(word: str) -> str:
+    """Грубый стемминг: отрезает окончание, оставляя основу не короче 3 букв"""
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    return [stem(word) for word in _WORD.findall(text.lower().replace("ё", "е"))]
+
+
+def appointment_to_api(apt: AppointmentDB, rank: float) -> dict:
+    return {
+        "id": str(apt.id),
+        "time": apt.time,
+        "duration": apt.duration,
+        "clientName": apt.client_name,
+        "comment": apt.comment or "",
+        "date": apt.date,
+        "status": apt.status,
+        "masterId": str(apt.master_id),
+        "payment": {"cash": apt.cash_payment, "card": apt.card_payment} if apt.status == "completed" else None,
+        "rank": rank
+    }
+
+
+def parse_cursor(cursor: Optional[str]) -> Optional[Tuple[float, int]]:
+    """Курсор "ранг:id" последней записи предыдущей страницы"""
+    if not cursor:
+        return None
+    rank, _, appointment_id = cursor.rpartition(":")
+    return float(rank), int(appointment_id)
+
+
+class InvertedIndex:
+    """Инвертированный индекс по имени клиента и комментарию — для SQLite и тестов.
+
+    Строится при первом поиске; мутации записей публикуют day:{date},
+    по ним переиндексируются только затронутые дни. Списки записей ведутся
+    по (салон, основа), поиск салона не просматривает записи других салонов."""
+
+    def __init__(self):
+        self._postings: Dict[Tuple[int, str], Dict[int, int]] = {}  # (салон, основа) -> id записи -> частота
+        self._docs: Dict[int, Tuple[int, str, int, Tuple[str, ...]]] = {}  # id -> (салон, дата, мастер, основы)
+        self._salon_sizes: Dict[int, int] = {}
+        self._by_date: Dict[str, Set[int]] = {}
+        self._dirty_dates: Set[str] = set()
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _remove(self, appointment_id: int):
+        salon_id, date, _, terms = self._docs.pop(appointment_id)
+        self._salon_sizes[salon_id] -= 1
+        ids = self._by_date[date]
+        ids.discard(appointment_id)
+        if not ids:
+            del self._by_date[date]
+        for term in set(terms):
+            postings = self._postings[(salon_id, term)]
+            postings.pop(appointment_id, None)
+            if not postings:
+                del self._postings[(salon_id, term)]
+
+    def _add(self, appointment_id: int, salon_id: int, date: str, master_id: int, text: str):
+        terms = tuple(tokenize(text))
+        self._docs[appointment_id] = (salon_id, date, master_id, terms)
+        self._salon_sizes[salon_id] = self._salon_sizes.get(salon_id, 0) + 1
+        self._by_date.setdefault(date, set()).add(appointment_id)
+        for term in terms:
+            postings = self._postings.setdefault((salon_id, term), {})
+            postings[appointment_id] = postings.get(appointment_id, 0) + 1
+
+    def _index_rows(self, rows):
+        for appointment_id, salon_id, date, master_id, client_name, comment in rows:
+            self._add(appointment_id, salon_id, date, master_id, f"{client_name} {comment or ''}")
+
+    def _columns(self, db: Session):
+        return db.query(
+            AppointmentDB.id, AppointmentDB.salon_id, AppointmentDB.date, AppointmentDB.master_id,
+            AppointmentDB.client_name, AppointmentDB.comment
+        )
+
+    def _refresh(self, db: Session):
+        if not self._loaded:
+            self._postings, self._docs, self._by_date, self._salon_sizes = {}, {}, {}, {}
+            self._dirty_dates.clear()
+            self._index_rows(self._columns(db))
+            self._loaded = True
+            return
+        if self._dirty_dates:
+            dates = list(self._dirty_dates)
+            self._dirty_dates.clear()
+            for date in dates:
+                for appointment_id in list(self._by_date.get(date, ())):
+                    self._remove(appointment_id)
+            self._index_rows(self._columns(db).filter(AppointmentDB.date.in_(dates)))
+
+    def mark_dirty(self, date: str):
+        with self._lock:
+            self._dirty_dates.add(date)
+
+    def reset(self):
+        with self._lock:
+            self._loaded = False
+
+    def search(
+        self,
+        db: Session,
+        salon_id: int,
+        query: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        master_id: Optional[int] = None,
+        limit: int = 20,
+        after: Optional[Tuple[float, int]] = None
+    ) -> List[Tuple[float, int]]:
+        """(ранг, id) найденных записей: все слова запроса должны встречаться, ранг — TF-IDF"""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        with self._lock:
+            self._refresh(db)
+            postings = [self._postings.get((salon_id, term), {}) for term in terms]
+            if not all(postings):
+                return []
+            postings.sort(key=len)
+            total = self._salon_sizes[salon_id]
+
+            results = []
+            for appointment_id in postings[0]:
+                if not all(appointment_id in p for p in postings[1:]):
+                    continue
+                _, date, doc_master_id, doc_terms = self._docs[appointment_id]
+                if start_date and date < start_date or end_date and date > end_date:
+                    continue
+                if master_id is not None and doc_master_id != master_id:
+                    continue
+                rank = sum(
+                    p[appointment_id] / len(doc_terms) * math.log(1 + total / len(p)) for p in postings
+                )
+                rank = round(rank, 6)
+                if after is not None and (rank, appointment_id) >= after:
+                    continue
+                results.append((rank, appointment_id))
+
+        results.sort(reverse=True)
+        return results[:limit]
+
+
+inverted_index = InvertedIndex()
+
+
+def _on_invalidate(key: str):
+    if key == "*":
+        inverted_index.reset()
+    elif key.startswith("day:"):
+        inverted_index.mark_dirty(key[4:])
+
+
+bus.subscribe(_on_invalidate)
+
+
+def _search_postgres(
+    db: Session,
+    salon_id: int,
+    query: str,
+    start_date: Optional[str],
+    end_date: Optional[str],
+    master_id: Optional[int],
+    limit: int,
+    after: Optional[Tuple[float, int]]
+) -> List[Tuple[float, AppointmentDB]]:
+    # Выражение совпадает с индексом ix_appointments_fulltext, иначе GIN не используется
+    config = literal_column(f"'{TS_CONFIG}'::regconfig")
+    document = func.to_tsvector(
+        config, AppointmentDB.client_name + " " + func.coalesce(AppointmentDB.comment, "")
+    )
+    ts_query = func.plainto_tsquery(config, query)
+    rank = func.round(cast(func.ts_rank(document, ts_query), Numeric), 6)
+
+    q = db.query(rank, AppointmentDB).filter(AppointmentDB.salon_id == salon_id, document.op("@@")(ts_query))
+    if start_date:
+        q = q.filter(AppointmentDB.date >= start_date)
+    if end_date:
+        q = q.filter(AppointmentDB.date <= end_date)
+    if master_id is not None:
+        q = q.filter(AppointmentDB.master_id == master_id)
+    if after is not None:
+        q = q.filter(or_(rank < after[0], and_(rank == after[0], AppointmentDB.id < after[1])))
+    return q.order_by(rank.desc(), AppointmentDB.id.desc()).limit(limit).all()
+
+
+def search_appointments(
+    db: Session,
+    salon_id: int,
+    query: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    master_id: Optional[int] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None
+) -> dict:
+    """Поиск записей салона по имени клиента и комментарию, по убыванию релевантности.
+
+    На PostgreSQL — полнотекстовый поиск по GIN-индексу, на остальных базах — индекс в памяти."""
+    after = parse_cursor(cursor)
+
+    if db.get_bind().dialect.name == "postgresql":
+        rows = [(float(rank), apt) for rank, apt in _search_postgres(
+            db, salon_id, query, start_date, end_date, master_id, limit + 1, after
+        )]
+    else:
+        found = inverted_index.search(db, salon_id, query, start_date, end_date, master_id, limit + 1, after)
+        appointments = {
+            apt.id: apt for apt in
+            db.query(AppointmentDB).filter(AppointmentDB.id.in_([i for _, i in found])).all()
+        } if found else {}
+        rows = [(rank, appointments[i]) for rank, i in found if i in appointments]
+
+    page = rows[:limit]
+    next_cursor = f"{page[-1][0]}:{page[-1][1].id}" if len(rows) > limit else None
+    return {
+        "items": [appointment_to_api(apt, rank) for rank, apt in page],
+        "nextCursor": next_cursor
+    }
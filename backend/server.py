@@ -1,46 +1,114 @@
-from fastapi import FastAPI, HTTPException, Query, Depends
+from fastapi import FastAPI, HTTPException, Query, Depends, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import DateTime, case, func, literal, select, union_all
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import OperationalError
-from typing import Optional, Dict, List,Literal
+from typing import Optional, Dict, List, Literal, Tuple
 from datetime import datetime,timedelta
+import asyncio
+import json
 import os
+import threading
 from dotenv import load_dotenv
 import jwt
-from middleware import verify_token
-from database import JWT_SECRET_KEY, get_db, init_db
+from middleware import (
+    verify_token, token_claims, current_salon, require_bot, require_admin, salon_invite_code, parse_invite_code
+)
+from database import (
+    JWT_SECRET_KEY, DEFAULT_SALON_ID, engine, read_engine, ReadSessionLocal, get_db, get_read_db, mark_write, dialect_insert,
+    read_session_factory, snapshot_sessions, check_schema, warm_pool, has_replica, note_write, replica_lag
+)
+from cache import cache, bus
+from singleflight import singleflight, request_key
+from formats import respond, parse_fields, select_fields, compress, accepted_encoding, encoded_response
+from stale import stale_store, mark_stale, DATABASE_ERRORS
+from admission import admit, admission_stats
 # Импорт моделей и функций из новых модулей
 from models import (
     Appointment, AppointmentCreate, AppointmentUpdate, 
     Master, CompleteAppointmentRequest, Stats, Payment,
-    AppointmentDB, MasterDB, MasterRegisterRequest
+    AppointmentDB, AppointmentArchiveDB, MasterDB, MasterRegisterRequest,
+    Expense, ExpenseCreate, ExpenseUpdate, ExpenseDB, Client,
+    BatchReadItem, BatchReadRequest, AppointmentSeriesDB, Series, SeriesCreate,
+    SalonDB, Salon, SalonCreate, CommissionRuleDB, CommissionRule, CommissionRuleCreate, CommissionRuleUpdate,
+    DayReopen
 )
+from finance import (
+    income_snapshot,
+    expense_snapshot,
+    apply_income_change,
+    apply_expense_change,
+    profit_and_loss
+)
+from search import search_appointments
+from reminders import reminders, REMINDERS_ENABLED
+import dayclose
+from dayclose import day_closer, DAY_CLOSE_ENABLED
+from clients import get_or_create_client, client_index, client_snapshot, apply_client_change, client_history
+from importer import import_file, parse_aliases
+from payroll import RULES_TAG, payroll_statement, rule_to_api
+import recurrence
 
 from notifications import (
     notify_appointment_created,
     notify_appointment_cancelled,
     notify_appointment_edited,
     notify_appointment_moved,
-    notify_appointment_completed
+    notify_appointment_completed,
+    dispatcher
 )
 
 load_dotenv()
 
+# Фоновое заполнение кэшей после старта воркера
+PRELOAD_CACHES = os.getenv("PRELOAD_CACHES", "true").lower() == "true"
+
 # Определение lifespan для управления жизненным циклом приложения
 
 # Инициализация базы данных при запуске
 from contextlib import asynccontextmanager
 
+def preload_caches():
+    """Заполнение кэшей в фоне после старта: список мастеров, индекс клиентов
+    и запрос расписания на сегодня (скомпилированный SQL и страницы базы) — для салона по умолчанию"""
+    db = ReadSessionLocal()
+    try:
+        load_masters(db, DEFAULT_SALON_ID)
+        client_index.load(db, DEFAULT_SALON_ID)
+        load_day_appointments(db, DEFAULT_SALON_ID, datetime.now().strftime("%Y-%m-%d"))
+    except Exception as e:
+        print(f"Error preloading caches: {e}")
+    finally:
+        db.close()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Код, выполняемый при запуске
-    init_db()
+    # Схемой владеет Alembic: только сверка ревизии (SCHEMA_CHECK), без create_all
+    check_schema()
+    warm_pool(engine)
+    if read_engine is not engine:
+        warm_pool(read_engine)
     # Добавление начальных данных, если база пуста
+    bus.start()
+    if REMINDERS_ENABLED:
+        reminders.start()
+    if DAY_CLOSE_ENABLED:
+        day_closer.start()
+    if PRELOAD_CACHES:
+        threading.Thread(target=preload_caches, name="preload", daemon=True).start()
 
     yield  # Здесь приложение работает
     
     # Код, выполняемый при завершении работы
     # Например, закрытие соединений с базой данных
+    reminders.stop()
+    day_closer.stop()
+    dispatcher.stop()
+    bus.stop()
 
 # Создание экземпляра FastAPI с использованием lifespan
 app = FastAPI(
@@ -58,74 +126,137 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# POST-запросы, которые только читают: после них клиент остается на реплике
+READ_ONLY_POSTS = {"/api/batch-read"}
+
+@app.middleware("http")
+async def read_after_write(request: Request, call_next):
+    response = await call_next(request)
+    # После успешной записи клиент какое-то время читает с основной базы
+    if (request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400
+            and request.url.path not in READ_ONLY_POSTS):
+        client = mark_write(request)
+        # Следующий запрос клиента может попасть в другой воркер
+        if has_replica():
+            bus.publish(f"write:{client}", local=False)
+    return response
+
+def _on_remote_write(key: str):
+    if key.startswith("write:"):
+        note_write(key[6:])
+
+
+bus.subscribe(_on_remote_write)
+
 @app.get("/api/health")
 async def health_check():
-    return {"status": "ok", "message": "WANT Salon API is running"}
+    return {"status": "ok", "message": "WANT Salon API is running",
+            "singleflight": singleflight.stats,
+            "admission": admission_stats(),
+            "reminders": {**reminders.stats, "pending": len(reminders)},
+            "notifications": dispatcher.stats,
+            "dayClose": day_closer.stats,
+            "stale": stale_store.health()}
+
+# Загрузчики чтения: общие для отдельных endpoint'ов и /api/batch-read
+
+def salon_key(request: Request, salon_id: int) -> str:
+    """Ключ single-flight в пределах салона: одинаковые URL разных салонов не объединяются"""
+    return request_key(request, f"salon:{salon_id}")
+
+
+def load_masters(db: Session, salon_id: int) -> list:
+    cached = cache.get(f"masters:{salon_id}")
+    if cached is not None:
+        return cached
+    masters = db.query(MasterDB).filter(MasterDB.salon_id == salon_id).all()
+    result = [{"id": str(m.id), "name": m.name, "color": m.color, "role": m.role} for m in masters]
+    cache.set(f"masters:{salon_id}", result, tags=["masters"], settle_seconds=replica_lag(db))
+    return result
 
-@app.get("/api/masters", response_model=List[Master])
-async def get_masters(db: Session = Depends(get_db)):
-    masters = db.query(MasterDB).all()
-    return [{"id": str(m.id), "name": m.name, "color": m.color, "role": m.role} for m in masters]
 
+def get_salon_master(db: Session, salon_id: int, master_id: str) -> Optional[MasterDB]:
+    """Мастер салона по id; мастер другого салона не находится"""
+    return db.query(MasterDB).filter(MasterDB.id == int(master_id), MasterDB.salon_id == salon_id).first()
 
-@app.get("/api/masters/{master_id}/appointments")
+
+@app.get("/api/masters", response_model=List[Master], dependencies=[Depends(admit("light"))])
+async def get_masters(request: Request, salon_id: int = Depends(current_salon)):
+    cached = cache.get(f"masters:{salon_id}")
+    if cached is not None:
+        return cached
+
+    masters, age = await stale_store.serve(
+        salon_key(request, salon_id), read_session_factory(request), lambda db: load_masters(db, salon_id)
+    )
+    return masters if age is None else mark_stale(JSONResponse(masters), age)
+
+
+@app.get("/api/masters/{master_id}/appointments", dependencies=[Depends(admit("default"))])
 async def get_appointments(
+    request: Request,
     master_id: str,
     date: Optional[str] = Query(None, description="Дата в формате YYYY-MM-DD"),
-    db: Session = Depends(get_db)
+    salon_id: int = Depends(current_salon)
 ):
-    # Проверка существования мастера
-    master = db.query(MasterDB).filter(MasterDB.id == int(master_id)).first()
-    if not master:
-        raise HTTPException(status_code=404, detail="Master not found")
-    
-    # Получение записей
-    query = db.query(AppointmentDB).filter(AppointmentDB.master_id == int(master_id))
-    if date:
-        query = query.filter(AppointmentDB.date == date)
-    
-    appointments = query.all()
-    
-    # Преобразование в формат API
-    result = []
-    for apt in appointments:
-        result.append({
-            "id": str(apt.id),
-            "time": apt.time,
-            "duration": apt.duration,
-            "clientName": apt.client_name,
-            "comment": apt.comment or "",
-            "status": apt.status,
-            "date": apt.date,
-            "masterId": str(apt.master_id),
-            "payment": {"cash": apt.cash_payment, "card": apt.card_payment} if apt.status == "completed" else {}
-        })
-    
-    return result
+    def load(db: Session):
+        # Проверка существования мастера
+        if not get_salon_master(db, salon_id, master_id):
+            raise HTTPException(status_code=404, detail="Master not found")
 
-@app.get("/api/appointments")
-async def get_appointments(
-    date: Optional[str] = Query(None, description="Дата в формате YYYY-MM-DD"),
-    master_id: Optional[str] = Query(None, description="ID мастера"),
-    db: Session = Depends(get_db)
-):
+        # Получение записей
+        query = db.query(AppointmentDB).filter(AppointmentDB.master_id == int(master_id))
+        if date:
+            query = query.filter(AppointmentDB.date == date)
+
+        appointments = query.all()
+
+        # Преобразование в формат API
+        result = []
+        start_date, end_date = (date, date) if date else horizon()
+        for apt in appointments:
+            result.append({
+                "id": str(apt.id),
+                "time": apt.time,
+                "duration": apt.duration,
+                "clientName": apt.client_name,
+                "comment": apt.comment or "",
+                "status": apt.status,
+                "date": apt.date,
+                "masterId": str(apt.master_id),
+                "payment": {"cash": apt.cash_payment, "card": apt.card_payment} if apt.status == "completed" else {}
+            })
+        result.extend(recurrence.expand(db, salon_id, start_date, end_date, int(master_id)))
+
+        return result
+
+    return await respond(request, salon_key(request, salon_id), read_session_factory(request), load)
+
+
+def load_day_appointments(db: Session, salon_id: int, date: Optional[str] = None, master_id: Optional[str] = None) -> dict:
     result = {}
-    
-    # Получение всех мастеров
-    masters = db.query(MasterDB).all()
+
+    # Получение всех мастеров салона
+    masters = db.query(MasterDB).filter(MasterDB.salon_id == salon_id).all()
     #master_id = auth_data.get("master_id") if auth_data else None
 
+    # Вхождения повторяющихся записей — только для конкретного дня
+    occurrences: Dict[str, list] = {}
+    if date:
+        for occurrence in recurrence.expand(db, salon_id, date, date, int(master_id) if master_id else None):
+            occurrences.setdefault(occurrence["masterId"], []).append(occurrence)
+
     for master in masters:
         if master_id and str(master.id) != master_id:
             continue
-        
+
         # Получение записей для каждого мастера
         query = db.query(AppointmentDB).filter(AppointmentDB.master_id == master.id)
         if date:
             query = query.filter(AppointmentDB.date == date)
-        
+
         appointments = query.all()
-        
+
         # Преобразование в формат API
         master_appointments = []
         for apt in appointments:
@@ -140,47 +271,71 @@ async def get_appointments(
                 "masterId": str(apt.master_id),
                 "payment": {"cash": apt.cash_payment, "card": apt.card_payment} if apt.status == "completed" else None
             })
-        
+        master_appointments.extend(occurrences.get(str(master.id), []))
+
         result[str(master.id)] = master_appointments
-    
+
     return result
 
 
-@app.get("/api/appointments/range")
-async def get_appointments_range(
-    start_date: str = Query(..., description="Начальная дата в формате YYYY-MM-DD"),
-    end_date: str = Query(..., description="Конечная дата в формате YYYY-MM-DD"),
-    master_id: Optional[str] = Query(None, description="ID мастера (опционально)"),
-    db: Session = Depends(get_db)
+@app.get("/api/appointments", dependencies=[Depends(admit("default"))])
+async def get_appointments(
+    request: Request,
+    date: Optional[str] = Query(None, description="Дата в формате YYYY-MM-DD"),
+    master_id: Optional[str] = Query(None, description="ID мастера"),
+    salon_id: int = Depends(current_salon)
 ):
-    result = {}
-    
+    return await respond(
+        request, salon_key(request, salon_id), read_session_factory(request),
+        lambda db: load_day_appointments(db, salon_id, date, master_id)
+    )
+
+
+def validate_dates(*values: Optional[str]):
     try:
         # Проверяем формат дат
-        datetime.strptime(start_date, "%Y-%m-%d")
-        datetime.strptime(end_date, "%Y-%m-%d")
+        for value in values:
+            if value:
+                datetime.strptime(value, "%Y-%m-%d")
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
-    
-    # Формируем запрос с учетом master_id если он передан
-    query = db.query(AppointmentDB)
-    
+
+
+def horizon() -> tuple:
+    """Окно для запросов без даты: сегодня и DEFAULT_HORIZON_DAYS дней вперед"""
+    today = datetime.now().date()
+    end = today + timedelta(days=recurrence.DEFAULT_HORIZON_DAYS)
+    return today.isoformat(), end.isoformat()
+
+
+def load_appointments_range(
+    db: Session,
+    salon_id: int,
+    start_date: str,
+    end_date: str,
+    master_id: Optional[str] = None
+) -> dict:
+    result = {}
+
+    # Формируем запрос с учетом master_id если он передан; (salon_id, date) — по индексу
+    query = db.query(AppointmentDB).filter(AppointmentDB.salon_id == salon_id)
+
     if master_id:
         query = query.filter(AppointmentDB.master_id == int(master_id))
-    
+
     # Фильтруем по диапазону дат (сравниваем строки, а не datetime)
     query = query.filter(
         AppointmentDB.date >= start_date,
         AppointmentDB.date <= end_date
     )
-    
+
     appointments = query.all()
-    
+
     for apt in appointments:
         date_key = apt.date
         if date_key not in result:
             result[date_key] = []
-        
+
         result[date_key].append({
             "id": str(apt.id),
             "time": apt.time,
@@ -192,25 +347,150 @@ async def get_appointments_range(
             "masterId": str(apt.master_id),
             "payment": {"cash": apt.cash_payment, "card": apt.card_payment} if apt.status == "completed" else None
         })
-    
+
+    for occurrence in recurrence.expand(db, salon_id, start_date, end_date, int(master_id) if master_id else None):
+        result.setdefault(occurrence["date"], []).append(occurrence)
+
     return result
 
-@app.post("/api/appointments/{master_id}", response_model=Appointment, status_code=201)
+
+@app.get("/api/appointments/range", dependencies=[Depends(admit("heavy"))])
+async def get_appointments_range(
+    request: Request,
+    start_date: str = Query(..., description="Начальная дата в формате YYYY-MM-DD"),
+    end_date: str = Query(..., description="Конечная дата в формате YYYY-MM-DD"),
+    master_id: Optional[str] = Query(None, description="ID мастера (опционально)"),
+    salon_id: int = Depends(current_salon)
+):
+    validate_dates(start_date, end_date)
+    return await respond(
+        request, salon_key(request, salon_id), read_session_factory(request),
+        lambda db: load_appointments_range(db, salon_id, start_date, end_date, master_id)
+    )
+
+
+@app.get("/api/calendar/summary", dependencies=[Depends(admit("default"))])
+async def get_calendar_summary(
+    request: Request,
+    start_date: str = Query(..., description="Начальная дата в формате YYYY-MM-DD"),
+    end_date: str = Query(..., description="Конечная дата в формате YYYY-MM-DD"),
+    master_id: Optional[str] = Query(None, description="ID мастера (опционально)"),
+    salon_id: int = Depends(current_salon),
+    db: Session = Depends(get_read_db)
+):
+    """Сводка для календаря: по дням и мастерам количество записей по статусам и выручка"""
+    validate_dates(start_date, end_date)
+
+    def load():
+        # Один сгруппированный запрос вместо выгрузки всех записей
+        query = db.query(
+            AppointmentDB.date,
+            AppointmentDB.master_id,
+            AppointmentDB.status,
+            func.count(AppointmentDB.id),
+            func.sum(AppointmentDB.cash_payment + AppointmentDB.card_payment)
+        ).filter(
+            AppointmentDB.salon_id == salon_id,
+            AppointmentDB.date >= start_date,
+            AppointmentDB.date <= end_date
+        )
+        if master_id:
+            query = query.filter(AppointmentDB.master_id == int(master_id))
+        query = query.group_by(AppointmentDB.date, AppointmentDB.master_id, AppointmentDB.status)
+
+        result = {}
+        for date, apt_master_id, status, count, revenue in query.all():
+            day = result.setdefault(date, {})
+            summary = day.setdefault(str(apt_master_id), {
+                "scheduled": 0,
+                "completed": 0,
+                "cancelled": 0,
+                "total": 0,
+                "revenue": 0.0
+            })
+            summary[status] = summary.get(status, 0) + count
+            summary["total"] += count
+            if status == "completed":
+                summary["revenue"] += float(revenue or 0)
+
+        # Вхождения повторяющихся записей считаются запланированными
+        counts = recurrence.count_by_day(db, salon_id, start_date, end_date, int(master_id) if master_id else None)
+        for (date, apt_master_id), count in counts.items():
+            summary = result.setdefault(date, {}).setdefault(str(apt_master_id), {
+                "scheduled": 0,
+                "completed": 0,
+                "cancelled": 0,
+                "total": 0,
+                "revenue": 0.0
+            })
+            summary["scheduled"] += count
+            summary["total"] += count
+
+        return result
+
+    return await singleflight.json_response(salon_key(request, salon_id), load)
+
+
+@app.get("/api/search", dependencies=[Depends(admit("default"))])
+async def search(
+    q: str = Query(..., min_length=1),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    master_id: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    salon_id: int = Depends(current_salon),
+    db: Session = Depends(get_read_db)
+):
+    """Поиск записей салона по имени клиента и комментарию, от более релевантных к менее"""
+    validate_dates(start_date, end_date)
+    try:
+        return search_appointments(db, salon_id, q, start_date, end_date, parse_master_id(master_id), limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def find_appointment(db: Session, master_id: int, appointment_id: str) -> Optional[AppointmentDB]:
+    """Запись мастера (уже проверенного на принадлежность салону) по id. Вхождение серии ("s{series_id}-{YYYYMMDD}") при изменении
+    получает свою строку (материализуется).
+
+    Строка блокируется до коммита (FOR UPDATE на PostgreSQL): по ней снимается снимок «до» для итогов,
+    и одновременное проведение той же записи ждет, а не учитывает ее дважды"""
+    if recurrence.parse_virtual_id(appointment_id):
+        return recurrence.materialize(db, appointment_id, master_id)
+    return db.query(AppointmentDB).filter(
+        AppointmentDB.id == int(appointment_id),
+        AppointmentDB.master_id == master_id
+    ).with_for_update().populate_existing().first()
+
+
+def check_day_open(db: Session, salon_id: int, date: str):
+    """Выручку закрытого дня меняют только после переоткрытия (backend/dayclose.py)"""
+    try:
+        dayclose.check_day_open(db, salon_id, date)
+    except dayclose.DayStateError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.post("/api/appointments/{master_id}", response_model=Appointment, status_code=201, dependencies=[Depends(admit("default"))])
 async def create_appointment(
     master_id: str, 
     appointment: AppointmentCreate,
+    salon_id: int = Depends(current_salon),
     db: Session = Depends(get_db)
 ):
     # Проверка существования мастера
-    master = db.query(MasterDB).filter(MasterDB.id == int(master_id)).first()
+    master = get_salon_master(db, salon_id, master_id)
     if not master:
         raise HTTPException(status_code=404, detail="Master not found")
     
     # Создание новой записи
     new_appointment = AppointmentDB(
+        salon_id=salon_id,
         time=appointment.time,
         duration=appointment.duration,
         client_name=appointment.clientName,
+        client_id=get_or_create_client(db, salon_id, appointment.clientName),
         comment=appointment.comment,
         date=appointment.date,
         status="scheduled",
@@ -218,7 +498,9 @@ async def create_appointment(
     )
     
     db.add(new_appointment)
+    apply_client_change(db, None, client_snapshot(new_appointment))
     db.commit()
+    bus.publish(f"day:{new_appointment.date}", f"master:{master_id}")
     notify_appointment_created(new_appointment, master)
 
     db.refresh(new_appointment)
@@ -236,34 +518,38 @@ async def create_appointment(
         "payment": None
     }
 
-@app.put("/api/appointments/{master_id}/{appointment_id}", response_model=Appointment)
+@app.put("/api/appointments/{master_id}/{appointment_id}", response_model=Appointment, dependencies=[Depends(admit("default"))])
 async def update_appointment(
     master_id: str,
     appointment_id: str,
     appointment: AppointmentUpdate,
+    salon_id: int = Depends(current_salon),
     db: Session = Depends(get_db)
 ):
     # Проверка существования мастера
-    master = db.query(MasterDB).filter(MasterDB.id == int(master_id)).first()
+    master = get_salon_master(db, salon_id, master_id)
     if not master:
         raise HTTPException(status_code=404, detail="Master not found")
     
     # Поиск записи
-    apt = db.query(AppointmentDB).filter(
-        AppointmentDB.id == int(appointment_id),
-        AppointmentDB.master_id == int(master_id)
-    ).first()
+    apt = find_appointment(db, int(master_id), appointment_id)
     
     if not apt:
         raise HTTPException(status_code=404, detail="Appointment not found")
 
+    update_data = appointment.model_dump(exclude_unset=True)
+    new_status = update_data.get("status") or apt.status
+    if "completed" in (apt.status, new_status) and ("payment" in update_data or new_status != apt.status):
+        check_day_open(db, salon_id, apt.date)
+
 # Сохранить старые значения перед обновлением
     old_date = apt.date
     old_time = apt.time
+    old_income = income_snapshot(apt)
+    old_client = client_snapshot(apt)
 
 
     # Обновление полей
-    update_data = appointment.model_dump(exclude_unset=True)
     # Маппинг полей API на поля модели базы данных
     field_mapping = {
         "clientName": "client_name",
@@ -276,12 +562,17 @@ async def update_appointment(
     for key, value in update_data.items():
         if key in ["clientName", "comment", "duration", "time", "status"]:
             setattr(apt, field_mapping[key], value)
+    if "clientName" in update_data:
+        apt.client_id = get_or_create_client(db, salon_id, apt.client_name)
     if "payment" in update_data and update_data["payment"]:
-        apt.cash_payment = update_data["payment"].cash
-        apt.card_payment = update_data["payment"].card
+        apt.cash_payment = update_data["payment"]["cash"]
+        apt.card_payment = update_data["payment"]["card"]
+    apply_income_change(db, old_income, income_snapshot(apt))
+    apply_client_change(db, old_client, client_snapshot(apt))
     
     db.commit()
     db.refresh(apt)
+    bus.publish(f"day:{old_date}", f"day:{apt.date}", f"master:{master_id}")
     # После обновления проверить, была ли перенесена запись
     if ("time" in update_data or "date" in update_data) and (old_date != apt.date or old_time != apt.time):
         notify_appointment_moved(apt, master, old_date, old_time)
@@ -303,34 +594,39 @@ async def update_appointment(
         "payment": {"cash": apt.cash_payment, "card": apt.card_payment} if apt.status == "completed" else None
     }
 
-@app.post("/api/appointments/{master_id}/{appointment_id}/complete", response_model=Appointment)
+@app.post("/api/appointments/{master_id}/{appointment_id}/complete", response_model=Appointment, dependencies=[Depends(admit("default"))])
 async def complete_appointment(
     master_id: str,
     appointment_id: str,
     request: CompleteAppointmentRequest,
+    salon_id: int = Depends(current_salon),
     db: Session = Depends(get_db)
 ):
     # Проверка существования мастера
-    master = db.query(MasterDB).filter(MasterDB.id == int(master_id)).first()
+    master = get_salon_master(db, salon_id, master_id)
     if not master:
         raise HTTPException(status_code=404, detail="Master not found")
     
     # Поиск записи
-    apt = db.query(AppointmentDB).filter(
-        AppointmentDB.id == int(appointment_id),
-        AppointmentDB.master_id == int(master_id)
-    ).first()
+    apt = find_appointment(db, int(master_id), appointment_id)
     
     if not apt:
         raise HTTPException(status_code=404, detail="Appointment not found")
     
+    check_day_open(db, salon_id, apt.date)
+
     # Обновление статуса и платежа
+    old_income = income_snapshot(apt)
+    old_client = client_snapshot(apt)
     apt.status = "completed"  # type: ignore
     apt.cash_payment = request.payment.cash  # type: ignore
     apt.card_payment = request.payment.card  # type: ignore
+    apply_income_change(db, old_income, income_snapshot(apt))
+    apply_client_change(db, old_client, client_snapshot(apt))
     
     db.commit()
     db.refresh(apt)
+    bus.publish(f"day:{apt.date}", f"master:{master_id}")
     notify_appointment_completed(apt, master)
     # Возврат в формате API
     return {
@@ -345,31 +641,37 @@ async def complete_appointment(
         "payment": {"cash": apt.cash_payment, "card": apt.card_payment}
     }
 
-@app.post("/api/appointments/{master_id}/{appointment_id}/cancel", response_model=Appointment)
+@app.post("/api/appointments/{master_id}/{appointment_id}/cancel", response_model=Appointment, dependencies=[Depends(admit("default"))])
 async def cancel_appointment(
     master_id: str, 
     appointment_id: str,
+    salon_id: int = Depends(current_salon),
     db: Session = Depends(get_db)
 ):
     # Проверка существования мастера
-    master = db.query(MasterDB).filter(MasterDB.id == int(master_id)).first()
+    master = get_salon_master(db, salon_id, master_id)
     if not master:
         raise HTTPException(status_code=404, detail="Master not found")
     
     # Поиск записи
-    apt = db.query(AppointmentDB).filter(
-        AppointmentDB.id == int(appointment_id),
-        AppointmentDB.master_id == int(master_id)
-    ).first()
+    apt = find_appointment(db, int(master_id), appointment_id)
     
     if not apt:
         raise HTTPException(status_code=404, detail="Appointment not found")
     
+    if apt.status == "completed":
+        check_day_open(db, salon_id, apt.date)
+
     # Обновление статуса
+    old_income = income_snapshot(apt)
+    old_client = client_snapshot(apt)
     apt.status = "cancelled"  # type: ignore
+    apply_income_change(db, old_income, income_snapshot(apt))
+    apply_client_change(db, old_client, client_snapshot(apt))
     
     db.commit()
     db.refresh(apt)
+    bus.publish(f"day:{apt.date}", f"master:{master_id}")
     notify_appointment_cancelled(apt, master)
     
     # Возврат в формате API
@@ -385,62 +687,176 @@ async def cancel_appointment(
         "payment": {"cash": apt.cash_payment, "card": apt.card_payment} if apt.status == "completed" else None  # type: ignore
     }
 
-@app.delete("/api/appointments/{master_id}/{appointment_id}")
+@app.delete("/api/appointments/{master_id}/{appointment_id}", dependencies=[Depends(admit("default"))])
 async def delete_appointment(
     master_id: str, 
     appointment_id: str,
+    salon_id: int = Depends(current_salon),
     db: Session = Depends(get_db)
 ):
     # Проверка существования мастера
-    master = db.query(MasterDB).filter(MasterDB.id == int(master_id)).first()
+    master = get_salon_master(db, salon_id, master_id)
     if not master:
         raise HTTPException(status_code=404, detail="Master not found")
     
-    # Поиск и удаление записи
+    # Вхождение повторяющейся записи без своей строки: дата исключается из серии
+    if recurrence.parse_virtual_id(appointment_id):
+        if not recurrence.exclude(db, appointment_id, int(master_id)):
+            raise HTTPException(status_code=404, detail="Appointment not found")
+        db.commit()
+        bus.publish(f"day:{recurrence.parse_virtual_id(appointment_id)[1]}", f"master:{master_id}")
+        return {"message": "Appointment deleted"}
+
+    # Поиск и удаление записи; строка блокируется до коммита, как в find_appointment
     apt = db.query(AppointmentDB).filter(
         AppointmentDB.id == int(appointment_id),
         AppointmentDB.master_id == int(master_id)
-    ).first()
+    ).with_for_update().populate_existing().first()
     
     if not apt:
         raise HTTPException(status_code=404, detail="Appointment not found")
-    
+    if apt.status == "completed":
+        check_day_open(db, salon_id, apt.date)
+    
+    apply_income_change(db, income_snapshot(apt), None)
+    apply_client_change(db, client_snapshot(apt), None)
+    # Созданное вхождение серии: без исключения дата снова развернулась бы как scheduled
+    if apt.series_id is not None and apt.occurrence_date:
+        series = db.query(AppointmentSeriesDB).filter(
+            AppointmentSeriesDB.id == apt.series_id
+        ).with_for_update().first()
+        if series is not None:
+            recurrence.exclude_occurrence(series, apt.occurrence_date)
     db.delete(apt)
     db.commit()
+    bus.publish(f"day:{apt.date}", f"master:{master_id}")
     
     return {"message": "Appointment deleted"}
 
-@app.get("/api/stats", response_model=Stats)
-async def get_stats(db: Session = Depends(get_db)):
-    # Подсчет общего количества записей
-    total_appointments = db.query(AppointmentDB).count()
-    
-    # Подсчет завершенных записей
-    completed_appointments = db.query(AppointmentDB).filter(
-        AppointmentDB.status == "completed"
-    ).count()
-    from sqlalchemy import func
-    # Подсчет общей выручки
-    total_revenue = db.query(
-        func.sum(AppointmentDB.cash_payment + AppointmentDB.card_payment)
-    ).filter(AppointmentDB.status == "completed").scalar() or 0.0
-    
+@app.get("/api/series", response_model=List[Series], dependencies=[Depends(admit("default"))])
+async def get_series(
+    master_id: Optional[str] = Query(None, description="ID мастера (опционально)"),
+    salon_id: int = Depends(current_salon),
+    db: Session = Depends(get_read_db)
+):
+    """Повторяющиеся записи салона (правила серий)"""
+    query = db.query(AppointmentSeriesDB).filter(AppointmentSeriesDB.salon_id == salon_id)
+    master_id_int = parse_master_id(master_id)
+    if master_id_int is not None:
+        query = query.filter(AppointmentSeriesDB.master_id == master_id_int)
+    return [recurrence.series_to_api(series) for series in query.order_by(AppointmentSeriesDB.id).all()]
+
+
+@app.post("/api/series/{master_id}", response_model=Series, status_code=201, dependencies=[Depends(admit("default"))])
+async def create_series(
+    master_id: str,
+    series: SeriesCreate,
+    salon_id: int = Depends(current_salon),
+    db: Session = Depends(get_db)
+):
+    """Повторяющаяся запись ("каждый второй вторник в 11:00"): хранится одним правилом,
+    вхождения разворачиваются при чтении"""
+    master = get_salon_master(db, salon_id, master_id)
+    if not master:
+        raise HTTPException(status_code=404, detail="Master not found")
+    validate_dates(series.startDate, series.until)
+    if series.until and series.until < series.startDate:
+        raise HTTPException(status_code=400, detail="until must not be before startDate")
+
+    new_series = AppointmentSeriesDB(
+        salon_id=salon_id,
+        master_id=int(master_id),
+        client_name=series.clientName,
+        client_id=get_or_create_client(db, salon_id, series.clientName),
+        comment=series.comment,
+        time=series.time,
+        duration=series.duration,
+        freq=series.freq,
+        interval=series.interval,
+        start_date=series.startDate,
+        until=series.until
+    )
+    db.add(new_series)
+    db.commit()
+    db.refresh(new_series)
+    bus.publish("series", f"master:{master_id}")
+
+    return recurrence.series_to_api(new_series)
+
+
+@app.delete("/api/series/{master_id}/{series_id}", dependencies=[Depends(admit("default"))])
+async def end_series(
+    master_id: str,
+    series_id: str,
+    salon_id: int = Depends(current_salon),
+    db: Session = Depends(get_db)
+):
+    """Завершение серии: с сегодняшнего дня вхождения больше не разворачиваются.
+    Прошедшие вхождения и уже созданные строки записей остаются"""
+    series = db.query(AppointmentSeriesDB).filter(
+        AppointmentSeriesDB.salon_id == salon_id,
+        AppointmentSeriesDB.id == int(series_id),
+        AppointmentSeriesDB.master_id == int(master_id)
+    ).first()
+    if not series:
+        raise HTTPException(status_code=404, detail="Series not found")
+
+    yesterday = (datetime.now().date() - timedelta(days=1)).isoformat()
+    if not series.until or series.until > yesterday:
+        series.until = yesterday
+    db.commit()
+    bus.publish("series", f"master:{master_id}")
+
+    return {"message": "Series ended"}
+
+
+def count_appointments(db: Session, salon_id: int, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                       master_id: Optional[int] = None) -> Tuple[int, int, float]:
+    """(записей, проведено, выручка) салона за диапазон дат, включая архив (backend/archive.py):
+    по одному агрегату на таблицу, на PostgreSQL — только по секциям этих месяцев"""
+    queries = []
+    for table in (AppointmentDB, AppointmentArchiveDB):
+        completed = table.status == "completed"
+        query = select(
+            func.count(table.id),
+            func.sum(case((completed, 1), else_=0)),
+            func.sum(case((completed, func.coalesce(table.cash_payment, 0) + func.coalesce(table.card_payment, 0)), else_=0))
+        ).where(table.salon_id == salon_id)
+        if start_date is not None:
+            query = query.where(table.date >= start_date, table.date <= end_date)
+        if master_id is not None:
+            query = query.where(table.master_id == master_id)
+        queries.append(query)
+
+    rows = db.execute(union_all(*queries)).all()
+    return (
+        sum(count or 0 for count, _, _ in rows),
+        sum(completed or 0 for _, completed, _ in rows),
+        float(sum(revenue or 0.0 for _, _, revenue in rows))
+    )
+
+
+def load_stats(db: Session, salon_id: int) -> dict:
+    total_appointments, completed_appointments, total_revenue = count_appointments(db, salon_id)
     return {
         "totalAppointments": total_appointments,
         "completedAppointments": completed_appointments,
-        "totalRevenue": float(total_revenue)
+        "totalRevenue": total_revenue
     }
 
 
-@app.get("/api/stats/range", response_model=Stats)
-async def get_stats_range(
-    start_date: str = Query(..., description="Начальная дата в формате YYYY-MM-DD"),
-    end_date: str = Query(..., description="Конечная дата в формате YYYY-MM-DD"),
-    master_id: Optional[str] = Query(None, description="ID мастера (опционально)"),
-    db: Session = Depends(get_db)
-):
-    from sqlalchemy import func
+@app.get("/api/stats", response_model=Stats, dependencies=[Depends(admit("heavy"))])
+async def get_stats(salon_id: int = Depends(current_salon), db: Session = Depends(get_read_db)):
+    return load_stats(db, salon_id)
+
 
+def load_stats_range(
+    db: Session,
+    salon_id: int,
+    start_date: str,
+    end_date: str,
+    master_id: Optional[str] = None
+) -> dict:
     master_id_int: Optional[int] = None
     if master_id is not None:
         try:
@@ -448,26 +864,10 @@ async def get_stats_range(
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid master_id")
 
-    base_filter = [AppointmentDB.date >= start_date, AppointmentDB.date <= end_date]
-    if master_id_int is not None:
-        base_filter.append(AppointmentDB.master_id == master_id_int)
-
-    # Подсчет записей в диапазоне дат
-    total_appointments = db.query(AppointmentDB).filter(*base_filter).count()
-
-    # Подсчет завершенных записей в диапазоне дат
-    completed_appointments = db.query(AppointmentDB).filter(
-        *base_filter,
-        AppointmentDB.status == "completed"
-    ).count()
-
-    # Подсчет общей выручки в диапазоне дат
-    total_revenue = (
-        db.query(func.sum(AppointmentDB.cash_payment + AppointmentDB.card_payment))
-        .filter(*base_filter, AppointmentDB.status == "completed")
-        .scalar()
-        or 0.0
+    total_appointments, completed_appointments, total_revenue = count_appointments(
+        db, salon_id, start_date, end_date, master_id_int
     )
+    total_appointments += len(recurrence.expand(db, salon_id, start_date, end_date, master_id_int))
 
     return {
         "totalAppointments": total_appointments,
@@ -476,6 +876,401 @@ async def get_stats_range(
     }
 
 
+@app.get("/api/stats/range", response_model=Stats, dependencies=[Depends(admit("heavy"))])
+async def get_stats_range(
+    start_date: str = Query(..., description="Начальная дата в формате YYYY-MM-DD"),
+    end_date: str = Query(..., description="Конечная дата в формате YYYY-MM-DD"),
+    master_id: Optional[str] = Query(None, description="ID мастера (опционально)"),
+    salon_id: int = Depends(current_salon),
+    db: Session = Depends(get_read_db)
+):
+    return load_stats_range(db, salon_id, start_date, end_date, master_id)
+
+
+@app.get("/api/clients/autocomplete", response_model=List[Client], dependencies=[Depends(admit("light"))])
+async def autocomplete_clients(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50),
+    salon_id: int = Depends(current_salon),
+    db: Session = Depends(get_read_db)
+):
+    """Подсказки клиентов салона по началу имени или фамилии для диалога записи"""
+    return client_index.search(db, salon_id, q, limit)
+
+
+@app.get("/api/clients/{client_id}/history", dependencies=[Depends(admit("default"))])
+async def get_client_history(
+    client_id: str,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    salon_id: int = Depends(current_salon),
+    db: Session = Depends(get_read_db)
+):
+    """Визиты клиента (от новых к старым) и итоги: LTV, отмены, любимый мастер"""
+    try:
+        history = client_history(db, salon_id, int(client_id), limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid client_id or cursor")
+    if history is None:
+        raise HTTPException(status_code=404, detail="Client not found")
+    return history
+
+
+@app.post("/api/admin/import", dependencies=[Depends(admit("heavy"))])
+async def import_appointments(
+    request: Request,
+    format: Literal["csv", "xlsx"] = "csv",
+    dry_run: bool = Query(False, alias="dryRun"),
+    alias: List[str] = Query([]),
+    auth_data: dict = Depends(verify_token),
+    db: Session = Depends(get_db)
+):
+    """Импорт исторических записей в салон администратора: тело запроса — файл CSV или XLSX
+    (см. backend/importer.py).
+
+    Уведомления не отправляются, в ответе — отчет с ошибками по строкам и скоростью."""
+    if auth_data["master"].role != "admin":
+        raise HTTPException(status_code=403, detail="Только для администратора")
+    content = await request.body()
+    if not content:
+        raise HTTPException(status_code=400, detail="Empty file")
+    try:
+        aliases = parse_aliases(alias)
+        # Загрузка занимает секунды, event loop не блокируется
+        return await run_in_threadpool(import_file, db, auth_data["salon_id"], content, format, aliases, dry_run)
+    except (ValueError, RuntimeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def salon_to_api(salon: SalonDB) -> dict:
+    return {"id": str(salon.id), "name": salon.name, "adminChatIds": salon.admin_chat_ids}
+
+
+@app.get("/api/salons", response_model=List[Salon], dependencies=[Depends(admit("light"))])
+async def get_salons(db: Session = Depends(get_read_db)):
+    """Список салонов (для выбора салона при регистрации мастера)"""
+    return [salon_to_api(salon) for salon in db.query(SalonDB).order_by(SalonDB.id).all()]
+
+
+@app.post("/api/admin/salons", response_model=Salon, status_code=201, dependencies=[Depends(admit("default"))])
+async def create_salon(
+    salon: SalonCreate,
+    auth_data: dict = Depends(verify_token),
+    db: Session = Depends(get_db)
+):
+    """Новый салон; мастера попадают в него при регистрации с salon_id"""
+    if auth_data["master"].role != "admin":
+        raise HTTPException(status_code=403, detail="Только для администратора")
+    new_salon = SalonDB(name=salon.name, admin_chat_ids=salon.adminChatIds)
+    db.add(new_salon)
+    db.commit()
+    db.refresh(new_salon)
+
+    return salon_to_api(new_salon)
+
+
+@app.get("/api/bot/invite", dependencies=[Depends(admit("light")), Depends(require_bot)])
+async def get_salon_invite(salon_id: int = Depends(current_salon), db: Session = Depends(get_read_db)):
+    """Код приглашения в салон админа бота: мастер, вошедший по нему впервые, попадает в этот салон"""
+    if db.get(SalonDB, salon_id) is None:
+        raise HTTPException(status_code=404, detail="Salon not found")
+    return {"salonId": str(salon_id), "invite": salon_invite_code(salon_id)}
+
+
+@app.post("/api/bot/token", dependencies=[Depends(admit("light")), Depends(require_bot)])
+async def get_bot_token(telegram_id: int = Query(...), db: Session = Depends(get_db)):
+    """Токен мастера по Telegram ID для команд бота от его имени (закрытие дня, ведомость):
+    бот доверенный, пользователя Telegram подтверждает сам Telegram"""
+    master = db.query(MasterDB).filter(MasterDB.telegram_id == telegram_id).first()
+    if master is None:
+        raise HTTPException(status_code=404, detail="Master not found")
+    return {"token": issue_token(master)}
+
+
+def expense_to_api(expense: ExpenseDB) -> dict:
+    return {
+        "id": str(expense.id),
+        "date": expense.date,
+        "category": expense.category,
+        "amount": expense.amount,
+        "comment": expense.comment or "",
+        "masterId": str(expense.master_id) if expense.master_id else None
+    }
+
+
+def parse_master_id(master_id: Optional[str]) -> Optional[int]:
+    if not master_id:
+        return None
+    try:
+        return int(master_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid master_id")
+
+
+def parse_salon_master_id(db: Session, salon_id: int, master_id: Optional[str]) -> Optional[int]:
+    """Как parse_master_id, но мастер должен быть из этого салона"""
+    master_id_int = parse_master_id(master_id)
+    if master_id_int is not None and get_salon_master(db, salon_id, str(master_id_int)) is None:
+        raise HTTPException(status_code=400, detail="Invalid master_id")
+    return master_id_int
+
+
+@app.get("/api/expenses", response_model=List[Expense], dependencies=[Depends(admit("default"))])
+async def get_expenses(
+    start_date: str = Query(..., description="Начальная дата в формате YYYY-MM-DD"),
+    end_date: str = Query(..., description="Конечная дата в формате YYYY-MM-DD"),
+    master_id: Optional[str] = Query(None, description="ID мастера (опционально)"),
+    salon_id: int = Depends(current_salon),
+    db: Session = Depends(get_read_db)
+):
+    query = db.query(ExpenseDB).filter(
+        ExpenseDB.salon_id == salon_id, ExpenseDB.date >= start_date, ExpenseDB.date <= end_date
+    )
+    master_id_int = parse_master_id(master_id)
+    if master_id_int is not None:
+        query = query.filter(ExpenseDB.master_id == master_id_int)
+
+    return [expense_to_api(e) for e in query.order_by(ExpenseDB.date, ExpenseDB.id).all()]
+
+
+@app.post("/api/expenses", response_model=Expense, status_code=201, dependencies=[Depends(admit("default"))])
+async def create_expense(
+    expense: ExpenseCreate,
+    salon_id: int = Depends(current_salon),
+    db: Session = Depends(get_db)
+):
+    validate_dates(expense.date)
+    new_expense = ExpenseDB(
+        salon_id=salon_id,
+        date=expense.date,
+        category=expense.category,
+        amount=expense.amount,
+        comment=expense.comment,
+        master_id=parse_salon_master_id(db, salon_id, expense.masterId)
+    )
+    db.add(new_expense)
+    db.flush()
+    apply_expense_change(db, None, expense_snapshot(new_expense))
+    db.commit()
+    db.refresh(new_expense)
+
+    return expense_to_api(new_expense)
+
+
+@app.put("/api/expenses/{expense_id}", response_model=Expense, dependencies=[Depends(admit("default"))])
+async def update_expense(
+    expense_id: str,
+    expense: ExpenseUpdate,
+    salon_id: int = Depends(current_salon),
+    db: Session = Depends(get_db)
+):
+    db_expense = db.query(ExpenseDB).filter(ExpenseDB.id == int(expense_id), ExpenseDB.salon_id == salon_id).first()
+    if not db_expense:
+        raise HTTPException(status_code=404, detail="Expense not found")
+
+    update_data = expense.model_dump(exclude_unset=True)
+    validate_dates(update_data.get("date"))
+    old_snapshot = expense_snapshot(db_expense)
+    for key in ["date", "category", "amount", "comment"]:
+        if key in update_data:
+            setattr(db_expense, key, update_data[key])
+    if "masterId" in update_data:
+        db_expense.master_id = parse_salon_master_id(db, salon_id, update_data["masterId"])
+    apply_expense_change(db, old_snapshot, expense_snapshot(db_expense))
+
+    db.commit()
+    db.refresh(db_expense)
+
+    return expense_to_api(db_expense)
+
+
+@app.delete("/api/expenses/{expense_id}", dependencies=[Depends(admit("default"))])
+async def delete_expense(
+    expense_id: str,
+    salon_id: int = Depends(current_salon),
+    db: Session = Depends(get_db)
+):
+    db_expense = db.query(ExpenseDB).filter(ExpenseDB.id == int(expense_id), ExpenseDB.salon_id == salon_id).first()
+    if not db_expense:
+        raise HTTPException(status_code=404, detail="Expense not found")
+
+    apply_expense_change(db, expense_snapshot(db_expense), None)
+    db.delete(db_expense)
+    db.commit()
+
+    return {"message": "Expense deleted"}
+
+
+@app.get("/api/pnl", dependencies=[Depends(admit("heavy"))])
+async def get_profit_and_loss(
+    request: Request,
+    start_date: str = Query(..., description="Начальная дата в формате YYYY-MM-DD"),
+    end_date: str = Query(..., description="Конечная дата в формате YYYY-MM-DD"),
+    period: Literal["day", "week", "month"] = Query("month", description="Группировка: day, week или month"),
+    master_id: Optional[str] = Query(None, description="ID мастера (опционально)"),
+    salon_id: int = Depends(current_salon),
+    db: Session = Depends(get_read_db)
+):
+    """Доходы и расходы салона за период: по дням, неделям или месяцам, по мастерам и в целом"""
+    validate_dates(start_date, end_date)
+    master_id_int = parse_master_id(master_id)
+
+    return await singleflight.json_response(
+        salon_key(request, salon_id),
+        lambda: profit_and_loss(db, salon_id, start_date, end_date, period, master_id_int)
+    )
+
+
+@app.get("/api/analytics/utilization", dependencies=[Depends(admit("heavy"))])
+async def get_utilization(
+    request: Request,
+    start_date: str = Query(..., description="Начальная дата в формате YYYY-MM-DD"),
+    end_date: str = Query(..., description="Конечная дата в формате YYYY-MM-DD"),
+    master_id: Optional[str] = Query(None, description="ID мастера (опционально)"),
+    salon_id: int = Depends(current_salon),
+    db: Session = Depends(get_read_db)
+):
+    """Загрузка мастеров салона: занятые и рабочие минуты по дням и часам, доля отмен и неявок"""
+    validate_dates(start_date, end_date)
+    if datetime.strptime(start_date, "%Y-%m-%d") > datetime.strptime(end_date, "%Y-%m-%d"):
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+    master_id_int = parse_master_id(master_id)
+
+    def load():
+        if master_id_int is not None:
+            master_ids = [master_id_int]
+        else:
+            master_ids = [m_id for (m_id,) in db.query(MasterDB.id).filter(MasterDB.salon_id == salon_id).all()]
+        # NumPy импортируется при первом запросе аналитики, а не при старте воркера
+        from analytics import load_columns, compute_utilization
+        columns = load_columns(db, salon_id, start_date, end_date, master_id_int)
+        return compute_utilization(columns, master_ids, start_date, end_date)
+
+    return await singleflight.json_response(salon_key(request, salon_id), load)
+
+
+def find_commission_rule(db: Session, salon_id: int, rule_id: str) -> CommissionRuleDB:
+    rule = db.query(CommissionRuleDB).filter(
+        CommissionRuleDB.id == int(rule_id), CommissionRuleDB.salon_id == salon_id
+    ).first()
+    if not rule:
+        raise HTTPException(status_code=404, detail="Commission rule not found")
+    return rule
+
+
+def check_duplicate_rule(db: Session, master_id: int, service: Optional[str], rule_id: Optional[int] = None):
+    """У мастера одно правило на услугу (и одно по умолчанию)"""
+    query = db.query(CommissionRuleDB).filter(CommissionRuleDB.master_id == master_id)
+    if rule_id is not None:
+        query = query.filter(CommissionRuleDB.id != rule_id)
+    if any((rule.service or "").lower() == (service or "").lower() for rule in query.all()):
+        raise HTTPException(status_code=409, detail="Commission rule for this service already exists")
+
+
+@app.get("/api/payroll/rules", response_model=List[CommissionRule], dependencies=[Depends(admit("default"))])
+async def get_commission_rules(
+    master_id: Optional[str] = Query(None, description="ID мастера (опционально)"),
+    auth_data: dict = Depends(require_admin),
+    db: Session = Depends(get_read_db)
+):
+    """Правила комиссии салона администратора"""
+    salon_id = auth_data["salon_id"]
+    query = db.query(CommissionRuleDB).filter(CommissionRuleDB.salon_id == salon_id)
+    master_id_int = parse_master_id(master_id)
+    if master_id_int is not None:
+        query = query.filter(CommissionRuleDB.master_id == master_id_int)
+
+    return [rule_to_api(rule) for rule in query.order_by(CommissionRuleDB.master_id, CommissionRuleDB.id).all()]
+
+
+@app.post("/api/payroll/rules", response_model=CommissionRule, status_code=201, dependencies=[Depends(admit("default"))])
+async def create_commission_rule(
+    rule: CommissionRuleCreate,
+    auth_data: dict = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    salon_id = auth_data["salon_id"]
+    master_id = parse_salon_master_id(db, salon_id, rule.masterId)
+    if master_id is None:
+        raise HTTPException(status_code=400, detail="Invalid master_id")
+    service = (rule.service or "").strip() or None
+    check_duplicate_rule(db, master_id, service)
+
+    new_rule = CommissionRuleDB(
+        salon_id=salon_id,
+        master_id=master_id,
+        service=service,
+        percent=rule.percent,
+        card_fee_percent=rule.cardFeePercent
+    )
+    db.add(new_rule)
+    db.commit()
+    db.refresh(new_rule)
+    bus.publish(RULES_TAG)
+
+    return rule_to_api(new_rule)
+
+
+@app.put("/api/payroll/rules/{rule_id}", response_model=CommissionRule, dependencies=[Depends(admit("default"))])
+async def update_commission_rule(
+    rule_id: str,
+    rule: CommissionRuleUpdate,
+    auth_data: dict = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    db_rule = find_commission_rule(db, auth_data["salon_id"], rule_id)
+    update_data = rule.model_dump(exclude_unset=True)
+    if "service" in update_data:
+        service = (update_data["service"] or "").strip() or None
+        check_duplicate_rule(db, db_rule.master_id, service, db_rule.id)
+        db_rule.service = service
+    if update_data.get("percent") is not None:
+        db_rule.percent = update_data["percent"]
+    if update_data.get("cardFeePercent") is not None:
+        db_rule.card_fee_percent = update_data["cardFeePercent"]
+
+    db.commit()
+    db.refresh(db_rule)
+    bus.publish(RULES_TAG)
+
+    return rule_to_api(db_rule)
+
+
+@app.delete("/api/payroll/rules/{rule_id}", dependencies=[Depends(admit("default"))])
+async def delete_commission_rule(
+    rule_id: str,
+    auth_data: dict = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    db.delete(find_commission_rule(db, auth_data["salon_id"], rule_id))
+    db.commit()
+    bus.publish(RULES_TAG)
+
+    return {"message": "Commission rule deleted"}
+
+
+@app.get("/api/payroll", dependencies=[Depends(admit("heavy"))])
+async def get_payroll(
+    request: Request,
+    start_date: str = Query(..., description="Начальная дата в формате YYYY-MM-DD"),
+    end_date: str = Query(..., description="Конечная дата в формате YYYY-MM-DD"),
+    master_id: Optional[str] = Query(None, description="ID мастера (опционально)"),
+    auth_data: dict = Depends(require_admin),
+    db: Session = Depends(get_read_db)
+):
+    """Зарплатная ведомость салона администратора: выручка и начисления мастеров по правилам комиссии (backend/payroll.py)"""
+    salon_id = auth_data["salon_id"]
+    validate_dates(start_date, end_date)
+    if datetime.strptime(start_date, "%Y-%m-%d") > datetime.strptime(end_date, "%Y-%m-%d"):
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+    master_id_int = parse_master_id(master_id)
+
+    def load():
+        return payroll_statement(db, salon_id, start_date, end_date, master_id_int)
+
+    return await singleflight.json_response(salon_key(request, salon_id), load)
+
+
 def convert_color_to_hex(color_name: str, variant: str = 'background') -> str:
     """
     Конвертирует именованный цвет в HEX значение в зависимости от варианта использования
@@ -610,109 +1405,91 @@ def get_master_colors(color_name: str) -> dict:
         'name': color_name  # сохраняем оригинальное имя цвета
     }
 
-def calculate_unique_color_from_id(master_id: int, used_colors: set) -> str:
- 
-    color_map = [
-        "red", "orange", "yellow", "lime", "green", 
-        "emerald", "teal", "cyan", "sky", "blue", 
-        "indigo", "violet", "purple", "fuchsia", "pink",
-        "rose", "slate", "gray", "zinc", "neutral", "stone"
-    ]
-    
-    # Начинаем с вычисления цвета на основе ID
-    id_str = str(master_id)
+MASTER_COLORS = [
+    "red", "orange", "yellow", "lime", "green",
+    "emerald", "teal", "cyan", "sky", "blue",
+    "indigo", "violet", "purple", "fuchsia", "pink",
+    "rose", "slate", "gray", "zinc", "neutral", "stone"
+]
+
+def color_start(seed: int) -> int:
+    """Позиция в палитре, с которой начинается поиск цвета (тот же хеш строки, что и раньше)"""
     hash_value = 0
-    for char in id_str:
+    for char in str(seed):
         hash_value = ((hash_value << 5) - hash_value + ord(char)) & 0xFFFFFFFF
-    
-    start_index = abs(hash_value) % len(color_map)
-    
-    # Ищем первый неиспользованный цвет, начиная с вычисленного индекса
-    for i in range(len(color_map)):
-        color_index = (start_index + i) % len(color_map)
-        candidate_color = color_map[color_index]
-        if candidate_color not in used_colors:
-            return candidate_color
-    
-    # Если все цвета уже используются, возвращаем случайный цвет
-    import random
-    return random.choice(color_map)
+    return hash_value % len(MASTER_COLORS)
 
-def calculate_color_from_id(master_id: int, db: Session) -> str:
-  
-    # Получаем все уже используемые цвета
-    existing_masters = db.query(MasterDB.color).all()
-    used_colors = {master.color for master in existing_masters if master.color}
-    
-    return calculate_unique_color_from_id(master_id, used_colors)
+def salon_color(seed: int, salon_id: int):
+    """SQL-выражение цвета нового мастера: первый цвет палитры начиная с color_start(seed),
+    не занятый мастерами салона, а если заняты все — цвет на этой позиции.
+    Занятые цвета читаются в том же INSERT, а не из памяти процесса"""
+    start = color_start(seed)
+    palette = union_all(*[
+        select(literal(color).label("color"), literal((index - start) % len(MASTER_COLORS)).label("position"))
+        for index, color in enumerate(MASTER_COLORS)
+    ]).subquery("palette")
+    used = select(MasterDB.color).where(MasterDB.salon_id == salon_id)
+    free = select(palette.c.color).where(palette.c.color.not_in(used)).order_by(palette.c.position).limit(1)
+    return func.coalesce(free.scalar_subquery(), MASTER_COLORS[start])
 
 
 
-@app.post("/api/masters/register")
+def issue_token(master: MasterDB) -> str:
+    """Токен мастера на сутки; salon_id определяет салон всех запросов с этим токеном"""
+    payload = {
+        "master_id": master.id,
+        "salon_id": master.salon_id,
+        "telegram_id": master.telegram_id,
+        "exp": datetime.now() + timedelta(hours=24),
+        "iat": datetime.now()
+    }
+    return jwt.encode(payload, JWT_SECRET_KEY, algorithm="HS256")
+
+
+@app.post("/api/masters/register", dependencies=[Depends(admit("light"))])
 async def register_master(
     request: MasterRegisterRequest,
     db: Session = Depends(get_db)
 ):
     telegram_id = request.telegram_id
     name = request.name
-    
-    try:
-        # Проверяем, существует ли уже мастер с таким telegram_id
-        existing_master = db.query(MasterDB).filter(MasterDB.telegram_id == telegram_id).first()
-    except OperationalError as e:
-        raise HTTPException(status_code=503, detail="Database connection error. Please try again.")
-    
-    if existing_master:
-        # Если мастер уже существует, возвращаем его данные
-        payload = {
-            "master_id": existing_master.id,
-            "telegram_id": telegram_id,
-            "exp": datetime.now() + timedelta(hours=24),
-            "iat": datetime.now()
-        }
-        token = jwt.encode(payload, JWT_SECRET_KEY, algorithm="HS256")
-
-        # Возвращаем цвета в HEX формате
-        master_colors = get_master_colors(existing_master.color)
-
-        return {
-            "token": token,
-            "master": {
-                "id": str(existing_master.id),
-                "name": existing_master.name,
-                "color": existing_master.color,
-                "colors": master_colors,  # все HEX варианты цвета
-                "role": existing_master.role
-            }
-        }
- 
-
-    # Если мастер новый, создаем его
-    new_master = MasterDB(
-        name=name,
-        color=calculate_color_from_id(new_master.id, db),  
-        telegram_id=telegram_id,
-        role="master"
+    # Салон нового мастера — только из подписанного приглашения; у существующего мастера салон не меняется
+    salon_id = DEFAULT_SALON_ID
+    if request.invite:
+        salon_id = parse_invite_code(request.invite)
+        if salon_id is None:
+            raise HTTPException(status_code=400, detail="Invalid invite")
+
+    # Один запрос: INSERT ... SELECT FROM salons (нет салона — нет строки) ... ON CONFLICT (telegram_id)
+    # DO UPDATE RETURNING. Существующий мастер возвращается как есть (в своем салоне), одновременные
+    # первые входы не конфликтуют. created_at совпадает с переданным значением только у вставленной
+    # строки: так видно, что мастер создан (на SQLite нет xmax)
+    created_at = datetime.utcnow()
+    stmt = dialect_insert(db, MasterDB).from_select(
+        ["salon_id", "name", "color", "telegram_id", "role", "created_at"],
+        select(
+            SalonDB.id, literal(name), salon_color(telegram_id, salon_id), literal(telegram_id),
+            literal("master"), literal(created_at, DateTime)
+        ).where(SalonDB.id == salon_id)
     )
-    
-    new_master.color = calculate_color_from_id(new_master.id, db)
-
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[MasterDB.telegram_id],
+        set_={"telegram_id": stmt.excluded.telegram_id}
+    ).returning(MasterDB)
     try:
-        db.add(new_master)
+        new_master = db.scalars(stmt, execution_options={"populate_existing": True}).first()
         db.commit()
-        db.refresh(new_master)
     except OperationalError as e:
         db.rollback()
         raise HTTPException(status_code=503, detail="Database connection error. Please try again.")
-    
-    # Генерируем токен
-    payload = {
-        "master_id": new_master.id,
-        "telegram_id": telegram_id,
-        "exp": datetime.now() + timedelta(hours=24),
-        "iat": datetime.now()
-    }
-    token = jwt.encode(payload, JWT_SECRET_KEY, algorithm="HS256")
+    if new_master is None:
+        raise HTTPException(status_code=404, detail="Salon not found")
+
+    # Повторный вход ничего не меняет: кэши и списки мастеров в других воркерах не сбрасываются
+    if new_master.created_at == created_at:
+        bus.publish("masters", f"master:{new_master.id}")
+
+    token = issue_token(new_master)
     
     master_colors = get_master_colors(new_master.color)
     return {
@@ -722,19 +1499,16 @@ async def register_master(
             "name": new_master.name,
             "color": new_master.color,
             "colors": master_colors, 
-            "role": new_master.role
+            "role": new_master.role,
+            "salonId": str(new_master.salon_id)
         }
     }
 
 
-@app.get("/api/master/profile")
-async def get_master_profile(
-    auth_data: dict = Depends(verify_token),
-    db: Session = Depends(get_db)
-):
-    master_id = auth_data.get("master_id")
-    if not master_id:
-        raise HTTPException(status_code=401, detail="Мастер не найден в токене")
+def load_master_profile(db: Session, master_id: int) -> dict:
+    cached = cache.get(f"profile:{master_id}")
+    if cached is not None:
+        return cached
 
     master = db.query(MasterDB).filter(MasterDB.id == master_id).first()
     if not master:
@@ -742,16 +1516,129 @@ async def get_master_profile(
 
     master_colors = get_master_colors(master.color)
 
-    return {
+    result = {
         "id": str(master.id),
         "name": master.name,
         "color": master.color,
         "colors": master_colors,
         "role": master.role,
-        "avatar": master.avatar
+        "avatar": master.avatar,
+        "salonId": str(master.salon_id)
     }
+    cache.set(f"profile:{master_id}", result, tags=[f"master:{master_id}"], settle_seconds=replica_lag(db))
+    return result
+
 
-@app.post("/api/master/avatar")
+@app.get("/api/master/profile", dependencies=[Depends(admit("light"))])
+async def get_master_profile(
+    request: Request,
+    authorization: Optional[str] = Header(None)
+):
+    # Подпись токена проверяется без базы: при недоступной базе профиль отдается из копии
+    master_id = token_claims(authorization).get("master_id")
+    if not master_id:
+        raise HTTPException(status_code=401, detail="Мастер не найден в токене")
+
+    profile, age = await stale_store.serve(
+        f"profile:{master_id}", read_session_factory(request), lambda db: load_master_profile(db, master_id)
+    )
+    return profile if age is None else mark_stale(JSONResponse(profile), age)
+
+# Сколько соединений параллельно обслуживают один пакетный запрос
+BATCH_CONCURRENCY = 4
+
+
+def run_batch_item(db: Session, item: BatchReadItem, salon_id: int, master_id: Optional[int]) -> dict:
+    """Один подзапрос /api/batch-read; ошибки возвращаются в результате, а не всем пакетом"""
+    params = item.params
+    try:
+        if item.type == "masters":
+            data = load_masters(db, salon_id)
+        elif item.type == "profile":
+            if master_id is None:
+                raise HTTPException(status_code=401, detail="Invalid token")
+            data = load_master_profile(db, master_id)
+        elif item.type == "appointments":
+            validate_dates(params.get("date"))
+            data = load_day_appointments(db, salon_id, params.get("date"), params.get("master_id"))
+        elif item.type == "range":
+            if not params.get("start_date") or not params.get("end_date"):
+                raise HTTPException(status_code=400, detail="start_date and end_date are required")
+            validate_dates(params["start_date"], params["end_date"])
+            data = load_appointments_range(
+                db, salon_id, params["start_date"], params["end_date"], params.get("master_id")
+            )
+        elif params.get("start_date") or params.get("end_date"):
+            if not params.get("start_date") or not params.get("end_date"):
+                raise HTTPException(status_code=400, detail="start_date and end_date are required")
+            validate_dates(params["start_date"], params["end_date"])
+            data = load_stats_range(db, salon_id, params["start_date"], params["end_date"], params.get("master_id"))
+        else:
+            data = load_stats(db, salon_id)
+
+        fields = parse_fields(params.get("fields")) if item.type in ("appointments", "range") else None
+        if fields:
+            data = select_fields(data, fields)
+    except HTTPException as e:
+        return {"status": e.status_code, "error": e.detail}
+    except ValueError:
+        return {"status": 400, "error": "Invalid parameters"}
+    return {"status": 200, "data": data}
+
+
+@app.post("/api/batch-read", dependencies=[Depends(admit("heavy"))])
+async def batch_read(
+    batch: BatchReadRequest,
+    request: Request,
+    authorization: Optional[str] = Header(None),
+    salon_id: int = Depends(current_salon)
+):
+    """Несколько чтений одним запросом (мастера, профиль, записи, статистика) — при открытии приложения.
+
+    Токен проверяется один раз для всех подзапросов, все они читают данные салона из токена. Подзапросы выполняются параллельно
+    в нескольких соединениях с общим снимком базы (на PostgreSQL), поэтому результаты согласованы.
+    Ответ: {"results": {id: {"status": 200, "data": ...} или {"status": 4xx, "error": ...}}};
+    если база недоступна — последние удачные ответы с "stale": true и "age" (секунды)"""
+    ids = [item.id for item in batch.requests]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Duplicate request ids")
+    master_id = token_claims(authorization).get("master_id")
+
+    def run_group(db: Session, items: List[BatchReadItem]) -> list:
+        return [(item.id, run_batch_item(db, item, salon_id, master_id)) for item in items]
+
+    def item_key(item: BatchReadItem) -> str:
+        params = "&".join(f"{k}={v}" for k, v in sorted(item.params.items()))
+        return f"batch:{salon_id}:{master_id if item.type == 'profile' else ''}:{item.type}?{params}"
+
+    factory = read_session_factory(request)
+    count = min(len(batch.requests), BATCH_CONCURRENCY)
+    age = None
+    try:
+        with snapshot_sessions(factory, count) as sessions:
+            groups = [batch.requests[i::len(sessions)] for i in range(len(sessions))]
+            done = await asyncio.gather(*(run_in_threadpool(run_group, db, items) for db, items in zip(sessions, groups)))
+        results = dict(result for group in done for result in group)
+        for item in batch.requests:
+            if results[item.id]["status"] == 200:
+                stale_store.put(item_key(item), results[item.id])
+    except DATABASE_ERRORS:
+        # База недоступна: подзапросы отдаются из последних удачных ответов с пометкой stale
+        results = {}
+        for item in batch.requests:
+            copy = stale_store.get(item_key(item))
+            if copy is None:
+                results[item.id] = {"status": 503, "error": "Database connection error. Please try again."}
+            else:
+                results[item.id] = {**copy[0], "stale": True, "age": int(copy[1])}
+                age = max(age or 0, copy[1])
+
+    body = json.dumps({"results": {item_id: results[item_id] for item_id in ids}}, ensure_ascii=False).encode("utf-8")
+    body, encoding = compress(body, accepted_encoding(request))
+    return mark_stale(encoded_response(body, "application/json", encoding), age)
+
+
+@app.post("/api/master/avatar", dependencies=[Depends(admit("default"))])
 async def update_master_avatar(
     request: dict,
     auth_data: dict = Depends(verify_token),
@@ -777,6 +1664,7 @@ async def update_master_avatar(
     except Exception:
         db.rollback()
         raise HTTPException(status_code=500, detail="Ошибка обновления аватара")
+    bus.publish("masters", f"master:{master_id}")
 
     master_colors = get_master_colors(master.color)
 
@@ -791,7 +1679,7 @@ async def update_master_avatar(
 
 
 
-@app.post("/api/update-name")
+@app.post("/api/update-name", dependencies=[Depends(admit("default"))])
 async def update_master_name(
     request: dict,
     auth_data: dict = Depends(verify_token),
@@ -821,6 +1709,7 @@ async def update_master_name(
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail="Ошибка обновления имени")
+    bus.publish("masters", f"master:{master_id}")
     
     # Возвращаем обновленные данные мастера с цветами
     master_colors = get_master_colors(master.color)
@@ -834,14 +1723,15 @@ async def update_master_name(
     }
 
 
-@app.get("/api/bot/masters/{master_id}/appointments")
+@app.get("/api/bot/masters/{master_id}/appointments", dependencies=[Depends(admit("default"))])
 async def get_master_appointments_for_bot(
     master_id: str,
     date: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    salon_id: int = Depends(current_salon),
+    db: Session = Depends(get_read_db)
 ):
     """Получение записей мастера для бота с форматированием"""
-    master = db.query(MasterDB).filter(MasterDB.id == int(master_id)).first()
+    master = get_salon_master(db, salon_id, master_id)
     if not master:
         raise HTTPException(status_code=404, detail="Master not found")
     
@@ -855,87 +1745,116 @@ async def get_master_appointments_for_bot(
         query = query.filter(AppointmentDB.date >= today)
     
     appointments = query.order_by(AppointmentDB.date, AppointmentDB.time).all()
-    
+    result = [
+        {
+            "id": str(apt.id),
+            "date": apt.date,
+            "time": apt.time,
+            "duration": apt.duration,
+            "clientName": apt.client_name,
+            "comment": apt.comment or "",
+            "status": apt.status,
+            "payment": {
+                "cash": apt.cash_payment,
+                "card": apt.card_payment
+            } if apt.status == "completed" else None
+        }
+        for apt in appointments
+    ]
+    start_date, end_date = (date, date) if date else horizon()
+    result.extend(recurrence.expand(db, salon_id, start_date, end_date, int(master_id)))
+    result.sort(key=lambda apt: (apt["date"], apt["time"]))
+
     return {
         "master": {
             "id": str(master.id),
             "name": master.name,
             "color": master.color
         },
-        "appointments": [
-            {
-                "id": str(apt.id),
-                "date": apt.date,
-                "time": apt.time,
-                "duration": apt.duration,
-                "clientName": apt.client_name,
-                "comment": apt.comment or "",
-                "status": apt.status,
-                "payment": {
-                    "cash": apt.cash_payment,
-                    "card": apt.card_payment
-                } if apt.status == "completed" else None
-            }
-            for apt in appointments
-        ]
+        "appointments": result
     }
 
 
 
-@app.get("/api/bot/cash-register")
+@app.get("/api/bot/cash-register", dependencies=[Depends(admit("heavy"))])
 async def get_cash_register(
     date: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    salon_id: int = Depends(current_salon),
+    db: Session = Depends(get_read_db)
 ):
-    """Получение данных кассы для бота"""
-    from sqlalchemy import func
+    """Получение данных кассы салона для бота: закрытый день — из снимка закрытия, иначе по записям"""
     from datetime import date as dt_date
     
     # Если дата не указана, берем сегодня
     if not date:
         date = dt_date.today().strftime("%Y-%m-%d")
-    
-    # Получаем завершенные записи за указанную дату
-    query = db.query(AppointmentDB).filter(
-        AppointmentDB.date == date,
-        AppointmentDB.status == "completed"
-    )
-    
-    appointments = query.all()
-    
-    total_cash = sum(apt.cash_payment for apt in appointments)
-    total_card = sum(apt.card_payment for apt in appointments)
-    total = total_cash + total_card
-    
-    # Группировка по мастерам
-    masters_stats = {}
-    for apt in appointments:
-        master_id = str(apt.master_id)
-        if master_id not in masters_stats:
-            masters_stats[master_id] = {
-                "name": apt.master.name,
-                "cash": 0,
-                "card": 0,
-                "total": 0,
-                "count": 0
-            }
-        masters_stats[master_id]["cash"] += apt.cash_payment
-        masters_stats[master_id]["card"] += apt.card_payment
-        masters_stats[master_id]["total"] += apt.cash_payment + apt.card_payment
-        masters_stats[master_id]["count"] += 1
-    
+
+    latest = dayclose.latest_version(db, salon_id, date)
+    if latest is not None and latest.action == "close":
+        return {**dayclose.snapshot_to_api(latest), "closed": True}
+
     return {
-        "date": date,
-        "total": {
-            "cash": total_cash,
-            "card": total_card,
-            "total": total
-        },
-        "masters": masters_stats,
-        "appointments_count": len(appointments)
+        **dayclose.day_totals(db, salon_id, date),
+        "closed": False,
+        "reopened": latest is not None
     }
 
 
+def parse_day(date: str) -> str:
+    try:
+        return datetime.strptime(date, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+
+
+@app.get("/api/day-closes", dependencies=[Depends(admit("default"))])
+async def get_day_closes(
+    start_date: str = Query(..., description="Начальная дата в формате YYYY-MM-DD"),
+    end_date: str = Query(..., description="Конечная дата в формате YYYY-MM-DD"),
+    salon_id: int = Depends(current_salon),
+    db: Session = Depends(get_read_db)
+):
+    """История закрытий и переоткрытий дней салона, все версии по порядку"""
+    rows = dayclose.day_history(db, salon_id, parse_day(start_date), parse_day(end_date))
+    return [dayclose.snapshot_to_api(row) for row in rows]
+
+
+@app.post("/api/day-closes/{date}", status_code=201, dependencies=[Depends(admit("default"))])
+async def close_day(
+    date: str,
+    auth_data: dict = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Закрыть день вручную (или заново после переоткрытия); отчет уходит админам салона.
+    Кто закрыл — администратор из токена"""
+    try:
+        row = dayclose.close_day(db, auth_data["salon_id"], parse_day(date), dayclose.closed_by(auth_data["master"]))
+    except dayclose.DayStateError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    dayclose.notify_day_change(db, row)
+
+    return dayclose.snapshot_to_api(row)
+
+
+@app.post("/api/day-closes/{date}/reopen", status_code=201, dependencies=[Depends(admit("default"))])
+async def reopen_day(
+    date: str,
+    request: DayReopen,
+    auth_data: dict = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Переоткрыть закрытый день для исправлений; снимок закрытия остается в истории"""
+    try:
+        row = dayclose.reopen_day(
+            db, auth_data["salon_id"], parse_day(date), request.reason, dayclose.closed_by(auth_data["master"])
+        )
+    except dayclose.DayStateError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    dayclose.notify_day_change(db, row)
+
+    return dayclose.snapshot_to_api(row)
+
+
 if __name__ == '__main__':
     import uvicorn
     port = int(os.getenv('PORT', 8000))
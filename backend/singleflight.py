@@ -0,0 +1,59 @@
+import asyncio
+import json
+from typing import Any, Callable, Dict
+
+from fastapi import Request, Response
+from fastapi.concurrency import run_in_threadpool
+
+
+class SingleFlight:
+    """Объединение одинаковых одновременных запросов: вычисление выполняется один раз,
+    остальные запросы ждут и получают тот же результат"""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"executed": 0, "coalesced": 0}
+
+    async def run(self, key: str, fn: Callable[[], Any]) -> Any:
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # отменили сам ожидающий запрос
+                # Отменили ведущий запрос (клиент отключился, таймаут) — вычисление повторяется
+                return await self.run(key, fn)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.stats["executed"] += 1
+        try:
+            result = await run_in_threadpool(fn)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # ошибку получают ожидающие, лишнее предупреждение не нужно
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        future.set_result(result)
+        return result
+
+    async def json_response(self, key: str, fn: Callable[[], Any]) -> Response:
+        # Сериализация тоже выполняется один раз, все получают одни и те же байты
+        body = await self.run(key, lambda: json.dumps(fn(), ensure_ascii=False).encode("utf-8"))
+        return Response(content=body, media_type="application/json")
+
+
+def request_key(request: Request, scope: str = "public") -> str:
+    """Ключ запроса: маршрут, параметры и область видимости (для ответов, зависящих от пользователя)"""
+    params = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    return f"{scope}:{request.url.path}?{params}"
+
+
+singleflight = SingleFlight()
@@ -0,0 +1,331 @@
+"""Снимок всей базы и восстановление из него (PostgreSQL).
+
+Запуск:
+  python snapshot.py dump DIR [--jobs 4] [--no-avatars] [--no-aggregates]
+  python snapshot.py restore DIR [--jobs 4] [--clean]
+
+dump: все таблицы из models.py выгружаются двоичным COPY в файлы TABLE[.YYYY-MM].copy.gz
+параллельно в нескольких соединениях с общим снимком базы (pg_export_snapshot), поэтому
+файлы согласованы между собой. appointments и appointments_archive делятся по месяцам.
+--no-avatars не выгружает аватары мастеров, --no-aggregates — monthly_totals и client_totals
+(легкий снимок для разработки). В manifest.json — ревизия Alembic, колонки и число строк.
+
+restore: схема создается заранее (alembic upgrade head) и должна быть той же ревизии; база
+пустая (строки, вставленные миграциями, не в счет — они заменяются снимком) или --clean.
+Вторичные индексы удаляются до загрузки и строятся после нее параллельно; таблицы
+загружаются параллельно по уровням внешних ключей (сначала salons, потом masters и clients...),
+затем сбрасываются последовательности id, пересчитываются пропущенные итоги и выполняется ANALYZE.
+"""
+import argparse
+import gzip
+import json
+import os
+import queue
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Dict, List
+
+from cache import bus
+from clients import rebuild_client_totals
+from database import DEFAULT_SALON_ID, SessionLocal, engine, snapshot_sessions
+from finance import rebuild_monthly_totals
+from models import Base, ClientTotalsDB, MasterDB, MonthlyTotalsDB
+from partitions import MONTHS_AHEAD, ensure_partitions
+
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 1
+DEFAULT_JOBS = 4
+# Быстрое сжатие: двоичный COPY и так компактен, узкое место — CPU
+COMPRESS_LEVEL = 1
+# Таблицы, которые делятся на части по месяцам (по колонке date)
+MONTHLY_TABLES = ("appointments", "appointments_archive")
+# Производные итоги: без них снимок легче, при восстановлении они пересчитываются
+AGGREGATE_TABLES = (MonthlyTotalsDB.__tablename__, ClientTotalsDB.__tablename__)
+MONTH_PATTERN = re.compile(r"^\d{4}-\d{2}$")
+# Строки, которые вставляют миграции (салон по умолчанию из f2b8d4a6c913): база только с ними
+# считается пустой, перед загрузкой они удаляются — в снимке есть свои
+SEED_ROWS = {"salons": f"id = {DEFAULT_SALON_ID}"}
+
+TABLES = {table.name: table for table in Base.metadata.sorted_tables}
+
+
+def require_postgres():
+    if engine.dialect.name != "postgresql":
+        raise RuntimeError("Снимки поддерживаются только для PostgreSQL (SQLite достаточно скопировать файлом)")
+
+
+def next_month(month: str) -> str:
+    year, number = int(month[:4]), int(month[5:7])
+    return f"{year + 1}-01" if number == 12 else f"{year}-{number + 1:02d}"
+
+
+def table_levels(names: List[str]) -> List[List[str]]:
+    """Таблицы по уровням внешних ключей: таблица загружается после всех, на которые ссылается"""
+    levels: Dict[str, int] = {}
+    for name in names:  # sorted_tables уже упорядочены по зависимостям
+        parents = {fk.column.table.name for fk in TABLES[name].foreign_keys} - {name}
+        levels[name] = 1 + max((levels[parent] for parent in parents if parent in levels), default=-1)
+    grouped: List[List[str]] = [[] for _ in range(max(levels.values(), default=-1) + 1)]
+    for name, level in levels.items():
+        grouped[level].append(name)
+    return grouped
+
+
+def month_chunks(cursor, table: str) -> List[dict]:
+    """Части таблицы по месяцам без пропусков плюс часть вне этого диапазона —
+    вместе они покрывают все строки; границы как у месячных секций appointments"""
+    cursor.execute(f"SELECT DISTINCT substr(date, 1, 7) FROM {table}")
+    months = sorted(month for (month,) in cursor.fetchall() if month and MONTH_PATTERN.match(month))
+    if not months:
+        return [{"table": table, "part": None, "where": None}]
+
+    chunks, month = [], months[0]
+    while month <= months[-1]:
+        chunks.append({
+            "table": table, "part": month,
+            "where": f"date >= '{month}-01' AND date < '{next_month(month)}-01'"
+        })
+        month = next_month(month)
+    chunks.append({
+        "table": table, "part": "other",
+        "where": f"date < '{months[0]}-01' OR date >= '{next_month(months[-1])}-01'"
+    })
+    return chunks
+
+
+def chunk_file(chunk: dict) -> str:
+    return f"{chunk['table']}.{chunk['part']}.copy.gz" if chunk["part"] else f"{chunk['table']}.copy.gz"
+
+
+def select_list(table: str, avatars: bool) -> str:
+    columns = []
+    for column in TABLES[table].columns:
+        if not avatars and table == MasterDB.__tablename__ and column.name == "avatar":
+            # Та же колонка того же типа, но пустая: двоичный COPY требует совпадения типов
+            columns.append(f"NULL::{column.type.compile(dialect=engine.dialect)} AS avatar")
+        else:
+            columns.append(column.name)
+    return ", ".join(columns)
+
+
+def dump_worker(db, chunks: "queue.Queue", directory: str, avatars: bool) -> List[dict]:
+    """Выгружает части из общей очереди в транзакции со снимком"""
+    raw = db.connection().connection
+    done = []
+    while True:
+        try:
+            chunk = chunks.get_nowait()
+        except queue.Empty:
+            return done
+        query = f"SELECT {select_list(chunk['table'], avatars)} FROM {chunk['table']}"
+        if chunk["where"]:
+            query += f" WHERE {chunk['where']}"
+        path = os.path.join(directory, chunk_file(chunk))
+        with gzip.open(path, "wb", compresslevel=COMPRESS_LEVEL) as f, raw.cursor() as cursor:
+            cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT binary)", f)
+            rows = cursor.rowcount
+        done.append({"table": chunk["table"], "part": chunk["part"], "file": chunk_file(chunk), "rows": rows})
+
+
+def dump(directory: str, jobs: int = DEFAULT_JOBS, avatars: bool = True, aggregates: bool = True) -> dict:
+    """Снимок базы в каталог; возвращает manifest"""
+    require_postgres()
+    os.makedirs(directory, exist_ok=True)
+    started = time.perf_counter()
+    names = [name for name in TABLES if aggregates or name not in AGGREGATE_TABLES]
+
+    with snapshot_sessions(SessionLocal, jobs) as sessions:
+        raw = sessions[0].connection().connection
+        with raw.cursor() as cursor:
+            cursor.execute("SELECT version_num FROM alembic_version")
+            revision = sorted(row[0] for row in cursor.fetchall())
+            chunks: "queue.Queue" = queue.Queue()
+            for name in names:
+                for chunk in month_chunks(cursor, name) if name in MONTHLY_TABLES else [
+                    {"table": name, "part": None, "where": None}
+                ]:
+                    chunks.put(chunk)
+        with ThreadPoolExecutor(len(sessions)) as pool:
+            futures = [pool.submit(dump_worker, db, chunks, directory, avatars) for db in sessions]
+            files = [item for future in futures for item in future.result()]
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "createdAt": datetime.utcnow().isoformat(timespec="seconds"),
+        "revision": revision,
+        "avatars": avatars,
+        "aggregates": aggregates,
+        "tables": {name: [column.name for column in TABLES[name].columns] for name in names},
+        "files": sorted(files, key=lambda item: (item["table"], item["part"] or "")),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    with open(os.path.join(directory, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def secondary_indexes(cursor, tables: List[str]) -> List[tuple]:
+    """Индексы таблиц, кроме первичных ключей и ограничений unique (они нужны внешним ключам)"""
+    cursor.execute(
+        "SELECT i.indexname, i.indexdef FROM pg_indexes i "
+        "WHERE i.schemaname = current_schema() AND i.tablename = ANY(%s) "
+        "AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conname = i.indexname)",
+        (tables,)
+    )
+    # Индекс секционированной таблицы описан как ON ONLY; создаем сразу для всех секций
+    return [(name, definition.replace(" ON ONLY ", " ON ")) for name, definition in cursor.fetchall()]
+
+
+def run_statement(sql: str):
+    with engine.connect() as conn:
+        conn.exec_driver_sql(sql)
+        conn.commit()
+
+
+def restore_chunk(directory: str, table: str, columns: List[str], file: str) -> int:
+    raw = engine.raw_connection()
+    try:
+        with raw.cursor() as cursor, gzip.open(os.path.join(directory, file), "rb") as f:
+            # Потеря последних транзакций при сбое не страшна: загрузку можно повторить с --clean
+            cursor.execute("SET LOCAL synchronous_commit TO off")
+            cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT binary)", f)
+            rows = cursor.rowcount
+        raw.commit()
+        return rows
+    finally:
+        raw.close()
+
+
+def history_partitions(manifest: dict) -> int:
+    """Месячные секции appointments от первого месяца снимка до MONTHS_AHEAD вперед"""
+    months = [item["part"] for item in manifest["files"]
+              if item["table"] == "appointments" and item["part"] and MONTH_PATTERN.match(item["part"])]
+    if not months:
+        return 0
+    first = date.fromisoformat(f"{min(months)}-01")
+    today = date.today()
+    count = (today.year - first.year) * 12 + today.month - first.month
+    return ensure_partitions(engine, max(count, 0) + MONTHS_AHEAD, today=first)
+
+
+def restore(directory: str, jobs: int = DEFAULT_JOBS, clean: bool = False) -> dict:
+    """Загрузка снимка в базу той же ревизии схемы; возвращает время этапов"""
+    require_postgres()
+    with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT_VERSION:
+        raise RuntimeError(f"Неизвестный формат снимка: {manifest.get('format')}")
+    names = [name for name in TABLES if name in manifest["tables"]]
+    timings, started = {}, time.perf_counter()
+
+    with engine.connect() as conn:
+        revision = sorted(row[0] for row in conn.exec_driver_sql("SELECT version_num FROM alembic_version"))
+        if revision != manifest["revision"]:
+            raise RuntimeError(
+                f"Ревизия базы {', '.join(revision) or 'none'} не совпадает со снимком "
+                f"{', '.join(manifest['revision'])}: выполните 'alembic upgrade' до ревизии снимка"
+            )
+        all_tables = list(TABLES)
+        if clean:
+            conn.exec_driver_sql(f"TRUNCATE {', '.join(all_tables)} RESTART IDENTITY CASCADE")
+        else:
+            for name in all_tables:
+                seed = SEED_ROWS.get(name)
+                where = f" WHERE NOT ({seed})" if seed else ""
+                if conn.exec_driver_sql(f"SELECT 1 FROM {name}{where} LIMIT 1").first() is not None:
+                    raise RuntimeError(f"Таблица {name} не пуста: восстановление только в пустую базу или с --clean")
+            for name, seed in SEED_ROWS.items():
+                conn.exec_driver_sql(f"DELETE FROM {name} WHERE {seed}")
+        with conn.connection.cursor() as cursor:
+            indexes = secondary_indexes(cursor, all_tables)
+        for name, _ in indexes:
+            conn.exec_driver_sql(f"DROP INDEX {name}")
+        conn.commit()
+    history_partitions(manifest)
+    timings["prepare"] = time.perf_counter() - started
+
+    files_by_table: Dict[str, List[dict]] = {}
+    for item in manifest["files"]:
+        files_by_table.setdefault(item["table"], []).append(item)
+    rows = 0
+    with ThreadPoolExecutor(jobs) as pool:
+        try:
+            # Внутри уровня таблицы и месяцы грузятся параллельно, уровни — по очереди (внешние ключи)
+            for level in table_levels(names):
+                futures = [
+                    pool.submit(restore_chunk, directory, item["table"], manifest["tables"][item["table"]], item["file"])
+                    for table in level for item in files_by_table.get(table, [])
+                ]
+                rows += sum(future.result() for future in futures)
+            timings["load"] = time.perf_counter() - started - timings["prepare"]
+        finally:
+            # Индексы возвращаются и при ошибке загрузки
+            mark = time.perf_counter()
+            list(pool.map(run_statement, [definition for _, definition in indexes]))
+            timings["index_build"] = time.perf_counter() - mark
+
+    mark = time.perf_counter()
+    with engine.connect() as conn:
+        for name in names:
+            # Для таблиц без последовательности pg_get_serial_sequence вернет NULL, setval — тоже
+            if "id" in TABLES[name].columns:
+                conn.exec_driver_sql(
+                    f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), COALESCE(MAX(id), 1), MAX(id) IS NOT NULL) "
+                    f"FROM {name}"
+                )
+        conn.commit()
+    if not manifest["aggregates"]:
+        db = SessionLocal()
+        try:
+            rebuild_monthly_totals(db)
+            rebuild_client_totals(db)
+            db.commit()
+        finally:
+            db.close()
+    with engine.connect() as conn:
+        conn.exec_driver_sql(f"ANALYZE {', '.join(all_tables)}")
+        conn.commit()
+    timings["finish"] = time.perf_counter() - mark
+
+    # Кэши, индексы клиентов и поиска, напоминания в работающих воркерах
+    bus.publish("*")
+    return {"rows": rows, "indexes": len(indexes), **{name: round(value, 3) for name, value in timings.items()},
+            "seconds": round(time.perf_counter() - started, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Снимок базы и восстановление (PostgreSQL, двоичный COPY)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    dump_parser = commands.add_parser("dump", help="Снять снимок в каталог")
+    dump_parser.add_argument("directory")
+    dump_parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS, help="Параллельных соединений")
+    dump_parser.add_argument("--no-avatars", action="store_true", help="Без аватаров мастеров")
+    dump_parser.add_argument("--no-aggregates", action="store_true",
+                             help="Без monthly_totals и client_totals (пересчитываются при восстановлении)")
+    restore_parser = commands.add_parser("restore", help="Восстановить базу из каталога")
+    restore_parser.add_argument("directory")
+    restore_parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS, help="Параллельных соединений")
+    restore_parser.add_argument("--clean", action="store_true", help="Очистить таблицы перед загрузкой")
+    args = parser.parse_args()
+    if args.jobs < 1:
+        parser.error("--jobs должен быть не меньше 1")
+
+    try:
+        if args.command == "dump":
+            manifest = dump(args.directory, args.jobs, not args.no_avatars, not args.no_aggregates)
+            print(f"Снимок {args.directory}: {sum(item['rows'] for item in manifest['files'])} строк, "
+                  f"{len(manifest['files'])} файлов, {manifest['seconds']} с")
+        else:
+            if not os.path.isfile(os.path.join(args.directory, MANIFEST)):
+                parser.error(f"В {args.directory} нет {MANIFEST}")
+            report = restore(args.directory, args.jobs, args.clean)
+            print(f"Восстановлено {report['rows']} строк за {report['seconds']} с "
+                  f"(загрузка {report['load']} с, {report['indexes']} индексов за {report['index_build']} с)")
+    except RuntimeError as e:
+        parser.exit(1, f"Ошибка: {e}\n")
+
+
+if __name__ == "__main__":
+    main()
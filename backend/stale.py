@@ -0,0 +1,188 @@
+"""Деградированный режим чтения (stale-while-revalidate).
+
+Последний удачный ответ каждого ключа (мастера, расписание, профиль, пакетное чтение)
+хранится в памяти процесса. Если база недоступна или не ответила за STALE_DEADLINE_SECONDS,
+отдается эта копия с заголовками Age, Warning: 110 и X-Stale: true — расписание остается
+видно во время коротких сбоев. Пока база недоступна, запросы сразу получают копию,
+а фоновая задача раз в STALE_RETRY_SECONDS перечитывает устаревшие ключи;
+первое удачное чтение выводит процесс из деградированного режима.
+
+Загрузчик получает собственную сессию из переданной фабрики: запрос, не дождавшийся
+базы, завершается, а начатое чтение доделывается в потоке и обновляет копию.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, Response
+from sqlalchemy.exc import InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session, sessionmaker
+
+from singleflight import singleflight
+
+logger = logging.getLogger(__name__)
+
+# Сколько ждать базу, если есть копия ответа
+STALE_DEADLINE_SECONDS = float(os.getenv("STALE_DEADLINE_SECONDS", "2"))
+# Копии старше не отдаются: лучше ошибка, чем расписание часовой давности
+STALE_MAX_AGE_SECONDS = float(os.getenv("STALE_MAX_AGE_SECONDS", "3600"))
+STALE_MAX_ENTRIES = int(os.getenv("STALE_MAX_ENTRIES", "2000"))
+# Пауза между попытками перечитать устаревшие ключи
+STALE_RETRY_SECONDS = float(os.getenv("STALE_RETRY_SECONDS", "2"))
+
+# Ошибки недоступности базы: обрыв соединения, отмена по statement_timeout, нет места в пуле
+DATABASE_ERRORS = (OperationalError, InterfaceError, PoolTimeoutError)
+
+Loader = Callable[[Session], Any]
+
+
+class StaleStore:
+    """Последние удачные ответы по ключу и фоновое перечитывание после сбоя"""
+
+    def __init__(self, max_entries: int = STALE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        # Ключи, отданные устаревшими, и чем их перечитать
+        self._pending: Dict[str, Tuple[sessionmaker, Loader]] = {}
+        self._lock = threading.Lock()
+        self._degraded_since: Optional[float] = None
+        self._revalidator: Optional[asyncio.Task] = None
+        self.stats = {"fresh": 0, "stale": 0, "unavailable": 0, "revalidated": 0}
+
+    @property
+    def degraded(self) -> bool:
+        return self._degraded_since is not None
+
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """Копия и ее возраст в секундах; None — копии нет или она слишком старая"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        age = time.monotonic() - entry[0]
+        if age > STALE_MAX_AGE_SECONDS:
+            return None
+        return entry[1], age
+
+    def _fill(self, key: str, factory: sessionmaker, load: Loader) -> Any:
+        db = factory()
+        try:
+            value = load(db)
+        finally:
+            db.close()
+        self.put(key, value)
+        return value
+
+    def _load(self, key: str, factory: sessionmaker, load: Loader) -> asyncio.Future:
+        """Чтение в отдельной задаче: таймаут ожидающего не отменяет его для остальных"""
+        task = asyncio.ensure_future(singleflight.run(key, lambda: self._fill(key, factory, load)))
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def serve(self, key: str, factory: sessionmaker, load: Loader) -> Tuple[Any, Optional[float]]:
+        """Значение и возраст копии в секундах; возраст None — свежие данные из базы"""
+        stale = self.get(key)
+        if stale is not None and self.degraded:
+            return self._stale(key, factory, load, stale)
+
+        task = self._load(key, factory, load)
+        try:
+            if stale is None:
+                value = await task
+            else:
+                value = await asyncio.wait_for(asyncio.shield(task), timeout=STALE_DEADLINE_SECONDS)
+        except asyncio.TimeoutError:
+            # Чтение продолжается в потоке и обновит копию, когда база ответит
+            logger.warning(f"Database slower than {STALE_DEADLINE_SECONDS}s, serving stale {key}")
+            self._enter_degraded()
+            return self._stale(key, factory, load, stale)
+        except DATABASE_ERRORS as e:
+            logger.error(f"Database unavailable for {key}: {e}")
+            self._enter_degraded()
+            if stale is None:
+                self.stats["unavailable"] += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Database connection error. Please try again.",
+                    headers={"Retry-After": str(int(STALE_RETRY_SECONDS) or 1)}
+                )
+            return self._stale(key, factory, load, stale)
+
+        self.stats["fresh"] += 1
+        self._pending.pop(key, None)
+        if self.degraded and not self._pending:
+            self._leave_degraded()
+        return value, None
+
+    def _stale(self, key: str, factory: sessionmaker, load: Loader, stale: Tuple[Any, float]):
+        self.stats["stale"] += 1
+        if key not in self._pending and len(self._pending) < self.max_entries:
+            self._pending[key] = (factory, load)
+        self._start_revalidator()
+        return stale
+
+    def _enter_degraded(self):
+        if self._degraded_since is None:
+            self._degraded_since = time.monotonic()
+            logger.warning("Database unavailable: serving stale responses")
+
+    def _leave_degraded(self):
+        if self._degraded_since is not None:
+            logger.warning(f"Database recovered after {time.monotonic() - self._degraded_since:.1f}s")
+            self._degraded_since = None
+
+    def _start_revalidator(self):
+        if self._revalidator is None or self._revalidator.done():
+            self._revalidator = asyncio.get_running_loop().create_task(self._revalidate())
+
+    async def _revalidate(self):
+        """Перечитывает устаревшие ключи, пока база не ответит на все"""
+        while self._pending:
+            await asyncio.sleep(STALE_RETRY_SECONDS)
+            for key, (factory, load) in list(self._pending.items()):
+                try:
+                    await asyncio.wait_for(
+                        asyncio.shield(self._load(key, factory, load)), timeout=STALE_DEADLINE_SECONDS
+                    )
+                except (asyncio.TimeoutError, *DATABASE_ERRORS):
+                    break  # база еще недоступна — следующая попытка после паузы
+                except Exception as e:
+                    # Ответ перестал загружаться (например, мастера удалили) — копию больше не обновляем
+                    logger.error(f"Stale revalidation error for {key}: {e}")
+                else:
+                    self.stats["revalidated"] += 1
+                self._pending.pop(key, None)
+                self._leave_degraded()
+        if not self._pending:
+            self._leave_degraded()
+
+    def health(self) -> dict:
+        return {
+            **self.stats,
+            "degraded": self.degraded,
+            "entries": len(self._entries),
+            "pending": len(self._pending),
+        }
+
+
+def mark_stale(response: Response, age: Optional[float]) -> Response:
+    """Заголовки устаревшего ответа; age None — ответ свежий, заголовки не меняются"""
+    if age is not None:
+        response.headers["Age"] = str(int(age))
+        response.headers["Warning"] = '110 - "Response is Stale"'
+        response.headers["X-Stale"] = "true"
+    return response
+
+
+stale_store = StaleStore()
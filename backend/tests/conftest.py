@@ -0,0 +1,59 @@
+"""Тесты бэкенда: две локальные SQLite-базы — основная и «реплика» (DATABASE_READ_URL).
+
+Переменные окружения задаются до импорта модулей бэкенда: движки создаются при импорте database.py"""
+import os
+import sys
+import tempfile
+
+_DIR = tempfile.mkdtemp(prefix="want-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_DIR, 'primary.db')}")
+os.environ.setdefault("DATABASE_READ_URL", f"sqlite:///{os.path.join(_DIR, 'replica.db')}")
+os.environ.setdefault("CACHE_BUS", "memory")
+os.environ.setdefault("REMINDERS_ENABLED", "false")
+os.environ.setdefault("DAY_CLOSE_ENABLED", "false")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+from database import SessionLocal, engine, read_engine  # noqa: E402
+from models import Base, SalonDB  # noqa: E402
+
+
+@pytest.fixture
+def databases():
+    """Пустые схемы в обеих базах и салон 1 в каждой; реплика заполняется только явно"""
+    for target in (engine, read_engine):
+        Base.metadata.drop_all(bind=target)
+        Base.metadata.create_all(bind=target)
+        with target.begin() as conn:
+            conn.execute(SalonDB.__table__.insert().values(id=1, name="WANT"))
+    yield
+    for target in (engine, read_engine):
+        Base.metadata.drop_all(bind=target)
+
+
+@pytest.fixture
+def db(databases):
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def api(databases, monkeypatch):
+    """Клиент API без реплики: все чтения идут в основную базу, кэш процесса пуст"""
+    from fastapi.testclient import TestClient
+
+    import server
+    from cache import cache
+    from database import SessionLocal as primary, get_read_db
+
+    cache.clear()
+    monkeypatch.setattr(server, "read_session_factory", lambda request: primary)
+    server.app.dependency_overrides[get_read_db] = server.get_db
+    yield TestClient(server.app)
+    server.app.dependency_overrides.pop(get_read_db, None)
+    cache.clear()
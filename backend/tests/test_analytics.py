@@ -0,0 +1,60 @@
+"""Загрузка мастеров: минуты в пределах рабочего дня, по дням и часам, доли отмен и неявок"""
+import numpy as np
+
+import analytics
+from analytics import compute_utilization
+
+
+def columns(rows):
+    master_ids, dates, times, durations, statuses = zip(*rows)
+    return {
+        "master_id": np.array(master_ids, dtype=np.int64),
+        "date": np.array(dates, dtype="datetime64[D]"),
+        "time": np.array(times, dtype="U5"),
+        "duration": np.array(durations, dtype=np.int64),
+        "status": np.array(statuses, dtype="U16"),
+    }
+
+
+def test_utilization_maths(monkeypatch):
+    monkeypatch.setattr(analytics, "WORK_DAY_START", 9)
+    monkeypatch.setattr(analytics, "WORK_DAY_END", 21)  # 720 рабочих минут в день
+    data = columns([
+        (1, "2026-03-02", "08:30", 60, "completed"),   # до начала дня: в счет 30 минут
+        (1, "2026-03-02", "20:30", 60, "scheduled"),   # после конца дня: 30 минут; день прошел — неявка
+        (1, "2026-03-03", "10:15", 90, "cancelled"),   # отмена не занимает время
+        (1, "2026-03-03", "12:00", 120, "scheduled"),  # сегодня — еще не неявка
+        (99, "2026-03-02", "10:00", 60, "completed"),  # мастер не из списка — не учитывается
+    ])
+    result = compute_utilization(data, [2, 1], "2026-03-02", "2026-03-03", today="2026-03-03")
+
+    anna = result["masters"]["1"]
+    assert {key: anna[key] for key in (
+        "bookedMinutes", "workingMinutes", "utilization", "appointments", "completed", "cancelled", "noShow",
+        "cancellationRate", "noShowRate"
+    )} == {
+        "bookedMinutes": 180, "workingMinutes": 1440, "utilization": 0.125, "appointments": 4, "completed": 1,
+        "cancelled": 1, "noShow": 1, "cancellationRate": 0.25, "noShowRate": 0.25
+    }
+    assert anna["days"] == {
+        "2026-03-02": {"bookedMinutes": 60, "utilization": 0.0833},
+        "2026-03-03": {"bookedMinutes": 120, "utilization": 0.1667},
+    }
+    # Доля часа, занятая в среднем за два дня
+    assert {hour: share for hour, share in anna["hours"].items() if share} == {
+        "09": 0.25, "12": 0.5, "13": 0.5, "20": 0.25
+    }
+    assert list(anna["hours"]) == [f"{hour:02d}" for hour in range(9, 21)]
+
+    vera = result["masters"]["2"]
+    assert (vera["bookedMinutes"], vera["appointments"], vera["days"], vera["cancellationRate"]) == (0, 0, {}, 0.0)
+    assert list(result["masters"]) == ["1", "2"]
+
+
+def test_utilization_endpoint_checks_dates(api):
+    url = "/api/analytics/utilization"
+    assert api.get(url, params={"start_date": "2026-03-xx", "end_date": "2026-03-05"}).status_code == 400
+    reversed_range = api.get(url, params={"start_date": "2026-03-05", "end_date": "2026-03-01"})
+    assert reversed_range.status_code == 400
+    assert reversed_range.json()["detail"] == "start_date must not be after end_date"
+    assert api.get(url, params={"start_date": "2026-03-01", "end_date": "2026-03-05"}).status_code == 200
@@ -0,0 +1,42 @@
+"""Архив: после переноса месяца все отчеты за этот месяц показывают те же числа"""
+from analytics import compute_utilization, load_columns
+from archive import archive_before
+from finance import profit_and_loss, rebuild_monthly_totals
+from models import AppointmentArchiveDB, AppointmentDB, MasterDB
+from server import load_stats, load_stats_range
+
+
+def test_reports_include_archived_month(db):
+    master = MasterDB(name="Анна", color="red", salon_id=1)
+    db.add(master)
+    db.flush()
+    db.add_all([
+        AppointmentDB(salon_id=1, master_id=master.id, client_name="Ольга", date="2020-01-15", time="10:00",
+                      duration=60, status="completed", cash_payment=60.0, card_payment=40.0),
+        AppointmentDB(salon_id=1, master_id=master.id, client_name="Ирина", date="2020-01-16", time="12:00",
+                      duration=30, status="cancelled", cash_payment=0.0, card_payment=0.0),
+    ])
+    db.flush()
+    rebuild_monthly_totals(db)
+    db.commit()
+
+    def reports():
+        stats_range = load_stats_range(db, 1, "2020-01-01", "2020-01-31")
+        day = profit_and_loss(db, 1, "2020-01-01", "2020-01-31", "day")["total"]["income"]
+        week = profit_and_loss(db, 1, "2020-01-01", "2020-01-31", "week")["total"]["income"]
+        month = profit_and_loss(db, 1, "2020-01-01", "2020-01-31", "month")["total"]["income"]
+        columns = load_columns(db, 1, "2020-01-01", "2020-01-31")
+        utilization = compute_utilization(columns, [master.id], "2020-01-01", "2020-01-31")["masters"][str(master.id)]
+        return (
+            stats_range["totalAppointments"], stats_range["completedAppointments"], stats_range["totalRevenue"],
+            load_stats(db, 1)["totalRevenue"], day, week, month,
+            utilization["bookedMinutes"], utilization["appointments"], utilization["cancelled"]
+        )
+
+    before = reports()
+    assert before == (2, 1, 100.0, 100.0, 100.0, 100.0, 100.0, 60, 2, 1)
+
+    assert archive_before(db, "2020-02-01") == {"2020-01": 2}
+    assert db.query(AppointmentDB).count() == 0
+    assert db.query(AppointmentArchiveDB).count() == 2
+    assert reports() == before
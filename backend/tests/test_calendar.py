@@ -0,0 +1,42 @@
+"""Сводка календаря: записи по дням и мастерам, выручка проведенных, вхождения серий"""
+from models import AppointmentDB, AppointmentSeriesDB, MasterDB
+
+ZERO = {"scheduled": 0, "completed": 0, "cancelled": 0, "total": 0, "revenue": 0.0}
+
+
+def test_calendar_summary(api, db):
+    anna, vera = MasterDB(name="Анна", color="red", salon_id=1), MasterDB(name="Вера", color="blue", salon_id=1)
+    db.add_all([anna, vera])
+    db.flush()
+
+    def add(master, date, status, cash=0.0, card=0.0):
+        db.add(AppointmentDB(salon_id=1, master_id=master.id, client_name="Ольга", date=date, time="10:00",
+                             status=status, cash_payment=cash, card_payment=card))
+
+    add(anna, "2026-03-02", "completed", cash=1000.0, card=500.0)
+    add(anna, "2026-03-02", "completed", card=700.0)
+    add(anna, "2026-03-02", "cancelled")
+    add(vera, "2026-03-02", "scheduled")
+    add(vera, "2026-03-03", "completed", cash=300.0)
+    add(vera, "2026-04-01", "scheduled")  # вне диапазона
+    # Серия Веры через день: 3-го и 5-го марта (записи сверх серии считаются отдельно)
+    db.add(AppointmentSeriesDB(salon_id=1, master_id=vera.id, client_name="Ирина", time="12:00",
+                               freq="daily", interval=2, start_date="2026-03-03"))
+    db.commit()
+
+    summary = api.get("/api/calendar/summary", params={"start_date": "2026-03-01", "end_date": "2026-03-05"}).json()
+    assert summary == {
+        "2026-03-02": {
+            str(anna.id): {**ZERO, "completed": 2, "cancelled": 1, "total": 3, "revenue": 2200.0},
+            str(vera.id): {**ZERO, "scheduled": 1, "total": 1},
+        },
+        "2026-03-03": {str(vera.id): {**ZERO, "scheduled": 1, "completed": 1, "total": 2, "revenue": 300.0}},
+        "2026-03-05": {str(vera.id): {**ZERO, "scheduled": 1, "total": 1}},
+    }
+
+    only_anna = api.get("/api/calendar/summary", params={
+        "start_date": "2026-03-01", "end_date": "2026-03-05", "master_id": str(anna.id)
+    }).json()
+    assert list(only_anna) == ["2026-03-02"] and list(only_anna["2026-03-02"]) == [str(anna.id)]
+
+    assert api.get("/api/calendar/summary", params={"start_date": "2026-03", "end_date": "2026-03-05"}).status_code == 400
@@ -0,0 +1,75 @@
+"""Клиенты: индекс других воркеров дополняется без перестройки, история визитов по страницам"""
+import clients
+from clients import client_index, get_or_create_client, rebuild_client_totals
+from models import AppointmentDB, ClientDB, MasterDB
+
+
+def test_new_client_published_with_name(db, monkeypatch):
+    published = []
+    monkeypatch.setattr(clients.bus, "publish", lambda *keys, local=True: published.extend(keys))
+    client_index.reset()
+    client_index.load(db, 1)
+
+    client_id = get_or_create_client(db, 1, "Ольга: Петрова")
+    db.commit()
+    assert published == [f"client:1:{client_id}:Ольга: Петрова"]
+    # Повторное имя — тот же клиент, рассылки нет
+    get_or_create_client(db, 1, "ольга:  петрова")
+    db.commit()
+    assert len(published) == 1
+
+
+def test_remote_client_inserted_into_loaded_index(db):
+    db.add(ClientDB(salon_id=1, name="Ирина", normalized_name="ирина"))
+    db.commit()
+    client_index.reset()
+    assert [item["name"] for item in client_index.search(db, 1, "ир")] == ["Ирина"]
+
+    # Клиента нет в этой базе: найти его можно, только если индекс не перечитывался
+    clients._on_invalidate("client:1:999:Ирма: Смирнова")
+    assert [item["name"] for item in client_index.search(db, 1, "ир")] == ["Ирина", "Ирма: Смирнова"]
+    assert client_index.search(db, 1, "смирн") == [{"id": "999", "name": "Ирма: Смирнова"}]
+    # Индекс другого салона не затронут
+    assert client_index.search(db, 2, "ирм") == []
+    client_index.reset()
+
+
+def test_history_pages_cover_all_visits_once(api, db):
+    anna, vera = MasterDB(name="Анна", color="red", salon_id=1), MasterDB(name="Вера", color="blue", salon_id=1)
+    db.add_all([anna, vera])
+    db.flush()
+    client_id = get_or_create_client(db, 1, "Ольга")
+    rows = [
+        (anna, "2026-03-01", "completed", 1000.0), (anna, "2026-03-05", "completed", 1500.0),
+        (vera, "2026-03-05", "cancelled", 0.0), (vera, "2026-03-05", "completed", 500.0),
+        (anna, "2026-03-09", "scheduled", 0.0),
+    ]
+    for master, day, status, cash in rows:
+        db.add(AppointmentDB(salon_id=1, master_id=master.id, client_id=client_id, client_name="Ольга", date=day,
+                             time="10:00", status=status, cash_payment=cash))
+    db.flush()
+    rebuild_client_totals(db)
+    db.commit()
+    expected = [
+        str(apt.id) for apt in db.query(AppointmentDB).order_by(AppointmentDB.date.desc(), AppointmentDB.id.desc())
+    ]
+
+    pages, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = api.get(f"/api/clients/{client_id}/history", params=params).json()
+        pages.append([visit["id"] for visit in page["visits"]])
+        cursor = page["nextCursor"]
+        if cursor is None:
+            break
+    # Три записи 5-го марта делят дату: порядок и курсор по (дата, id)
+    assert [len(ids) for ids in pages] == [2, 2, 1]
+    assert [visit_id for ids in pages for visit_id in ids] == expected
+
+    totals = page["totals"]
+    assert (totals["appointments"], totals["completed"], totals["cancelled"], totals["totalSpent"]) == (5, 3, 1, 3000.0)
+    assert (totals["averageCheck"], totals["firstVisit"], totals["lastVisit"]) == (1000.0, "2026-03-01", "2026-03-05")
+    assert page["favouriteMaster"] == {"id": str(anna.id), "name": "Анна", "visits": 2}
+
+    assert api.get(f"/api/clients/{client_id}/history", params={"cursor": "bad"}).status_code == 400
+    assert api.get("/api/clients/999/history").status_code == 404
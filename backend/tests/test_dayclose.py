@@ -0,0 +1,23 @@
+"""Закрытие дня: переоткрытие требует причину"""
+from fastapi.testclient import TestClient
+
+import server
+from dayclose import close_day, is_closed
+from models import MasterDB
+
+
+def test_reopen_requires_non_blank_reason(db):
+    admin = MasterDB(name="Анна", color="red", salon_id=1, role="admin")
+    db.add(admin)
+    db.commit()
+    close_day(db, 1, "2026-01-10")
+    db.commit()
+    client = TestClient(server.app)
+    headers = {"Authorization": f"Bearer {server.issue_token(admin)}"}
+
+    assert client.post("/api/day-closes/2026-01-10/reopen", json={"reason": "   "}, headers=headers).status_code == 422
+    assert is_closed(db, 1, "2026-01-10")
+    response = client.post("/api/day-closes/2026-01-10/reopen", json={"reason": " опечатка в оплате "}, headers=headers)
+    assert response.status_code == 201
+    db.expire_all()
+    assert not is_closed(db, 1, "2026-01-10")
@@ -0,0 +1,58 @@
+"""Расходы: CRUD через API, проверка полей и дельты помесячных итогов против полного пересчета"""
+from fastapi.testclient import TestClient
+
+import server
+from finance import rebuild_monthly_totals
+from models import MasterDB, MonthlyTotalsDB
+
+
+def month_expenses(db) -> dict:
+    db.expire_all()
+    return {
+        (row.month, row.master_id): row.expenses
+        for row in db.query(MonthlyTotalsDB) if row.expenses
+    }
+
+
+def test_expense_crud_keeps_totals_in_sync(db):
+    master = MasterDB(name="Анна", color="red", salon_id=1)
+    db.add(master)
+    db.commit()
+    client = TestClient(server.app)
+
+    rent = client.post("/api/expenses", json={"date": "2026-01-10", "category": "Аренда", "amount": 500})
+    assert rent.status_code == 201
+    supplies = client.post("/api/expenses", json={
+        "date": "2026-01-15", "category": "Материалы", "amount": 120, "masterId": str(master.id)
+    })
+    assert supplies.status_code == 201
+    assert client.post("/api/expenses", json={"date": "2026-02-01", "category": "Связь", "amount": 30}).status_code == 201
+
+    # Перенос в другой месяц и смена суммы
+    moved = client.put(f"/api/expenses/{supplies.json()['id']}", json={"date": "2026-02-03", "amount": 150})
+    assert moved.status_code == 200
+    assert (moved.json()["date"], moved.json()["amount"], moved.json()["masterId"]) == ("2026-02-03", 150, str(master.id))
+    assert client.delete(f"/api/expenses/{rent.json()['id']}").status_code == 200
+
+    listed = client.get("/api/expenses", params={"start_date": "2026-01-01", "end_date": "2026-02-28"})
+    assert [item["category"] for item in listed.json()] == ["Связь", "Материалы"]
+
+    deltas = month_expenses(db)
+    assert deltas == {("2026-02", master.id): 150.0, ("2026-02", 0): 30.0}
+    rebuild_monthly_totals(db)
+    db.commit()
+    assert month_expenses(db) == deltas
+
+
+def test_expense_rejects_bad_date_and_nulls(db):
+    client = TestClient(server.app)
+    assert client.post("/api/expenses", json={"date": "garbage", "category": "Аренда", "amount": 1}).status_code == 400
+
+    expense = client.post("/api/expenses", json={"date": "2026-01-10", "category": "Аренда", "amount": 500}).json()
+    url = f"/api/expenses/{expense['id']}"
+    assert client.put(url, json={"date": "garbage"}).status_code == 400
+    assert client.put(url, json={"date": None}).status_code == 422
+    assert client.put(url, json={"amount": None}).status_code == 422
+    # comment и masterId можно очистить
+    assert client.put(url, json={"comment": None, "masterId": None}).status_code == 200
+    assert month_expenses(db) == {("2026-01", 0): 500.0}
@@ -0,0 +1,72 @@
+"""Импорт истории: итоги дельтами, поврежденный XLSX"""
+import pytest
+
+from finance import add_to_month
+from dayclose import close_day
+from importer import import_file
+from models import ClientTotalsDB, MasterDB, MonthlyTotalsDB
+
+CSV = """date;time;master;client;status;cash;card
+2026-01-10;10:00;Анна;Ольга;completed;1000;500
+2026-01-11;11:00;Анна;Ольга;cancelled;;
+2026-02-01;12:00;Анна;Ирина;completed;;2000
+""".encode("utf-8")
+
+
+def test_import_adds_totals_without_rebuild(db):
+    master = MasterDB(name="Анна", color="red", salon_id=1)
+    db.add(master)
+    db.commit()
+    # Дельта, зафиксированная запросом API во время импорта (записи в appointments нет)
+    add_to_month(db, 1, "2026-01", master.id, cash=300.0, count=1)
+    db.commit()
+
+    report = import_file(db, 1, CSV)
+    assert report["imported"] == 3
+
+    january = db.query(MonthlyTotalsDB).filter_by(month="2026-01", master_id=master.id).one()
+    assert (january.income_cash, january.income_card, january.completed_count) == (1300.0, 500.0, 2)
+    february = db.query(MonthlyTotalsDB).filter_by(month="2026-02", master_id=master.id).one()
+    assert (february.income_card, february.completed_count) == (2000.0, 1)
+    totals = sorted(
+        (row.appointments_count, row.completed_count, row.cancelled_count, row.total_spent)
+        for row in db.query(ClientTotalsDB)
+    )
+    assert totals == [(1, 1, 0, 2000.0), (2, 1, 1, 1500.0)]
+
+
+def test_corrupt_xlsx_is_value_error(db):
+    pytest.importorskip("openpyxl")
+    with pytest.raises(ValueError):
+        import_file(db, 1, b"not a zip", "xlsx")
+
+
+def test_xlsx_import(db):
+    openpyxl = pytest.importorskip("openpyxl")
+    import io
+
+    db.add(MasterDB(name="Анна", color="red", salon_id=1))
+    db.commit()
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["Дата", "Время", "Мастер", "Клиент", "Статус", "Наличные"])
+    sheet.append(["10.01.2026", "10:00", "Анна", "Ольга", "проведена", 1000])
+    content = io.BytesIO()
+    workbook.save(content)
+
+    report = import_file(db, 1, content.getvalue(), "xlsx")
+    assert (report["imported"], report["errorCount"]) == (1, 0)
+
+
+def test_completed_rows_of_closed_day_are_reported(db):
+    master = MasterDB(name="Анна", color="red", salon_id=1)
+    db.add(master)
+    db.commit()
+    close_day(db, 1, "2026-01-10")
+    db.commit()
+
+    report = import_file(db, 1, CSV)
+    # Проведенная строка закрытого дня — ошибка, отмененная и строки открытых дней загружены
+    assert report["imported"] == 2
+    assert report["errors"] == [{"row": 2, "error": "день 2026-01-10 закрыт, сначала переоткройте его (/reopen)"}]
+    assert db.query(MonthlyTotalsDB).filter_by(month="2026-01", master_id=master.id).first() is None
@@ -0,0 +1,40 @@
+"""Регистрация мастера: повторный вход не рассылает инвалидацию, цвета подбираются по базе"""
+from fastapi.testclient import TestClient
+
+import server
+
+
+def test_register_publishes_only_on_insert(databases, monkeypatch):
+    published = []
+    monkeypatch.setattr(server.bus, "publish", lambda *keys, local=True: published.extend(keys))
+    client = TestClient(server.app)
+
+    first = client.post("/api/masters/register", json={"telegram_id": 5001, "name": "Анна"})
+    assert first.status_code == 200
+    master_id = first.json()["master"]["id"]
+    assert "masters" in published and f"master:{master_id}" in published
+
+    published.clear()
+    again = client.post("/api/masters/register", json={"telegram_id": 5001, "name": "Анна"})
+    assert again.status_code == 200
+    assert again.json()["master"]["id"] == master_id
+    assert "masters" not in published and f"master:{master_id}" not in published
+
+
+def test_register_picks_free_colors_per_salon(databases):
+    client = TestClient(server.app)
+    colors = [
+        client.post("/api/masters/register", json={"telegram_id": 6000 + n, "name": f"Мастер {n}"}).json()["master"]["color"]
+        for n in range(len(server.MASTER_COLORS))
+    ]
+    # Пока палитра не исчерпана, цвета в салоне не повторяются; занятые читаются из базы
+    assert sorted(colors) == sorted(server.MASTER_COLORS)
+    extra = client.post("/api/masters/register", json={"telegram_id": 7000, "name": "Еще"}).json()["master"]
+    assert extra["color"] == server.MASTER_COLORS[server.color_start(7000)]
+
+
+def test_register_in_missing_salon_is_404(databases, monkeypatch):
+    monkeypatch.setattr(server, "parse_invite_code", lambda code: 42)
+    client = TestClient(server.app)
+    response = client.post("/api/masters/register", json={"telegram_id": 8000, "name": "Анна", "invite": "42-x"})
+    assert response.status_code == 404
@@ -0,0 +1,22 @@
+"""Разбиение длинных уведомлений на сообщения Telegram"""
+from notifications import split_message
+
+
+def test_short_lines_are_packed_up_to_limit():
+    assert split_message("aaa\nbbb\nccc", limit=7) == ["aaa\nbbb", "ccc"]
+
+
+def test_long_line_is_split_not_truncated():
+    line = "слово " * 30
+    parts = split_message(f"заголовок\n{line.strip()}\nконец", limit=40)
+    assert all(len(part) <= 40 for part in parts)
+    assert " ".join(" ".join(parts).split()) == " ".join(f"заголовок {line} конец".split())
+
+
+def test_line_without_spaces_is_cut_at_limit():
+    parts = split_message("x" * 25, limit=10)
+    assert parts == ["x" * 10, "x" * 10, "x" * 5]
+
+
+def test_blank_lines_are_kept_inside_a_part():
+    assert split_message("a\n\nb", limit=100) == ["a\n\nb"]
@@ -0,0 +1,48 @@
+"""Зарплата: выбор правила по услуге, эквайринг из безнала до процента"""
+import numpy as np
+
+from models import CommissionRuleDB
+from payroll import compute_statement, match_rules
+
+
+def columns(rows):
+    master_ids, comments, cash, card = zip(*rows)
+    return {
+        "master_id": np.array(master_ids, dtype=np.int64),
+        "comment": np.char.lower(np.array(comments, dtype=str)),
+        "cash": np.array(cash, dtype=np.float64),
+        "card": np.array(card, dtype=np.float64),
+    }
+
+
+RULES = [
+    CommissionRuleDB(id=1, master_id=1, service=None, percent=40.0, card_fee_percent=2.0),
+    CommissionRuleDB(id=2, master_id=1, service="окраш", percent=45.0, card_fee_percent=10.0),
+    CommissionRuleDB(id=3, master_id=1, service="Окрашивание", percent=50.0, card_fee_percent=0.0),
+]
+DATA = columns([
+    (1, "Окрашивание корней", 1000.0, 0.0),  # длинное ключевое слово раньше короткого, без учета регистра
+    (1, "стрижка", 0.0, 1000.0),             # правило по умолчанию: (1000 - 2%) * 40%
+    (1, "окраш бровей", 0.0, 200.0),         # (200 - 10%) * 45%
+    (2, "стрижка", 300.0, 0.0),              # у мастера нет правил
+    (3, "стрижка", 999.0, 0.0),              # мастер не в ведомости
+])
+
+
+def test_rule_matching_order():
+    assert match_rules(DATA, RULES).tolist() == [2, 0, 1, -1, -1]
+
+
+def test_statement_applies_card_fee_before_percent():
+    statement = compute_statement(DATA, RULES, {1: "Анна", 2: "Вера"})
+    anna, vera = statement["masters"]["1"], statement["masters"]["2"]
+
+    assert (anna["appointments"], anna["unmatched"]) == (3, 0)
+    assert anna["revenue"] == {"cash": 1000.0, "card": 1200.0, "total": 2200.0}
+    assert anna["pay"] == {"cash": 500.0, "card": 473.0, "total": 973.0}
+    assert [(rule["id"], rule["appointments"], rule["revenue"], rule["pay"]) for rule in anna["rules"]] == [
+        ("1", 1, 1000.0, 392.0), ("2", 1, 200.0, 81.0), ("3", 1, 1000.0, 500.0)
+    ]
+
+    assert (vera["appointments"], vera["unmatched"], vera["pay"]["total"], vera["rules"]) == (1, 1, 0.0, [])
+    assert statement["total"] == {"revenue": 2500.0, "pay": 973.0}
@@ -0,0 +1,111 @@
+"""Маршрутизация чтений: реплика по умолчанию, основная база сразу после записи клиента"""
+from starlette.requests import Request
+
+import database
+from cache import LocalCache
+from database import (
+    ReadSessionLocal, SessionLocal, engine, mark_write, note_write, read_engine, read_session_factory, replica_lag
+)
+from models import MasterDB
+
+
+def make_request(token: str = "Bearer token-1", host: str = "10.0.0.1") -> Request:
+    headers = [(b"authorization", token.encode())] if token else []
+    return Request({"type": "http", "headers": headers, "client": (host, 5000)})
+
+
+def test_reads_go_to_replica_by_default(databases):
+    assert read_session_factory(make_request()) is ReadSessionLocal
+
+
+def test_client_reads_primary_after_own_write(databases):
+    request = make_request()
+    mark_write(request)
+    assert read_session_factory(request) is SessionLocal
+    # Другие клиенты по-прежнему читают с реплики
+    assert read_session_factory(make_request("Bearer token-2")) is ReadSessionLocal
+
+
+def test_write_window_expires(databases, monkeypatch):
+    request = make_request("Bearer token-3")
+    mark_write(request)
+    monkeypatch.setattr(database, "READ_AFTER_WRITE_SECONDS", 0.0)
+    assert read_session_factory(request) is ReadSessionLocal
+
+
+def test_write_in_other_worker_routes_to_primary(databases):
+    # Другой воркер записал и разослал ключ клиента через шину (write:{key})
+    request = make_request("Bearer token-4")
+    note_write(database._client_key(request))
+    assert read_session_factory(request) is SessionLocal
+
+
+def test_client_key_does_not_expose_token(databases):
+    assert "token-5" not in database._client_key(make_request("Bearer token-5"))
+
+
+def test_replica_lags_behind_primary(db):
+    db.add(MasterDB(name="Анна", color="red", salon_id=1))
+    db.commit()
+    replica = ReadSessionLocal()
+    try:
+        assert replica.query(MasterDB).count() == 0
+        assert replica_lag(replica) == database.READ_AFTER_WRITE_SECONDS
+    finally:
+        replica.close()
+    assert replica_lag(db) == 0.0
+    assert db.query(MasterDB).count() == 1
+
+
+def test_cache_skips_replica_value_right_after_invalidation():
+    cache = LocalCache()
+    cache.set("masters:1", ["old"], tags=["masters"])
+    cache.invalidate("masters")
+    # Реплика еще может отдавать старый список — в кэш он не попадает
+    assert cache.set("masters:1", ["old"], tags=["masters"], settle_seconds=5.0) is False
+    assert cache.get("masters:1") is None
+    # Чтение с основной базы кэшируется сразу
+    assert cache.set("masters:1", ["new"], tags=["masters"]) is True
+    assert cache.get("masters:1") == ["new"]
+
+
+def test_cache_accepts_replica_value_outside_lag_window():
+    cache = LocalCache()
+    assert cache.set("profile:1", {"id": "1"}, tags=["master:1"], settle_seconds=5.0) is True
+    cache.clear()
+    assert cache.set("profile:1", {"id": "1"}, tags=["master:1"], settle_seconds=5.0) is False
+
+
+def test_separate_engines():
+    assert read_engine is not engine
+
+
+def test_write_request_is_broadcast_to_other_workers(databases, monkeypatch):
+    from fastapi.testclient import TestClient
+    import server
+
+    published = []
+    monkeypatch.setattr(server.bus, "publish", lambda *keys, local=True: published.extend(keys))
+    client = TestClient(server.app)
+    response = client.post("/api/expenses", json={"date": "2026-10-01", "category": "аренда", "amount": 100},
+                           headers={"Authorization": "Bearer token-6"})
+    assert response.status_code == 201
+    key = database._client_key(make_request("Bearer token-6"))
+    assert f"write:{key}" in published
+
+    # Во втором воркере ключ приходит через шину
+    database._recent_writes.pop(key, None)
+    server._on_remote_write(f"write:{key}")
+    assert read_session_factory(make_request("Bearer token-6")) is SessionLocal
+
+
+def test_batch_read_does_not_pin_client_to_primary(databases):
+    from fastapi.testclient import TestClient
+    import server
+
+    client = TestClient(server.app)
+    response = client.post("/api/batch-read", json={"requests": [{"id": "m", "type": "masters"}]},
+                           headers={"Authorization": "Bearer token-7"})
+    assert response.status_code == 200
+    assert response.json()["results"]["m"]["status"] == 200
+    assert read_session_factory(make_request("Bearer token-7")) is ReadSessionLocal
@@ -0,0 +1,63 @@
+"""Повторяющиеся записи: даты вхождений, виртуальные id, материализация и исключения"""
+from models import AppointmentDB, AppointmentSeriesDB, MasterDB
+from recurrence import exclude, expand, materialize, occurrence_dates, resolve, virtual_id
+
+
+def dates(series, start, end):
+    return list(occurrence_dates(series, start, end))
+
+
+def test_weekly_dates_start_inside_window():
+    series = AppointmentSeriesDB(freq="weekly", interval=2, start_date="2026-03-02", until="2026-05-01")
+    # Первое вхождение окна — арифметикой от начала серии, с шагом две недели
+    assert dates(series, "2026-03-20", "2026-06-30") == ["2026-03-30", "2026-04-13", "2026-04-27"]
+    series.excluded_dates = "2026-04-13"
+    assert dates(series, "2026-03-20", "2026-06-30") == ["2026-03-30", "2026-04-27"]
+    assert dates(series, "2026-01-01", "2026-03-01") == []
+
+
+def test_monthly_skips_missing_days():
+    series = AppointmentSeriesDB(freq="monthly", interval=1, start_date="2026-01-31")
+    assert dates(series, "2026-01-01", "2026-07-31") == ["2026-01-31", "2026-03-31", "2026-05-31", "2026-07-31"]
+    series.interval = 3
+    # Раз в квартал: 31 апреля нет, дальше июль, октябрь, январь
+    assert dates(series, "2026-03-01", "2027-01-31") == ["2026-07-31", "2026-10-31", "2027-01-31"]
+
+
+def test_materialize_replaces_virtual_occurrence(db):
+    anna, vera = MasterDB(name="Анна", color="red", salon_id=1), MasterDB(name="Вера", color="blue", salon_id=1)
+    db.add_all([anna, vera])
+    db.flush()
+    series = AppointmentSeriesDB(salon_id=1, master_id=anna.id, client_name="Ольга", time="10:00", duration=90,
+                                 freq="daily", interval=1, start_date="2026-03-02", comment="стрижка")
+    db.add(series)
+    db.commit()
+    window = ("2026-03-01", "2026-03-04")
+    assert [o["id"] for o in expand(db, 1, *window)] == [
+        virtual_id(series.id, day) for day in ("2026-03-02", "2026-03-03", "2026-03-04")
+    ]
+    assert expand(db, 2, *window) == [] and expand(db, 1, *window, master_id=vera.id) == []
+
+    middle = virtual_id(series.id, "2026-03-03")
+    preview = resolve(db, middle)
+    assert preview.id is None and (preview.date, preview.time, preview.duration) == ("2026-03-03", "10:00", 90)
+
+    assert materialize(db, middle, vera.id) is None  # чужой мастер
+    apt = materialize(db, middle, anna.id)
+    db.commit()
+    assert (apt.series_id, apt.occurrence_date, apt.client_name, apt.comment, apt.status) == (
+        series.id, "2026-03-03", "Ольга", "стрижка", "scheduled"
+    )
+    # Повторная материализация возвращает ту же строку, вхождение больше не виртуальное
+    assert materialize(db, middle, anna.id).id == apt.id
+    db.commit()
+    assert db.query(AppointmentDB).count() == 1
+    assert [o["date"] for o in expand(db, 1, *window)] == ["2026-03-02", "2026-03-04"]
+    assert resolve(db, middle).id == apt.id
+
+    # Дат вне серии нет
+    assert materialize(db, virtual_id(series.id, "2026-03-01"), anna.id) is None
+    assert exclude(db, virtual_id(series.id, "2026-03-04"), anna.id)
+    db.commit()
+    assert [o["date"] for o in expand(db, 1, *window)] == ["2026-03-02"]
+    assert resolve(db, virtual_id(series.id, "2026-03-04")) is None
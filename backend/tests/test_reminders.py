@@ -0,0 +1,168 @@
+"""Напоминания: поддельные часы и поддельный Telegram, основная SQLite-база"""
+import json
+import threading
+from datetime import datetime, timedelta
+
+import httpx
+
+import reminders
+from database import SessionLocal
+from models import AppointmentDB, AppointmentSeriesDB, MasterDB, ReminderMarkDB
+from notifications import NotificationDispatcher
+from reminders import ReminderScheduler
+
+
+class FakeClock:
+    def __init__(self, now: datetime):
+        self.now = now
+
+    def __call__(self) -> datetime:
+        return self.now
+
+    def advance(self, **kwargs):
+        self.now += timedelta(**kwargs)
+
+
+class FakeTelegram:
+    """Отправитель с тем же контрактом, что dispatcher.send: результат доставки в on_done"""
+
+    def __init__(self):
+        self.sent = []
+        self.fail = set()  # чаты, в которые доставка не проходит
+
+    def __call__(self, chat_id: str, message: str, on_done=None):
+        ok = chat_id not in self.fail
+        if ok:
+            self.sent.append((chat_id, message))
+        if on_done is not None:
+            on_done(ok)
+
+
+NOW = datetime(2026, 3, 2, 9, 0)
+
+
+def make_scheduler(clock: FakeClock, telegram: FakeTelegram) -> ReminderScheduler:
+    return ReminderScheduler(session_factory=SessionLocal, clock=clock, sender=telegram, offsets=[60])
+
+
+def add_appointment(db, telegram_id: int = 1001, date: str = "2026-03-02", time: str = "12:00") -> AppointmentDB:
+    master = MasterDB(name="Анна", color="red", salon_id=1, telegram_id=telegram_id)
+    db.add(master)
+    db.flush()
+    apt = AppointmentDB(salon_id=1, master_id=master.id, client_name="Ольга", date=date, time=time, status="scheduled")
+    db.add(apt)
+    db.commit()
+    return apt
+
+
+def test_reminder_sent_once_when_due(db):
+    add_appointment(db)
+    clock, telegram = FakeClock(NOW), FakeTelegram()
+    scheduler = make_scheduler(clock, telegram)
+
+    assert scheduler.run_due() == 0
+    clock.advance(hours=2)  # 11:00 — за час до записи
+    assert scheduler.run_due() == 1
+    assert [chat_id for chat_id, _ in telegram.sent] == ["1001"]
+    clock.advance(minutes=5)
+    assert scheduler.run_due() == 0
+    assert len(telegram.sent) == 1
+
+
+def test_failed_delivery_released_and_retried(db):
+    add_appointment(db)
+    clock, telegram = FakeClock(NOW + timedelta(hours=2)), FakeTelegram()
+    telegram.fail.add("1001")
+    scheduler = make_scheduler(clock, telegram)
+
+    scheduler.run_due()
+    assert telegram.sent == []
+    telegram.fail.clear()
+    # Следующий проход снимает отметку и возвращает напоминание в кучу на повтор
+    scheduler.run_due()
+    assert db.query(ReminderMarkDB).count() == 0
+    clock.advance(seconds=reminders.REMINDER_RETRY_SECONDS - 1)
+    assert scheduler.run_due() == 0
+    assert telegram.sent == []
+    clock.advance(seconds=1)
+    assert scheduler.run_due() == 1
+    assert [chat_id for chat_id, _ in telegram.sent] == ["1001"]
+    assert db.query(ReminderMarkDB).count() == 1
+
+
+def test_reloaded_day_does_not_duplicate_reminders(db):
+    add_appointment(db)
+    clock, telegram = FakeClock(NOW), FakeTelegram()
+    scheduler = make_scheduler(clock, telegram)
+    scheduler.run_due()
+    size = len(scheduler)
+
+    for _ in range(5):
+        scheduler.mark_dirty("2026-03-02")
+        scheduler.run_due()
+    assert len(scheduler) == size
+
+    clock.advance(hours=2)
+    scheduler.run_due()
+    scheduler.mark_dirty("2026-03-02")
+    scheduler.run_due()
+    # Отправленное напоминание не возвращается в кучу после перечитывания дня
+    assert len(telegram.sent) == 1
+    assert len(scheduler) == size - 1
+
+
+def test_rescheduled_appointment_reminds_at_new_time(db):
+    apt = add_appointment(db)
+    clock, telegram = FakeClock(NOW), FakeTelegram()
+    scheduler = make_scheduler(clock, telegram)
+    scheduler.run_due()
+
+    apt.time = "15:00"
+    db.commit()
+    scheduler.mark_dirty("2026-03-02")
+    clock.advance(hours=2)
+    assert scheduler.run_due() == 0
+    clock.advance(hours=3)
+    assert scheduler.run_due() == 1
+
+
+def test_series_occurrence_reminded(db):
+    master = MasterDB(name="Анна", color="red", salon_id=1, telegram_id=1002)
+    db.add(master)
+    db.flush()
+    db.add(AppointmentSeriesDB(
+        salon_id=1, master_id=master.id, client_name="Ольга", time="10:00", freq="daily", interval=1, start_date="2026-03-01"
+    ))
+    db.commit()
+    clock, telegram = FakeClock(NOW), FakeTelegram()
+    scheduler = make_scheduler(clock, telegram)
+
+    assert scheduler.run_due() == 1  # 10:00 сегодня, напоминание за час наступило
+    clock.advance(days=1)
+    assert scheduler.run_due() == 1
+    assert [chat_id for chat_id, _ in telegram.sent] == ["1002", "1002"]
+
+
+def test_dispatcher_reports_delivery_result():
+    # Поддельный Telegram: в чат "blocked" бот писать не может
+    def telegram_api(request: httpx.Request) -> httpx.Response:
+        if json.loads(request.content)["chat_id"] == "blocked":
+            return httpx.Response(403, json={"ok": False, "description": "bot was blocked by the user"})
+        return httpx.Response(200, json={"ok": True})
+
+    sender = NotificationDispatcher(transport=httpx.MockTransport(telegram_api))
+    results = {}
+    done = threading.Event()
+
+    def on_done(chat_id: str, ok: bool):
+        results[chat_id] = ok
+        if len(results) == 2:
+            done.set()
+
+    try:
+        sender.send("1001", "hi", lambda ok: on_done("1001", ok))
+        sender.send("blocked", "hi", lambda ok: on_done("blocked", ok))
+        assert done.wait(5)
+    finally:
+        sender.stop()
+    assert results == {"1001": True, "blocked": False}
@@ -0,0 +1,70 @@
+"""Поиск записей: индекс в памяти (SQLite) — ранжирование, стемминг, салоны, переиндексация дня"""
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from models import AppointmentDB, MasterDB, SalonDB
+from search import inverted_index, search_appointments, stem
+
+
+@pytest.fixture
+def salon(db):
+    """Записи салона 1 и одна запись салона 2 с теми же словами"""
+    inverted_index.reset()
+    db.add(SalonDB(id=2, name="Второй"))
+    master, other = MasterDB(name="Анна", color="red", salon_id=1), MasterDB(name="Вера", color="red", salon_id=2)
+    db.add_all([master, other])
+    db.flush()
+    appointments = {
+        "olga": AppointmentDB(salon_id=1, master_id=master.id, client_name="Ольга", date="2026-03-02", time="10:00",
+                              comment="окрашивание волос"),
+        "irina": AppointmentDB(salon_id=1, master_id=master.id, client_name="Ирина", date="2026-03-03", time="11:00",
+                               comment="стрижка, окрашивание, окрашивание корней"),
+        "maria": AppointmentDB(salon_id=1, master_id=master.id, client_name="Мария", date="2026-03-04", time="12:00",
+                               comment="маникюр"),
+        "other": AppointmentDB(salon_id=2, master_id=other.id, client_name="Ольга", date="2026-03-02", time="10:00",
+                               comment="окрашивание волос"),
+    }
+    db.add_all(appointments.values())
+    db.commit()
+    yield master, appointments
+    inverted_index.reset()
+
+
+def found(db, salon_id: int, query: str) -> list:
+    return [item["clientName"] for item in search_appointments(db, salon_id, query)["items"]]
+
+
+def test_ranked_by_term_frequency(db, salon):
+    # У Ирины слово встречается дважды на пять слов — выше, чем один раз на три у Ольги
+    assert found(db, 1, "окрашивание") == ["Ирина", "Ольга"]
+    # Все слова запроса обязательны
+    assert found(db, 1, "окрашивание волос") == ["Ольга"]
+
+
+def test_stemming_matches_word_forms(db, salon):
+    # Формы существительных на -ие сводятся к одной основе
+    assert {stem(word) for word in ("окрашивание", "окрашиванием", "окрашивания", "окрашиванию")} == {"окрашиван"}
+    assert found(db, 1, "окрашиванием") == ["Ирина", "Ольга"]
+    assert found(db, 1, "волосами") == ["Ольга"]
+    assert found(db, 1, "ольгой") == ["Ольга"]
+
+
+def test_salons_are_isolated(db, salon):
+    _, appointments = salon
+    assert [item["id"] for item in search_appointments(db, 2, "окрашивание")["items"]] == [str(appointments["other"].id)]
+    assert str(appointments["other"].id) not in [item["id"] for item in search_appointments(db, 1, "волос")["items"]]
+    assert found(db, 2, "маникюр") == []
+
+
+def test_edit_reindexes_day(db, salon):
+    master, appointments = salon
+    assert found(db, 1, "брови") == []  # индекс построен
+
+    client = TestClient(server.app)
+    response = client.put(f"/api/appointments/{master.id}/{appointments['maria'].id}", json={"comment": "окрашивание бровей"})
+    assert response.status_code == 200
+    db.expire_all()
+    assert found(db, 1, "брови") == ["Мария"]
+    assert "Мария" in found(db, 1, "окрашивание")
+    assert found(db, 1, "маникюр") == []
@@ -0,0 +1,47 @@
+"""Снимок: порядок загрузки таблиц и деление appointments по месяцам (без PostgreSQL)"""
+from database import engine
+from models import AppointmentDB, MasterDB
+from snapshot import TABLES, next_month, table_levels, month_chunks
+
+
+def test_table_levels_follow_foreign_keys():
+    levels = table_levels(list(TABLES))
+    level_of = {name: number for number, names in enumerate(levels) for name in names}
+    assert "salons" in levels[0]
+    assert sorted(level_of) == sorted(TABLES)
+    for name, table in TABLES.items():
+        for fk in table.foreign_keys:
+            parent = fk.column.table.name
+            if parent != name:
+                assert level_of[parent] < level_of[name], (parent, name)
+
+
+def test_next_month_wraps_year():
+    assert next_month("2025-12") == "2026-01"
+    assert next_month("2026-01") == "2026-02"
+
+
+def test_month_chunks_cover_gaps_and_other(db):
+    master = MasterDB(name="Анна", color="red", salon_id=1)
+    db.add(master)
+    db.flush()
+    for day in ("2025-11-05", "2026-01-20", "bad"):
+        db.add(AppointmentDB(salon_id=1, master_id=master.id, client_name="Ольга", date=day, time="10:00"))
+    db.commit()
+
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        chunks = month_chunks(cursor, "appointments")
+        # Декабрь без записей тоже отдельная часть: месяцы идут без пропусков
+        assert [chunk["part"] for chunk in chunks] == ["2025-11", "2025-12", "2026-01", "other"]
+        counted = 0
+        for chunk in chunks:
+            cursor.execute(f"SELECT COUNT(*) FROM appointments WHERE {chunk['where']}")
+            counted += cursor.fetchone()[0]
+        assert counted == 3
+        assert month_chunks(cursor, "appointments_archive") == [
+            {"table": "appointments_archive", "part": None, "where": None}
+        ]
+    finally:
+        raw.close()
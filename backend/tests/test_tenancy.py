@@ -0,0 +1,57 @@
+"""Салоны: токен мастера ограничивает все чтения и записи его салоном"""
+import pytest
+
+import middleware
+import server
+from models import AppointmentDB, ExpenseDB, MasterDB, SalonDB
+
+
+@pytest.fixture
+def two_salons(db):
+    db.add(SalonDB(id=2, name="Второй"))
+    anna, vera = MasterDB(name="Анна", color="red", salon_id=1), MasterDB(name="Вера", color="blue", salon_id=2)
+    db.add_all([anna, vera])
+    db.flush()
+    apt = AppointmentDB(salon_id=1, master_id=anna.id, client_name="Ольга", date="2026-03-02", time="10:00")
+    expense = ExpenseDB(salon_id=1, date="2026-03-02", category="Аренда", amount=500.0)
+    db.add_all([apt, expense])
+    db.commit()
+    return anna, vera, apt, expense
+
+
+def bearer(master: MasterDB) -> dict:
+    return {"Authorization": f"Bearer {server.issue_token(master)}"}
+
+
+def test_other_salon_token_cannot_read_or_update(api, two_salons):
+    anna, vera, apt, expense = two_salons
+    headers = bearer(vera)
+
+    assert [m["name"] for m in api.get("/api/masters", headers=headers).json()] == ["Вера"]
+    # Записи дня сгруппированы по мастерам салона
+    assert api.get("/api/appointments", params={"date": "2026-03-02"}, headers=headers).json() == {str(vera.id): []}
+    assert api.get("/api/expenses", params={"start_date": "2026-03-01", "end_date": "2026-03-31"},
+                   headers=headers).json() == []
+
+    # Чужие записи и расходы для салона 2 не существуют
+    assert api.put(f"/api/appointments/{anna.id}/{apt.id}", json={"comment": "x"}, headers=headers).status_code == 404
+    assert api.put(f"/api/expenses/{expense.id}", json={"amount": 1}, headers=headers).status_code == 404
+    assert api.delete(f"/api/expenses/{expense.id}", headers=headers).status_code == 404
+
+    own = api.get("/api/expenses", params={"start_date": "2026-03-01", "end_date": "2026-03-31"}, headers=bearer(anna))
+    assert [(e["id"], e["amount"]) for e in own.json()] == [(str(expense.id), 500.0)]
+    day = api.get("/api/appointments", params={"date": "2026-03-02"}, headers=bearer(anna)).json()
+    assert [a["id"] for a in day[str(anna.id)]] == [str(apt.id)]
+
+
+def test_salon_header_requires_bot_secret(api, two_salons, monkeypatch):
+    monkeypatch.setattr(middleware, "BOT_API_SECRET", "bot-secret")
+
+    # Без секрета бота X-Salon-Id игнорируется: салон по умолчанию
+    ignored = api.get("/api/masters", headers={"X-Salon-Id": "2"})
+    assert [m["name"] for m in ignored.json()] == ["Анна"]
+    wrong = api.get("/api/masters", headers={"X-Salon-Id": "2", "X-Bot-Secret": "guess"})
+    assert [m["name"] for m in wrong.json()] == ["Анна"]
+
+    bot = api.get("/api/masters", headers={"X-Salon-Id": "2", "X-Bot-Secret": "bot-secret"})
+    assert [m["name"] for m in bot.json()] == ["Вера"]
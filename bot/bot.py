@@ -12,6 +12,34 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 WEB_APP_URL = os.getenv("WEB_APP_URL")
 ADMIN_IDS = [int(id) for id in os.getenv("ADMIN_IDS").split(",")] if os.getenv("ADMIN_IDS") else []
 BACKEND_APP_URL = os.getenv("BACKEND_APP_URL")
+# Салон админа: "chat_id:salon_id,..."; чаты без записи смотрят DEFAULT_SALON_ID
+ADMIN_SALONS = dict(
+    (int(chat), int(salon)) for chat, salon in
+    (pair.split(":") for pair in os.getenv("ADMIN_SALONS").split(","))
+) if os.getenv("ADMIN_SALONS") else {}
+DEFAULT_SALON_ID = int(os.getenv("DEFAULT_SALON_ID", "1"))
+# Общий секрет с бэкендом (BOT_API_SECRET): без него бэкенд не принимает X-Salon-Id
+BOT_API_SECRET = os.getenv("BOT_API_SECRET", "")
+
+
+def salon_headers(update: Update) -> dict:
+    """Заголовки X-Salon-Id и X-Bot-Secret для запросов к бэкенду от имени админа салона"""
+    return {
+        "X-Salon-Id": str(ADMIN_SALONS.get(update.effective_chat.id, DEFAULT_SALON_ID)),
+        "X-Bot-Secret": BOT_API_SECRET
+    }
+
+
+def admin_headers(update: Update) -> dict:
+    """Authorization от имени админа, написавшего команду: endpoints только для администратора
+    (ведомость, закрытие дня) принимают токен мастера, бот получает его по Telegram ID"""
+    response = requests.post(
+        f"{BACKEND_APP_URL}/api/bot/token",
+        params={"telegram_id": update.effective_user.id},
+        headers=salon_headers(update)
+    )
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['token']}"}
 
 
 async def admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -19,6 +47,7 @@ async def admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = [
         [InlineKeyboardButton("📋 Записи мастеров", callback_data="view_masters")],
         [InlineKeyboardButton("💰 Касса", callback_data="view_cash")],
+        [InlineKeyboardButton("📈 Доходы и расходы", callback_data="view_pnl")],
         [InlineKeyboardButton("🌐 Открыть приложение", web_app=WebAppInfo(url=WEB_APP_URL))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -36,7 +65,7 @@ async def view_masters(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
   
-    response = requests.get(f"{BACKEND_APP_URL}/api/masters")
+    response = requests.get(f"{BACKEND_APP_URL}/api/masters", headers=salon_headers(update))
     
     masters = response.json()
     
@@ -65,7 +94,7 @@ async def view_master_appointments(update: Update, context: ContextTypes.DEFAULT
     master_id = query.data.split("_")[1]
     
     try:
-        response = requests.get(f"{BACKEND_APP_URL}/api/bot/masters/{master_id}/appointments")
+        response = requests.get(f"{BACKEND_APP_URL}/api/bot/masters/{master_id}/appointments", headers=salon_headers(update))
         data = response.json()
         
         master = data["master"]
@@ -112,16 +141,26 @@ def format_date(date_str: str) -> str:
 
 
 async def view_cash(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Показать данные кассы"""
+    """Показать данные кассы: callback view_cash — сегодня, view_cash_YYYY-MM-DD — другой день"""
     query = update.callback_query
     await query.answer()
     
     try:
-        response = requests.get(f"{BACKEND_APP_URL}/api/bot/cash-register")
+        from datetime import date, timedelta
+        day = date.fromisoformat(query.data[len("view_cash_"):]) if query.data.startswith("view_cash_") else date.today()
+        response = requests.get(
+            f"{BACKEND_APP_URL}/api/bot/cash-register",
+            params={"date": day.isoformat()},
+            headers=salon_headers(update)
+        )
         data = response.json()
-        print(data)
         
-        message = f"💰 Касса на {format_date(data['date'])}\n\n"
+        message = f"💰 Касса на {format_date(data['date'])}\n"
+        if data["closed"]:
+            message += f"🔒 День закрыт (версия {data['version']})\n"
+        elif data.get("reopened"):
+            message += "🔓 День переоткрыт, итоги по текущим записям\n"
+        message += "\n"
         message += f"📊 Общая выручка: {data['total']['total']:.2f}₽\n"
         message += f"💵 Наличные: {data['total']['cash']:.2f}₽\n"
         message += f"💳 Безнал: {data['total']['card']:.2f}₽\n"
@@ -134,7 +173,10 @@ async def view_cash(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 message += f"  💰 {master_data['total']:.2f}₽ ({master_data['count']} зап.)\n"
                 message += f"  💵 {master_data['cash']:.2f}₽ | 💳 {master_data['card']:.2f}₽\n"
         
-        keyboard = [[InlineKeyboardButton("◀️ Назад", callback_data="admin_menu")]]
+        days = [InlineKeyboardButton("◀️ Предыдущий день", callback_data=f"view_cash_{day - timedelta(days=1)}")]
+        if day < date.today():
+            days.append(InlineKeyboardButton("Следующий день ▶️", callback_data=f"view_cash_{day + timedelta(days=1)}"))
+        keyboard = [days, [InlineKeyboardButton("◀️ Назад", callback_data="admin_menu")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await query.edit_message_text(message, reply_markup=reply_markup)
@@ -142,6 +184,230 @@ async def view_cash(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.edit_message_text(f"❌ Ошибка: {str(e)}")
 
 
+async def close_day(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Закрыть день: /close [YYYY-MM-DD] (по умолчанию — сегодня). Z-отчет бэкенд присылает админам салона"""
+    if update.effective_chat.id not in ADMIN_IDS:
+        return
+
+    from datetime import date
+    try:
+        day = date.fromisoformat(context.args[0]) if context.args else date.today()
+    except ValueError:
+        await update.message.reply_text("Использование: /close [YYYY-MM-DD]")
+        return
+
+    try:
+        response = requests.post(
+            f"{BACKEND_APP_URL}/api/day-closes/{day.isoformat()}",
+            headers=admin_headers(update)
+        )
+        if response.status_code == 409:
+            await update.message.reply_text(f"⚠️ День {format_date(day.isoformat())} уже закрыт или еще не наступил")
+            return
+        response.raise_for_status()
+        await update.message.reply_text(f"🔒 День {format_date(day.isoformat())} закрыт (версия {response.json()['version']})")
+    except Exception as e:
+        await update.message.reply_text(f"❌ Ошибка: {str(e)}")
+
+
+async def reopen_day(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Переоткрыть закрытый день для исправлений: /reopen YYYY-MM-DD <причина>"""
+    if update.effective_chat.id not in ADMIN_IDS:
+        return
+
+    from datetime import date
+    try:
+        day = date.fromisoformat(context.args[0])
+        reason = " ".join(context.args[1:]).strip()
+        if not reason:
+            raise ValueError("reason is required")
+    except (IndexError, ValueError):
+        await update.message.reply_text("Использование: /reopen YYYY-MM-DD <причина>")
+        return
+
+    try:
+        response = requests.post(
+            f"{BACKEND_APP_URL}/api/day-closes/{day.isoformat()}/reopen",
+            json={"reason": reason},
+            headers=admin_headers(update)
+        )
+        if response.status_code == 409:
+            await update.message.reply_text(f"⚠️ День {format_date(day.isoformat())} не закрыт")
+            return
+        response.raise_for_status()
+        await update.message.reply_text(
+            f"🔓 День {format_date(day.isoformat())} переоткрыт. После исправлений закройте его: /close {day.isoformat()}"
+        )
+    except Exception as e:
+        await update.message.reply_text(f"❌ Ошибка: {str(e)}")
+
+
+async def view_pnl(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Показать доходы и расходы за текущий месяц"""
+    query = update.callback_query
+    await query.answer()
+
+    try:
+        from datetime import date
+        today = date.today()
+        start_date = today.replace(day=1).strftime("%Y-%m-%d")
+        end_date = today.strftime("%Y-%m-%d")
+        response = requests.get(
+            f"{BACKEND_APP_URL}/api/pnl",
+            params={"start_date": start_date, "end_date": end_date, "period": "month"},
+            headers=salon_headers(update)
+        )
+        data = response.json()
+        total = data["total"]
+
+        message = f"📈 Доходы и расходы с {format_date(start_date)} по {format_date(end_date)}\n\n"
+        message += f"💰 Доход: {total['income']:.2f}₽\n"
+        message += f"💵 Наличные: {total['cash']:.2f}₽ | 💳 Безнал: {total['card']:.2f}₽\n"
+        message += f"💸 Расходы: {total['expenses']:.2f}₽\n"
+        message += f"📊 Прибыль: {total['profit']:.2f}₽\n"
+        message += "\nДобавить расход: /expense <сумма> <категория> [комментарий]"
+
+        keyboard = [[InlineKeyboardButton("◀️ Назад", callback_data="admin_menu")]]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+
+        await query.edit_message_text(message, reply_markup=reply_markup)
+    except Exception as e:
+        await query.edit_message_text(f"❌ Ошибка: {str(e)}")
+
+
+async def add_expense(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Добавление расхода: /expense <сумма> <категория> [комментарий]"""
+    if update.effective_chat.id not in ADMIN_IDS:
+        return
+
+    if len(context.args) < 2:
+        await update.message.reply_text("Использование: /expense <сумма> <категория> [комментарий]")
+        return
+
+    try:
+        amount = float(context.args[0].replace(",", "."))
+    except ValueError:
+        await update.message.reply_text("❌ Сумма должна быть числом")
+        return
+
+    from datetime import date
+    expense = {
+        "date": date.today().strftime("%Y-%m-%d"),
+        "category": context.args[1],
+        "amount": amount,
+        "comment": " ".join(context.args[2:])
+    }
+
+    try:
+        response = requests.post(f"{BACKEND_APP_URL}/api/expenses", json=expense, headers=salon_headers(update))
+        response.raise_for_status()
+        await update.message.reply_text(f"✅ Расход {amount:.2f}₽ ({expense['category']}) добавлен")
+    except Exception as e:
+        await update.message.reply_text(f"❌ Ошибка: {str(e)}")
+
+
+async def view_client(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """История клиента: /client <имя>"""
+    if update.effective_chat.id not in ADMIN_IDS:
+        return
+
+    if not context.args:
+        await update.message.reply_text("Использование: /client <имя или фамилия>")
+        return
+
+    try:
+        response = requests.get(
+            f"{BACKEND_APP_URL}/api/clients/autocomplete",
+            params={"q": " ".join(context.args), "limit": 1},
+            headers=salon_headers(update)
+        )
+        found = response.json()
+        if not found:
+            await update.message.reply_text("Клиент не найден")
+            return
+
+        response = requests.get(f"{BACKEND_APP_URL}/api/clients/{found[0]['id']}/history", params={"limit": 10}, headers=salon_headers(update))
+        data = response.json()
+        totals = data["totals"]
+
+        message = f"👤 {data['client']['name']}\n\n"
+        message += f"📋 Записей: {totals['appointments']} | ✅ Визитов: {totals['completed']} | ❌ Отмен: {totals['cancelled']}\n"
+        message += f"💰 Всего оплачено: {totals['totalSpent']:.2f}₽ (средний чек {totals['averageCheck']:.2f}₽)\n"
+        if totals["firstVisit"]:
+            message += f"📅 Первый визит: {format_date(totals['firstVisit'])}, последний: {format_date(totals['lastVisit'])}\n"
+        if data["favouriteMaster"]:
+            message += f"⭐ Любимый мастер: {data['favouriteMaster']['name']} ({data['favouriteMaster']['visits']} виз.)\n"
+
+        if data["visits"]:
+            statuses = {"completed": "✅", "cancelled": "❌", "scheduled": "⏳"}
+            message += "\nПоследние записи:\n"
+            for visit in data["visits"]:
+                master = data["masters"].get(visit["masterId"], {}).get("name") or ""
+                message += f"{statuses.get(visit['status'], '')} {format_date(visit['date'])} {visit['time']} {master}\n"
+
+        await update.message.reply_text(message)
+    except Exception as e:
+        await update.message.reply_text(f"❌ Ошибка: {str(e)}")
+
+
+async def view_payroll(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Зарплатная ведомость: /payroll [YYYY-MM] (по умолчанию — прошлый месяц)"""
+    if update.effective_chat.id not in ADMIN_IDS:
+        return
+
+    from datetime import date, timedelta
+    try:
+        if context.args:
+            first = date.fromisoformat(f"{context.args[0]}-01")
+        else:
+            first = (date.today().replace(day=1) - timedelta(days=1)).replace(day=1)
+    except ValueError:
+        await update.message.reply_text("Использование: /payroll [YYYY-MM]")
+        return
+    last = (first.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+    try:
+        response = requests.get(
+            f"{BACKEND_APP_URL}/api/payroll",
+            params={"start_date": first.isoformat(), "end_date": last.isoformat()},
+            headers=admin_headers(update)
+        )
+        response.raise_for_status()
+        data = response.json()
+
+        message = f"💼 Зарплата с {format_date(data['startDate'])} по {format_date(data['endDate'])}\n"
+        for master in data["masters"].values():
+            if not master["appointments"]:
+                continue
+            message += f"\n👤 {master['name']} — {master['pay']['total']:.2f}₽\n"
+            message += f"  📊 Выручка {master['revenue']['total']:.2f}₽ ({master['appointments']} зап.)\n"
+            message += f"  💵 {master['pay']['cash']:.2f}₽ | 💳 {master['pay']['card']:.2f}₽\n"
+            for rule in master["rules"]:
+                if rule["appointments"]:
+                    message += f"  • {rule['service'] or 'остальное'} {rule['percent']:g}%: {rule['pay']:.2f}₽\n"
+            if master["unmatched"]:
+                message += f"  ⚠️ Без правила комиссии: {master['unmatched']} зап.\n"
+        message += f"\n💰 Итого к выплате: {data['total']['pay']:.2f}₽ из {data['total']['revenue']:.2f}₽"
+
+        await update.message.reply_text(message)
+    except Exception as e:
+        await update.message.reply_text(f"❌ Ошибка: {str(e)}")
+
+
+async def salon_invite(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Ссылка-приглашение в салон админа: /invite"""
+    if update.effective_chat.id not in ADMIN_IDS:
+        return
+
+    try:
+        response = requests.get(f"{BACKEND_APP_URL}/api/bot/invite", headers=salon_headers(update))
+        response.raise_for_status()
+        link = f"https://t.me/{context.bot.username}?start={response.json()['invite']}"
+        await update.message.reply_text(f"🔗 Ссылка для новых мастеров салона:\n{link}")
+    except Exception as e:
+        await update.message.reply_text(f"❌ Ошибка: {str(e)}")
+
+
 # Настройка логирования
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -160,7 +426,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         welcome_message += "Я бот для управления расписанием салона красоты WANT.\n"
         welcome_message += "Нажмите кнопку ниже, чтобы открыть приложение."
         
-        keyboard = [[InlineKeyboardButton("Открыть приложение", web_app=WebAppInfo(url=WEB_APP_URL))]]
+        # /start <код приглашения> — код передается приложению, салон по нему определяет бэкенд
+        url = f"{WEB_APP_URL}?invite={context.args[0]}" if context.args else WEB_APP_URL
+        keyboard = [[InlineKeyboardButton("Открыть приложение", web_app=WebAppInfo(url=url))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await update.message.reply_text(welcome_message, reply_markup=reply_markup)
@@ -176,7 +444,14 @@ def main() -> None:
     application.add_handler(CallbackQueryHandler(admin_menu, pattern="^admin_menu$"))
     application.add_handler(CallbackQueryHandler(view_masters, pattern="^view_masters$"))
     application.add_handler(CallbackQueryHandler(view_master_appointments, pattern="^master_"))
-    application.add_handler(CallbackQueryHandler(view_cash, pattern="^view_cash$"))
+    application.add_handler(CallbackQueryHandler(view_cash, pattern="^view_cash"))
+    application.add_handler(CallbackQueryHandler(view_pnl, pattern="^view_pnl$"))
+    application.add_handler(CommandHandler("expense", add_expense))
+    application.add_handler(CommandHandler("client", view_client))
+    application.add_handler(CommandHandler("payroll", view_payroll))
+    application.add_handler(CommandHandler("close", close_day))
+    application.add_handler(CommandHandler("invite", salon_invite))
+    application.add_handler(CommandHandler("reopen", reopen_day))
     
     # Запуск бота
     application.run_polling(allowed_updates=Update.ALL_TYPES)
@@ -10,6 +10,7 @@ import { AppointmentDialog } from "@/components/appointment-dialog"
 import {
   getMasters,
   getAppointmentsRange,
+  getCalendarSummary,
   getStatsForRange,
   updateAppointment,
   completeAppointment,
@@ -19,6 +20,7 @@ import {
   getMasterIndicatorColor,
   getMasterBorderColor,
   type Appointment,
+  type DaySummary,
   type Master,
 } from "@/lib/api"
 
@@ -40,6 +42,7 @@ export default function AdminPage() {
   const [viewMode, setViewMode] = useState<ViewMode>("day")
 
   const [appointments, setAppointments] = useState<Record<string, Appointment[]>>({})
+  const [summary, setSummary] = useState<Record<string, Record<string, DaySummary>>>({})
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState<string | null>(null)
   const [stats, setStats] = useState({
@@ -91,8 +94,14 @@ export default function AdminPage() {
 
       const { startDateStr, endDateStr } = getRange()
 
-      const appointmentsData = await getAppointmentsRange(startDateStr, endDateStr)
-      setAppointments(appointmentsData)
+      // Для месяца достаточно сводки, полные записи грузятся при открытии дня
+      if (viewMode === "month") {
+        const summaryData = await getCalendarSummary(startDateStr, endDateStr)
+        setSummary(summaryData)
+      } else {
+        const appointmentsData = await getAppointmentsRange(startDateStr, endDateStr)
+        setAppointments(appointmentsData)
+      }
 
       const statsMasterId = selectedMaster === "all" ? undefined : selectedMaster
       const statsData = await getStatsForRange(startDateStr, endDateStr, statsMasterId)
@@ -132,11 +141,11 @@ export default function AdminPage() {
     return days
   }
 
-  const getAppointmentsForDate = (date: Date, masterId?: string): Appointment[] => {
+  const getSummaryForDate = (date: Date, masterId?: string): [string, DaySummary][] => {
     const dateKey = date.toISOString().split("T")[0]
-    const all = appointments[dateKey] || []
+    const all = Object.entries(summary[dateKey] || {})
     if (!masterId) return all
-    return all.filter((apt) => String(apt.masterId) === String(masterId))
+    return all.filter(([id]) => id === String(masterId))
   }
 
   const changeMonth = (months: number) => {
@@ -456,7 +465,7 @@ export default function AdminPage() {
                       return <div key={`empty-${index}`} className="aspect-square" />
                     }
 
-                    const dayAppointments = getAppointmentsForDate(
+                    const daySummary = getSummaryForDate(
                       day,
                       selectedMaster === "all" ? undefined : selectedMaster,
                     )
@@ -477,22 +486,24 @@ export default function AdminPage() {
                           {day.getDate()}
                         </div>
                         <div className="space-y-1">
-                          {dayAppointments.slice(0, 2).map((appointment) => {
-                            const master = masters.find((m) => String(m.id) === String(appointment.masterId))
+                          {daySummary.slice(0, 2).map(([masterId, masterSummary]) => {
+                            const master = masters.find((m) => String(m.id) === masterId)
                             const indicatorColor = master ? getMasterIndicatorColor(master) : "#999"
 
                             return (
-                              <div key={appointment.id} className="flex items-center gap-1">
+                              <div key={masterId} className="flex items-center gap-1">
                                 <div
                                   className="w-2 h-2 rounded-full flex-shrink-0"
                                   style={{ backgroundColor: indicatorColor }}
                                 />
-                                <span className="text-xs text-gray-600 truncate">{appointment.clientName}</span>
+                                <span className="text-xs text-gray-600 truncate">
+                                  {master?.name ?? masterId}: {masterSummary.total}
+                                </span>
                               </div>
                             )
                           })}
-                          {dayAppointments.length > 2 && (
-                            <span className="text-xs text-gray-500">+{dayAppointments.length - 2} ещё</span>
+                          {daySummary.length > 2 && (
+                            <span className="text-xs text-gray-500">+{daySummary.length - 2} ещё</span>
                           )}
                         </div>
                       </div>
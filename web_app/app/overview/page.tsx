@@ -44,7 +44,8 @@ useEffect(() => {
         return;
       } 
       // <CHANGE> Один запрос вместо 28!
-      const allAppointments = await getAppointmentsRange(startDateStr, endDateStr,masterId)
+      // Комментарии и оплаты в обзоре не показываются — не загружаем их
+      const allAppointments = await getAppointmentsRange(startDateStr, endDateStr, masterId, ["time", "clientName", "status", "date"])
 
       setAppointments(allAppointments)
     } catch (err) {
@@ -13,9 +13,8 @@ import {
   authenticateViaTelegram,
   getAuthToken,
   getMasterId,
+  getHomeData,
   getMasterRole,
-  getTodayAppointments,
-  getWeekAppointments,
   setAuthToken,
   setMasterId,
   setMasterRole,
@@ -26,12 +25,14 @@ export default function HomePage() {
   const [weekAppointments, setWeekAppointments] = useState<Appointment[]>([])
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState<string | null>(null)
+  const [stale, setStale] = useState(false)
 
   const [currentMaster, setCurrentMaster] = useState<Master | null>(null)
   const [masterRole, setMasterRoleState] = useState<string | null>(null)
 
   const authenticateUser = async (telegramId: number, firstName: string) => {
-    const data = await authenticateViaTelegram(telegramId, firstName)
+    const invite = new URLSearchParams(window.location.search).get('invite')
+    const data = await authenticateViaTelegram(telegramId, firstName, invite)
 
     setAuthToken(data.token)
     setCurrentMaster(data.master)
@@ -42,9 +43,14 @@ export default function HomePage() {
   }
 
   const loadHomeData = async () => {
-    const [today, week] = await Promise.all([getTodayAppointments(), getWeekAppointments()])
+    // Один пакетный запрос вместо отдельных за сегодня, неделю и профиль
+    const { today, week, profile, stale } = await getHomeData()
     setTodayAppointments(today)
     setWeekAppointments(week)
+    setStale(stale)
+    if (profile) {
+      setCurrentMaster((current) => current ?? profile)
+    }
   }
 
   useEffect(() => {
@@ -193,6 +199,11 @@ export default function HomePage() {
           <h2 className="text-lg font-semibold mb-4 text-gray-800">Сегодня</h2>
 
           {error && <div className="p-4 bg-red-100 text-red-700 rounded-lg">{error}</div>}
+          {stale && (
+            <div className="p-4 bg-yellow-100 text-yellow-800 rounded-lg">
+              Сервер временно недоступен — показано последнее сохраненное расписание
+            </div>
+          )}
 
           {loading ? (
             <div className="p-4 text-center text-gray-600">Загрузка...</div>
@@ -7,6 +7,7 @@ import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogFooter } from "
 import { Input } from "@/components/ui/input"
 import { Label } from "@/components/ui/label"
 import { Textarea } from "@/components/ui/textarea"
+import { searchClients, type Client } from "@/lib/api"
 
 type Appointment = {
   id: string
@@ -48,6 +49,7 @@ export function AppointmentDialog({
   const [showPayment, setShowPayment] = useState(false)
   const [cash, setCash] = useState(0)
   const [card, setCard] = useState(0)
+  const [suggestions, setSuggestions] = useState<Client[]>([])
 
   useEffect(() => {
     if (appointment) {
@@ -64,6 +66,29 @@ export function AppointmentDialog({
     setCard(0)
   }, [appointment, open])
 
+  // Подсказки клиентов с задержкой, чтобы не слать запрос на каждый символ
+  useEffect(() => {
+    const query = clientName.trim()
+    if (!open || query.length < 2) {
+      setSuggestions([])
+      return
+    }
+    let cancelled = false
+    const timer = setTimeout(() => {
+      searchClients(query)
+        .then((clients) => {
+          if (!cancelled) setSuggestions(clients)
+        })
+        .catch(() => {
+          if (!cancelled) setSuggestions([])
+        })
+    }, 200)
+    return () => {
+      cancelled = true
+      clearTimeout(timer)
+    }
+  }, [clientName, open])
+
   const handleSave = () => {
     if (clientName.trim()) {
       onSave({ clientName, comment, duration })
@@ -112,7 +137,14 @@ export function AppointmentDialog({
                 value={clientName}
                 onChange={(e) => setClientName(e.target.value)}
                 className="text-base"
+                list="client-suggestions"
+                autoComplete="off"
               />
+              <datalist id="client-suggestions">
+                {suggestions.map((client) => (
+                  <option key={client.id} value={client.name} />
+                ))}
+              </datalist>
             </div>
 
             <div className="space-y-2">
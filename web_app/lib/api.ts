@@ -48,19 +48,125 @@ export function setMasterRole(role: string | null) {
   else localStorage.removeItem('master_role');
 }
 
-export async function getMasters(): Promise<Master[]> {
-  
-    const response = await fetch(`${API_URL}/api/masters`);
+// Кэш чтений в памяти вкладки.
+// Одинаковые одновременные запросы идут одним fetch. Ответ свежий FRESH_MS, потом до STALE_MS
+// отдается сразу и перепроверяется в фоне; старше — ждем сеть. Записи кэша помечены областью
+// (мастер и даты), изменения записей сбрасывают только пересекающиеся с ними ответы.
+const FRESH_MS = 30_000
+const STALE_MS = 10 * 60_000
+const MAX_CACHE_ENTRIES = 200
+
+type CacheScope = {
+  kind: "masters" | "appointments"
+  masterId?: string  // нет — записи всех мастеров
+  start?: string     // нет — без ограничения по датам
+  end?: string
+}
 
-       if (response.status === 401) {
-        localStorage.removeItem('auth_token');
-        localStorage.removeItem('master_id');
-        localStorage.removeItem('master_role');
-        window.location.href = '/';
-        throw new Error("Unauthorized");
+type CacheEntry = {
+  scope: CacheScope
+  data?: unknown
+  fetchedAt: number
+  promise?: Promise<unknown>
+}
+
+const requestCache = new Map<string, CacheEntry>()
+
+function fetchIntoCache<T>(key: string, scope: CacheScope, load: () => Promise<T>, entry?: CacheEntry): Promise<T> {
+  const target = entry ?? { scope, fetchedAt: 0 }
+  const promise = load().then(
+    (data) => {
+      // Запись могли сбросить, пока шел запрос: такой ответ в кэш не кладем
+      if (requestCache.get(key) === target) {
+        target.data = data
+        target.fetchedAt = Date.now()
+        target.promise = undefined
+      }
+      return data
+    },
+    (error) => {
+      if (requestCache.get(key) === target) {
+        if (target.data === undefined) requestCache.delete(key)
+        else target.promise = undefined
+      }
+      throw error
+    },
+  )
+  target.promise = promise
+  if (!entry) {
+    requestCache.set(key, target)
+    if (requestCache.size > MAX_CACHE_ENTRIES) {
+      requestCache.delete(requestCache.keys().next().value as string)
+    }
+  }
+  return promise
+}
+
+function cachedRequest<T>(key: string, scope: CacheScope, load: () => Promise<T>): Promise<T> {
+  const entry = requestCache.get(key)
+  if (entry) {
+    const age = Date.now() - entry.fetchedAt
+    if (entry.data === undefined) return entry.promise as Promise<T>
+    if (age < FRESH_MS) return Promise.resolve(entry.data as T)
+    if (age < STALE_MS) {
+      if (!entry.promise) fetchIntoCache(key, scope, load, entry).catch(() => {})
+      return Promise.resolve(entry.data as T)
+    }
+    requestCache.delete(key)
+  }
+  return fetchIntoCache(key, scope, load)
+}
+
+// Сбросить кэш записей мастера за даты (без дат — за все)
+export function invalidateAppointments(masterId: string, dates?: (string | undefined)[]) {
+  const known = dates && dates.every(Boolean) ? (dates as string[]) : undefined
+  for (const [key, entry] of Array.from(requestCache)) {
+    const { kind, masterId: entryMaster, start, end } = entry.scope
+    if (kind !== "appointments") continue
+    if (entryMaster && entryMaster !== masterId) continue
+    if (known && start && end && !known.some((date) => date >= start && date <= end)) continue
+    requestCache.delete(key)
+  }
+}
+
+export function invalidateMasters() {
+  for (const [key, entry] of Array.from(requestCache)) {
+    if (entry.scope.kind === "masters") requestCache.delete(key)
+  }
+}
+
+// Смена токена или выход: данные другого мастера (салона) в кэше не нужны
+export function clearRequestCache() {
+  requestCache.clear()
+}
+
+// Дата записи из кэша (для сброса старого дня при переносе или удалении)
+function cachedAppointmentDate(appointmentId: string): string | undefined {
+  for (const entry of Array.from(requestCache.values())) {
+    if (entry.scope.kind !== "appointments" || !entry.data) continue
+    for (const items of Object.values(entry.data as Record<string, Appointment[]>)) {
+      const found = items.find((apt) => apt.id === appointmentId)
+      if (found?.date) return found.date
     }
+  }
+  return undefined
+}
+
+function clearSession() {
+  localStorage.removeItem('auth_token');
+  localStorage.removeItem('master_id');
+  localStorage.removeItem('master_role');
+  clearRequestCache();
+}
+
+export async function getMasters(): Promise<Master[]> {
+  return cachedRequest("masters", { kind: "masters" }, async () => {
+    // С токеном: список мастеров своего салона
+    const response = await authenticatedFetch(`${API_URL}/api/masters`);
+
     if (!response.ok) throw new Error("Failed to fetch masters");
     return response.json();
+  });
 }
 
 
@@ -74,10 +180,12 @@ export async function getAppointments(date?: string): Promise<Record<string, App
   }
   if (masterId) url.searchParams.append("master_id", masterId)
     
-
-  const response = await authenticatedFetch(url.toString())
-  if (!response.ok) throw new Error("Failed to fetch all appointments")
-  return response.json()
+  const scope: CacheScope = { kind: "appointments", masterId, start: date, end: date }
+  return cachedRequest(url.toString(), scope, async () => {
+    const response = await authenticatedFetch(url.toString())
+    if (!response.ok) throw new Error("Failed to fetch all appointments")
+    return response.json()
+  })
 }
 
 
@@ -101,10 +209,8 @@ async function authenticatedFetch(url: string, options: RequestInit = {}): Promi
     
     // Обработка 401 ошибки
     if (response.status === 401) {
-        // Удаляем недействительный токен и данные мастера
-        localStorage.removeItem('auth_token');
-        localStorage.removeItem('master_id');
-        localStorage.removeItem('master_role');
+        // Удаляем недействительный токен, данные мастера и кэш
+        clearSession();
         // Перенаправляем на страницу входа вместо перезагрузки
         window.location.href = '/';
         throw new Error("Unauthorized");
@@ -131,6 +237,7 @@ export async function createAppointment(
   });
   
   if (!response.ok) throw new Error("Failed to create appointment");
+  invalidateAppointments(masterId, [data.date]);
   return response.json();
 }
 
@@ -140,13 +247,17 @@ export async function updateAppointment(
   appointmentId: string,
   data: Partial<Appointment>,
 ): Promise<Appointment> {
+  const previousDate = cachedAppointmentDate(appointmentId);
   const response = await authenticatedFetch(`${API_URL}/api/appointments/${masterId}/${appointmentId}`, {
     method: "PUT",
     body: JSON.stringify(data),
   });
   
   if (!response.ok) throw new Error("Failed to update appointment");
-  return response.json();
+  const updated: Appointment = await response.json();
+  // Перенос затрагивает и старый, и новый день
+  invalidateAppointments(masterId, [previousDate, updated.date]);
+  return updated;
 }
 
 // Провести запись
@@ -161,7 +272,9 @@ export async function completeAppointment(
   });
   
   if (!response.ok) throw new Error("Failed to complete appointment");
-  return response.json();
+  const completed: Appointment = await response.json();
+  invalidateAppointments(masterId, [completed.date]);
+  return completed;
 }
 
 // Отменить запись
@@ -171,16 +284,59 @@ export async function cancelAppointment(masterId: string, appointmentId: string)
   });
   
   if (!response.ok) throw new Error("Failed to cancel appointment");
-  return response.json();
+  const cancelled: Appointment = await response.json();
+  invalidateAppointments(masterId, [cancelled.date]);
+  return cancelled;
 }
 
 // Удалить запись
 export async function deleteAppointment(masterId: string, appointmentId: string): Promise<void> {
+  const date = cachedAppointmentDate(appointmentId);
   const response = await authenticatedFetch(`${API_URL}/api/appointments/${masterId}/${appointmentId}`, {
     method: "DELETE",
   });
   
   if (!response.ok) throw new Error("Failed to delete appointment");
+  invalidateAppointments(masterId, [date]);
+}
+
+export type Series = {
+  id: string
+  masterId: string
+  clientName: string
+  time: string
+  duration: number
+  comment?: string
+  freq: "daily" | "weekly" | "monthly"
+  interval: number
+  startDate: string
+  until?: string | null
+}
+
+// Создать повторяющуюся запись (вхождения приходят в обычных запросах записей с id вида "s12-20261020")
+export async function createSeries(
+  masterId: string,
+  data: Omit<Series, "id" | "masterId">,
+): Promise<Series> {
+  const response = await authenticatedFetch(`${API_URL}/api/series/${masterId}`, {
+    method: "POST",
+    body: JSON.stringify(data),
+  });
+
+  if (!response.ok) throw new Error("Failed to create series");
+  // Вхождения серии — во всех будущих днях мастера
+  invalidateAppointments(masterId);
+  return response.json();
+}
+
+// Завершить повторяющуюся запись с сегодняшнего дня
+export async function endSeries(masterId: string, seriesId: string): Promise<void> {
+  const response = await authenticatedFetch(`${API_URL}/api/series/${masterId}/${seriesId}`, {
+    method: "DELETE",
+  });
+
+  if (!response.ok) throw new Error("Failed to end series");
+  invalidateAppointments(masterId);
 }
 
 // Получить статистику
@@ -195,20 +351,160 @@ export async function getStats(): Promise<{
   return response.json();
 }
 
-// Получить записи за диапазон дат
-export async function getAppointmentsRange(
+// Колоночный формат списков записей (см. backend/formats.py): по массиву на поле,
+// id и masterId числами, payment — [наличные, безнал] или null
+const COLUMNAR = "application/vnd.want.columnar+json"
+
+type ColumnarAppointments = {
+  fields: (keyof Appointment)[]
+  columns: Record<string, unknown[]>
+  groups: Record<string, [number, number]>
+}
+
+function fromColumns(data: ColumnarAppointments): Record<string, Appointment[]> {
+  const result: Record<string, Appointment[]> = {}
+  for (const [group, [start, count]] of Object.entries(data.groups)) {
+    const items: Appointment[] = []
+    for (let i = start; i < start + count; i++) {
+      const apt: Record<string, unknown> = {}
+      for (const field of data.fields) {
+        const value = data.columns[field][i]
+        if (field === "id" || field === "masterId") {
+          apt[field] = value === null ? undefined : String(value)
+        } else if (field === "payment") {
+          const pair = value as [number, number] | null
+          apt.payment = pair ? { cash: pair[0], card: pair[1] } : undefined
+        } else {
+          apt[field] = value
+        }
+      }
+      items.push(apt as Appointment)
+    }
+    result[group] = items
+  }
+  return result
+}
+
+function loadAppointmentsRange(
   startDate: string,
   endDate: string,
   masterId?: string,
+  fields?: (keyof Appointment)[],
 ): Promise<Record<string, Appointment[]>> {
   const url = new URL(`${API_URL}/api/appointments/range`);
   url.searchParams.append("start_date", startDate);
   url.searchParams.append("end_date", endDate);
   if (masterId) url.searchParams.append("master_id", masterId);
+  if (fields) url.searchParams.append("fields", fields.join(","));
+
+  const scope: CacheScope = { kind: "appointments", masterId, start: startDate, end: endDate }
+  return cachedRequest(url.toString(), scope, async () => {
+    const response = await authenticatedFetch(url.toString(), { headers: { Accept: COLUMNAR } });
+
+    if (!response.ok) throw new Error("Failed to fetch appointments range");
+    // Старый сервер без колоночного формата ответит обычным JSON
+    if (response.headers.get("content-type")?.startsWith(COLUMNAR)) {
+      return fromColumns(await response.json());
+    }
+    return response.json();
+  });
+}
+
+// Даты YYYY-MM-DD считаются в UTC, чтобы сдвиг не зависел от часового пояса
+function shiftDate(date: string, days: number): string {
+  const value = new Date(`${date}T00:00:00Z`)
+  value.setUTCDate(value.getUTCDate() + days)
+  return value.toISOString().slice(0, 10)
+}
+
+// Соседние диапазоны той же длины: для целого месяца — предыдущий и следующий месяц, иначе сдвиг на длину (неделя)
+function adjacentRanges(startDate: string, endDate: string): [string, string][] {
+  const start = new Date(`${startDate}T00:00:00Z`)
+  const end = new Date(`${endDate}T00:00:00Z`)
+  const monthEnd = new Date(Date.UTC(start.getUTCFullYear(), start.getUTCMonth() + 1, 0))
+  if (start.getUTCDate() === 1 && end.getTime() === monthEnd.getTime()) {
+    const month = (offset: number): [string, string] => [
+      new Date(Date.UTC(start.getUTCFullYear(), start.getUTCMonth() + offset, 1)).toISOString().slice(0, 10),
+      new Date(Date.UTC(start.getUTCFullYear(), start.getUTCMonth() + offset + 1, 0)).toISOString().slice(0, 10),
+    ]
+    return [month(-1), month(1)]
+  }
+  const days = Math.round((end.getTime() - start.getTime()) / 86_400_000) + 1
+  return [
+    [shiftDate(startDate, -days), shiftDate(endDate, -days)],
+    [shiftDate(startDate, days), shiftDate(endDate, days)],
+  ]
+}
+
+// Фоновая загрузка соседних диапазонов, когда браузер свободен: листание недель без ожидания сети
+function prefetchAdjacentRanges(
+  startDate: string,
+  endDate: string,
+  masterId?: string,
+  fields?: (keyof Appointment)[],
+) {
+  if (typeof window === "undefined") return
+  const run = () => {
+    for (const [start, end] of adjacentRanges(startDate, endDate)) {
+      loadAppointmentsRange(start, end, masterId, fields).catch(() => {})
+    }
+  }
+  if ("requestIdleCallback" in window) window.requestIdleCallback(run, { timeout: 1000 })
+  else setTimeout(run, 200)
+}
+
+// Получить записи за диапазон дат. fields — только нужные поля (например, без comment для календаря).
+// Ответ кэшируется по (даты, мастер, поля); соседние недели/месяцы загружаются в фоне
+export async function getAppointmentsRange(
+  startDate: string,
+  endDate: string,
+  masterId?: string,
+  fields?: (keyof Appointment)[],
+): Promise<Record<string, Appointment[]>> {
+  const data = await loadAppointmentsRange(startDate, endDate, masterId, fields);
+  prefetchAdjacentRanges(startDate, endDate, masterId, fields);
+  return data;
+}
+
+export type DaySummary = {
+  scheduled: number
+  completed: number
+  cancelled: number
+  total: number
+  revenue: number
+}
+
+// Получить сводку для календаря: дата -> ID мастера -> количество записей и выручка
+export async function getCalendarSummary(
+  startDate: string,
+  endDate: string,
+  masterId?: string,
+): Promise<Record<string, Record<string, DaySummary>>> {
+  const url = new URL(`${API_URL}/api/calendar/summary`);
+  url.searchParams.append("start_date", startDate);
+  url.searchParams.append("end_date", endDate);
+  if (masterId) url.searchParams.append("master_id", masterId);
 
   const response = await authenticatedFetch(url.toString());
-  
-  if (!response.ok) throw new Error("Failed to fetch appointments range");
+
+  if (!response.ok) throw new Error("Failed to fetch calendar summary");
+  return response.json();
+}
+
+export type Client = {
+  id: string
+  name: string
+}
+
+// Подсказки клиентов по началу имени или фамилии
+export async function searchClients(query: string, limit = 10): Promise<Client[]> {
+  const url = new URL(`${API_URL}/api/clients/autocomplete`);
+  url.searchParams.append("q", query);
+  url.searchParams.append("limit", String(limit));
+
+  const response = await authenticatedFetch(url.toString());
+
+  if (!response.ok) throw new Error("Failed to search clients");
   return response.json();
 }
 
@@ -302,22 +598,27 @@ export function getStatusLabel(status: string): string {
 
 
 // Функция для аутентификации через Telegram
-export async function authenticateViaTelegram(telegramId: number, firstName: string): Promise<{token: string, master: Master}> {
+// invite — код приглашения в салон из ссылки бота (?invite=...); без него новый мастер попадает в салон по умолчанию
+export async function authenticateViaTelegram(telegramId: number, firstName: string, invite?: string | null): Promise<{token: string, master: Master}> {
     const response = await fetch(`${API_URL}/api/masters/register`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ 
             telegram_id: telegramId,
-            name: firstName
+            name: firstName,
+            invite: invite || undefined
         })
     });
     
     if (!response.ok) throw new Error("Failed to authenticate via Telegram");
+    // Регистрация могла добавить мастера
+    invalidateMasters();
     return response.json();
 }
 
 // Функция для установки токена
 export function setAuthToken(token: string): void {
+    if (token !== getAuthToken()) clearRequestCache();
     localStorage.setItem("auth_token", token);
 }
 
@@ -335,8 +636,8 @@ export async function getTodayAppointments(): Promise<Appointment[]> {
   return Object.values(data).flat()
 }
 
-// <CHANGE> Получить все записи на эту неделю
-export async function getWeekAppointments(): Promise<Appointment[]> {
+// Понедельник и воскресенье текущей недели (YYYY-MM-DD)
+function currentWeekRange(): [string, string] {
   const today = new Date()
   const weekStart = new Date(today)
   const dayOfWeek = today.getDay()
@@ -346,8 +647,12 @@ export async function getWeekAppointments(): Promise<Appointment[]> {
   const weekEnd = new Date(weekStart)
   weekEnd.setDate(weekStart.getDate() + 6)
 
-  const startDateStr = weekStart.toISOString().split('T')[0]
-  const endDateStr = weekEnd.toISOString().split('T')[0]
+  return [weekStart.toISOString().split('T')[0], weekEnd.toISOString().split('T')[0]]
+}
+
+// <CHANGE> Получить все записи на эту неделю
+export async function getWeekAppointments(): Promise<Appointment[]> {
+  const [startDateStr, endDateStr] = currentWeekRange()
   
   // Получаем ID текущего мастера из localStorage
   const masterId = getMasterId();
@@ -364,6 +669,60 @@ export async function getWeekAppointments(): Promise<Appointment[]> {
 
 
 
+export type BatchReadItem = {
+  id: string
+  type: "masters" | "profile" | "appointments" | "range" | "stats"
+  params?: Record<string, string>
+}
+
+export type BatchReadResult = {
+  status: number
+  data?: any
+  error?: string
+  // База недоступна: последний удачный ответ, age — его возраст в секундах
+  stale?: boolean
+  age?: number
+}
+
+// Несколько чтений одним запросом: один round trip вместо нескольких при открытии приложения
+export async function batchRead(requests: BatchReadItem[]): Promise<Record<string, BatchReadResult>> {
+  const response = await authenticatedFetch(`${API_URL}/api/batch-read`, {
+    method: 'POST',
+    body: JSON.stringify({ requests }),
+  });
+
+  if (!response.ok) throw new Error("Failed to batch read");
+  const data = await response.json();
+  return data.results;
+}
+
+// Данные главной страницы: записи на сегодня и на неделю и профиль мастера
+export async function getHomeData(): Promise<{ today: Appointment[], week: Appointment[], profile: Master | null, stale: boolean }> {
+  const masterId = getMasterId();
+  if (!masterId) {
+    throw new Error("Master ID not found");
+  }
+
+  const today = new Date().toISOString().split('T')[0]
+  const [startDate, endDate] = currentWeekRange()
+  const results = await batchRead([
+    { id: "today", type: "appointments", params: { date: today, master_id: masterId } },
+    { id: "week", type: "range", params: { start_date: startDate, end_date: endDate, master_id: masterId } },
+    { id: "profile", type: "profile" },
+  ]);
+
+  for (const id of ["today", "week"]) {
+    if (results[id].status !== 200) throw new Error(results[id].error || "Failed to fetch appointments");
+  }
+  const flatten = (data: Record<string, Appointment[]>) => Object.values(data).flat()
+  return {
+    today: flatten(results.today.data),
+    week: flatten(results.week.data),
+    profile: results.profile.status === 200 ? results.profile.data : null,
+    stale: Boolean(results.today.stale || results.week.stale),
+  }
+}
+
 export async function updateMasterName(name: string) {
   const response = await authenticatedFetch(`${API_URL}/api/update-name`, {
     method: 'POST',
@@ -374,6 +733,7 @@ export async function updateMasterName(name: string) {
      const text = await response.text();
      throw new Error(text || 'Ошибка обновления имени');
   }
+  invalidateMasters();
 
   return response.json()
 }
@@ -399,6 +759,7 @@ export async function updateMasterAvatar(avatar: string): Promise<Master> {
     const text = await response.text();
     throw new Error(text || 'Ошибка обновления аватара');
   }
+  invalidateMasters();
 
   return response.json();
 }
\ No newline at end of file